@@ -1,4 +1,31 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
 
-# Using Django's default User admin
-# No custom models to register
+from flashcards.jobs import enqueue
+
+
+class PurgingUserAdmin(UserAdmin):
+    """Django's User admin, deleting accounts only through the background purge"""
+    actions = ['purge_accounts']
+
+    def has_delete_permission(self, request, obj=None):
+        # Django's delete, the "Delete" button as well as "Delete selected
+        # users", collects every row of the account in one request, first for
+        # the confirmation page and then to cascade; purge_accounts does it in
+        # batches in the background. Without delete permission both are gone
+        return False
+
+    @admin.action(description='Purge selected accounts and all their data (background)')
+    def purge_accounts(self, request, queryset):
+        queued = 0
+        for user in queryset.exclude(pk=request.user.pk):
+            enqueue('purge_user', user=request.user, payload={'user_id': user.pk})
+            queued += 1
+        if queryset.filter(pk=request.user.pk).exists():
+            self.message_user(request, 'You cannot purge your own account.', messages.WARNING)
+        self.message_user(request, f'Queued {queued} account purge(s); follow them under Jobs.')
+
+
+admin.site.unregister(User)
+admin.site.register(User, PurgingUserAdmin)
@@ -1,7 +1,20 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 
+# Pages render {% static %} without a collectstatic manifest
+plain_static_storage = override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+)
+
+
+def setUpModule():
+    plain_static_storage.enable()
+
+
+def tearDownModule():
+    plain_static_storage.disable()
+
 
 class AccountsViewTests(TestCase):
     """Test cases for accounts views"""
@@ -49,6 +62,13 @@ class AccountsViewTests(TestCase):
         # Verify user was created
         self.assertTrue(User.objects.filter(username='newuser').exists())
     
+    def test_logout_clears_offline_data(self):
+        """Test logging out clears the offline study cache and review queue"""
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('accounts:logout'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Clear-Site-Data'], '"cache", "storage"')
+    
     def test_profile_requires_login(self):
         """Test that profile page requires authentication"""
         response = self.client.get(reverse('accounts:profile'))
@@ -51,7 +51,11 @@ def logout_view(request):
     """Handle user logout"""
     logout(request)
     messages.info(request, 'You have been logged out successfully.')
-    return redirect('accounts:login')
+    response = redirect('accounts:login')
+    # Drop the offline study cache and review queue so the next person to use
+    # this browser sees none of this account's cards or answers
+    response['Clear-Site-Data'] = '"cache", "storage"'
+    return response
 
 
 @login_required
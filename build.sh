@@ -4,4 +4,5 @@ set -e
 pip install -r requirements.txt
 python manage.py makemigrations
 python manage.py migrate  
+python manage.py rerender_cards
 python manage.py collectstatic --no-input
\ No newline at end of file
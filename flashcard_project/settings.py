@@ -43,6 +43,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'flashcards.middleware.FragmentCacheMetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'flashcard_project.urls'
@@ -73,6 +74,15 @@ DATABASES = {
     )
 }
 
+# Cache (used for rendered card fragments)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'flashmaster',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,12 +117,52 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 # WhiteNoise configuration
+# collectstatic gives every file a content-hashed name plus .gz and .br copies
+# (with the Brotli package installed); WhiteNoise serves hashed names with a
+# far-future immutable Cache-Control and picks the smallest encoding per request
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Background jobs
+# Run jobs inline instead of waiting for `manage.py run_worker` (development only)
+FLASHCARD_JOBS_EAGER = os.environ.get('JOBS_EAGER', 'False') == 'True'
+# Recurring jobs: job kind -> interval in minutes
+FLASHCARD_JOB_SCHEDULE = {
+    'refresh_analytics': 15,
+    'compact_sessions': 24 * 60,
+    'send_digests': 60,
+}
+# Study sessions older than this are folded into monthly summaries
+FLASHCARD_SESSION_RETENTION_DAYS = int(os.environ.get('SESSION_RETENTION_DAYS', 400))
+
+# Email
+# Defaults to printing emails to the console; use
+# django.core.mail.backends.filebased.EmailBackend to write them to EMAIL_FILE_PATH
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', BASE_DIR / 'sent_emails')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False') == 'True'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'FlashMaster <noreply@localhost>')
+
+# Daily due-card digest: sent once per day, from this local hour on
+FLASHCARD_DIGEST_HOUR = int(os.environ.get('DIGEST_HOUR', 7))
+# Absolute address used for links in emails
+FLASHCARD_SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
+
+# Write-behind reviews: buffer answers in each process and write them out in
+# batches, at the cost of losing up to one interval of answers if a worker
+# crashes (see DEPLOYMENT.md)
+FLASHCARD_REVIEW_WRITE_BEHIND = os.environ.get('REVIEW_WRITE_BEHIND', 'False') == 'True'
+FLASHCARD_REVIEW_FLUSH_SECONDS = float(os.environ.get('REVIEW_FLUSH_SECONDS', 2))
+# Flush early once a process holds this many answers
+FLASHCARD_REVIEW_BUFFER_SIZE = int(os.environ.get('REVIEW_BUFFER_SIZE', 5000))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
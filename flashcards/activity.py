@@ -0,0 +1,83 @@
+"""
+Per-user study activity for the statistics page.
+
+Daily totals come from one date-truncated GROUP BY over the user's study
+sessions; weekly trends are folded from those (at most 366) daily rows. The
+result is cached per user and dropped when a study session ends.
+"""
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import StudySession
+
+ACTIVITY_DAYS = 365
+ACTIVITY_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def activity_cache_key(user_id):
+    return f'activity:{user_id}'
+
+
+def invalidate_activity(user_id):
+    """Forget the cached activity of a user, e.g. when a session ends"""
+    cache.delete(activity_cache_key(user_id))
+
+
+def get_activity(user):
+    """Daily and weekly study activity for the last year, as compact lists
+
+    ``days`` rows are ``[date, minutes, cards studied, cards known]`` and
+    ``weeks`` rows are ``[monday, minutes, cards studied, accuracy %]``.
+    """
+    key = activity_cache_key(user.pk)
+    activity = cache.get(key)
+    if activity is None:
+        activity = compute_activity(user)
+        cache.set(key, activity, ACTIVITY_CACHE_TIMEOUT)
+    return activity
+
+
+def compute_activity(user):
+    """Aggregate the user's sessions of the last year by day and week"""
+    today = timezone.localdate()
+    start = today - timedelta(days=ACTIVITY_DAYS - 1)
+    # Compare against a datetime rather than started_at__date so an index on started_at applies
+    since = timezone.make_aware(datetime.combine(start, time.min))
+    rows = (
+        StudySession.objects
+        .filter(user=user, started_at__gte=since)
+        .annotate(day=TruncDate('started_at'))
+        .values('day')
+        .annotate(
+            cards=Sum('cards_studied'),
+            known=Sum('cards_known'),
+            duration=Sum(F('ended_at') - F('started_at'), filter=Q(ended_at__isnull=False)),
+        )
+        .order_by('day')
+    )
+
+    days = []
+    weeks = {}
+    for row in rows:
+        minutes = int(row['duration'].total_seconds() // 60) if row['duration'] else 0
+        days.append([row['day'].isoformat(), minutes, row['cards'], row['known']])
+
+        monday = row['day'] - timedelta(days=row['day'].weekday())
+        week = weeks.setdefault(monday, [0, 0, 0])
+        week[0] += minutes
+        week[1] += row['cards']
+        week[2] += row['known']
+
+    return {
+        'start': start.isoformat(),
+        'end': today.isoformat(),
+        'days': days,
+        'weeks': [
+            [monday.isoformat(), minutes, cards, round(known * 100 / cards) if cards else None]
+            for monday, (minutes, cards, known) in sorted(weeks.items())
+        ],
+    }
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Flashcard, StudySession
+from .models import (
+    Flashcard, StudySession, StudySessionSummary, Review, Job, ScheduledJob, Deck, DeckSubscription, DigestRun
+)
 
 
 @admin.register(Flashcard)
@@ -24,6 +26,21 @@ class FlashcardAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(Deck)
+class DeckAdmin(admin.ModelAdmin):
+    list_display = ['title', 'owner', 'is_published', 'created_at']
+    list_filter = ['is_published']
+    search_fields = ['title', 'owner__username']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(DeckSubscription)
+class DeckSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ['user', 'deck', 'created_at']
+    search_fields = ['user__username', 'deck__title']
+    raw_id_fields = ['user', 'deck']
+
+
 @admin.register(StudySession)
 class StudySessionAdmin(admin.ModelAdmin):
     list_display = ['user', 'started_at', 'ended_at', 'cards_studied', 'cards_known', 'topic']
@@ -31,3 +48,41 @@ class StudySessionAdmin(admin.ModelAdmin):
     search_fields = ['user__username', 'topic']
     date_hierarchy = 'started_at'
     readonly_fields = ['started_at']
+
+
+@admin.register(StudySessionSummary)
+class StudySessionSummaryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'month', 'sessions', 'cards_studied', 'cards_known', 'minutes']
+    search_fields = ['user__username']
+    date_hierarchy = 'month'
+
+
+@admin.register(Review)
+class ReviewAdmin(admin.ModelAdmin):
+    list_display = ['user', 'flashcard', 'is_correct', 'reviewed_at', 'created_at']
+    list_filter = ['is_correct', 'reviewed_at']
+    search_fields = ['user__username', 'review_id']
+    date_hierarchy = 'reviewed_at'
+    raw_id_fields = ['flashcard', 'session']
+    readonly_fields = ['review_id', 'created_at']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'user', 'status', 'progress', 'total', 'created_at', 'finished_at', 'attempts']
+    list_filter = ['kind', 'status']
+    search_fields = ['user__username', 'kind']
+    date_hierarchy = 'created_at'
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'locked_by']
+
+
+@admin.register(ScheduledJob)
+class ScheduledJobAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'interval_minutes', 'next_run_at', 'is_active']
+    list_editable = ['interval_minutes', 'is_active']
+
+
+@admin.register(DigestRun)
+class DigestRunAdmin(admin.ModelAdmin):
+    list_display = ['date', 'sent', 'last_user_id', 'started_at', 'finished_at']
+    readonly_fields = ['started_at']
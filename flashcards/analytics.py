@@ -0,0 +1,136 @@
+"""
+Site-wide analytics for operators.
+
+Summary tables (``DailyStat``, ``TopicStat`` and ``DailyActiveUser``) are
+maintained incrementally: ``refresh_analytics`` folds in only the reviews and
+flashcards created since the last watermark, one id range at a time, so the
+cost of a refresh depends on the new rows and not on the size of the source
+tables. Each batch and its watermark are committed together, so an
+interrupted refresh resumes where it stopped and never counts a row twice.
+
+Ids are handed out when a row is inserted, not when it commits, so on
+Postgres a row can become visible after rows with higher ids. A refresh
+therefore stops below the first row created within ``COMMIT_LAG`` and leaves
+it, and everything after it, for a later run.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import AnalyticsWatermark, DailyActiveUser, DailyStat, Flashcard, Review, TopicStat
+
+REFRESH_BATCH_SIZE = 50000
+# Longer than any transaction that inserts reviews or flashcards should run
+COMMIT_LAG = timedelta(minutes=5)
+
+
+def refresh_analytics(batch_size=REFRESH_BATCH_SIZE, progress=None):
+    """Fold new reviews and flashcards into the summary tables
+
+    Returns the number of source rows processed per source.
+    """
+    return {
+        'reviews': _refresh_source('reviews', Review.objects.all(), _fold_reviews, batch_size, progress),
+        'flashcards': _refresh_source('flashcards', Flashcard.objects.all(), _fold_flashcards, batch_size, progress),
+    }
+
+
+def rebuild_analytics(batch_size=REFRESH_BATCH_SIZE, progress=None):
+    """Empty the summary tables and recompute them from scratch"""
+    with transaction.atomic():
+        DailyStat.objects.all().delete()
+        DailyActiveUser.objects.all().delete()
+        TopicStat.objects.all().delete()
+        AnalyticsWatermark.objects.all().delete()
+    return refresh_analytics(batch_size, progress)
+
+
+def _refresh_source(source, queryset, fold, batch_size, progress):
+    """Process ``queryset`` past the watermark of ``source`` in id ranges"""
+    processed = 0
+    cutoff = timezone.now() - COMMIT_LAG
+    while True:
+        with transaction.atomic():
+            watermark, _ = AnalyticsWatermark.objects.select_for_update().get_or_create(source=source)
+            pending = queryset.filter(pk__gt=watermark.last_id).order_by('pk')
+            # A row with a lower id than a recent one may not have committed
+            # yet; moving the watermark past it would skip it for good
+            first_recent = pending.filter(created_at__gte=cutoff).values_list('pk', flat=True).first()
+            if first_recent is not None:
+                pending = pending.filter(pk__lt=first_recent)
+            upper = pending.values_list('pk', flat=True)[batch_size - 1:batch_size].first()
+            if upper is None:
+                upper = pending.values_list('pk', flat=True).last()
+                if upper is None:
+                    break
+            rows = pending.filter(pk__lte=upper)
+            processed += fold(rows)
+            watermark.last_id = upper
+            watermark.updated_at = timezone.now()
+            watermark.save(update_fields=['last_id', 'updated_at'])
+        if progress:
+            progress(processed)
+    return processed
+
+
+def _fold_reviews(reviews):
+    """Add one id range of reviews to the daily and topic totals"""
+    reviews = reviews.annotate(day=TruncDate('reviewed_at'))
+    total = 0
+    for row in reviews.values('day').annotate(count=Count('id'), correct=Count('id', filter=Q(is_correct=True))):
+        _increment(DailyStat, {'date': row['day']}, reviews=row['count'], correct_reviews=row['correct'])
+        total += row['count']
+
+    for row in reviews.values('flashcard__topic').annotate(count=Count('id')):
+        _increment(TopicStat, {'topic': row['flashcard__topic']}, reviews=row['count'])
+
+    # Record who was active, then recount only the days this batch touched
+    pairs = reviews.values_list('day', 'user_id').distinct()
+    DailyActiveUser.objects.bulk_create(
+        [DailyActiveUser(date=day, user_id=user_id) for day, user_id in pairs],
+        ignore_conflicts=True,
+    )
+    days = {day for day, _ in pairs}
+    active = DailyActiveUser.objects.filter(date__in=days).values('date').annotate(count=Count('id'))
+    for row in active:
+        DailyStat.objects.filter(date=row['date']).update(active_users=row['count'])
+    return total
+
+
+def _fold_flashcards(flashcards):
+    """Add one id range of new flashcards to the daily and topic totals"""
+    total = 0
+    days = flashcards.annotate(day=TruncDate('created_at')).values('day').annotate(count=Count('id'))
+    for row in days:
+        _increment(DailyStat, {'date': row['day']}, cards_created=row['count'])
+        total += row['count']
+    for row in flashcards.values('topic').annotate(count=Count('id')):
+        _increment(TopicStat, {'topic': row['topic']}, cards_created=row['count'])
+    return total
+
+
+def _increment(model, lookup, **counts):
+    """Add ``counts`` to the summary row matching ``lookup``, creating it if needed"""
+    updated = model.objects.filter(**lookup).update(
+        **{field: F(field) + value for field, value in counts.items()}
+    )
+    if not updated:
+        model.objects.create(**lookup, **counts)
+
+
+def get_summary(days=30):
+    """Data for the operator analytics page, read only from summary tables"""
+    daily = list(DailyStat.objects.all()[:days])
+    return {
+        'daily': daily,
+        'top_topics': TopicStat.objects.all()[:20],
+        'watermarks': AnalyticsWatermark.objects.order_by('source'),
+        'totals': {
+            'reviews': sum(day.reviews for day in daily),
+            'cards_created': sum(day.cards_created for day in daily),
+            'peak_active_users': max((day.active_users for day in daily), default=0),
+        },
+    }
@@ -0,0 +1,370 @@
+"""
+Full-account backup and restore.
+
+A backup is a zip archive with a ``manifest.json``, one JSON Lines entry per
+model and a ``media/<sha256>`` entry for every image the cards use. It is
+produced entry by entry through a non-seekable buffer, so it can be streamed
+to the client (or a file) without holding the archive in memory, and restored
+in batches with fresh ids on any database backend.
+
+Foreign keys are written with the username of the referenced row's owner
+and the row's natural key. On restore, each batch looks its references up by
+those: the account's own rows (a card's deck, a review's session) among the
+restored account's rows, and rows of other users, like the cards of
+subscribed decks, among what they publish. Memory therefore stays at one
+batch whatever the size of the account. Rows whose required reference cannot
+be found are skipped.
+"""
+import io
+import json
+import uuid
+import zipfile
+from collections import namedtuple
+from datetime import datetime
+from itertools import islice
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .images import resolve_images, store_image
+from .models import CardProgress, Deck, DeckSubscription, Flashcard, ImageAsset, Review, StudySession
+from .similarity import store_vectors
+
+FORMAT_NAME = 'flashmaster-backup'
+FORMAT_VERSION = 4
+RESTORE_BATCH_SIZE = 1000
+BACKUP_CHUNK_SIZE = 2000
+STREAM_FLUSH_BYTES = 64 * 1024
+MEDIA_PREFIX = 'media/'
+
+# Entry name, model, exported fields, the natural key used to skip rows that
+# already exist when a restore is re-run and to find referenced rows, and the
+# field naming the account. ``references`` maps foreign keys to the entry
+# holding their targets and whether the target may belong to another user
+# (and is shared through a published deck). Entries are restored in order,
+# so targets come first.
+BackupEntry = namedtuple('BackupEntry', 'name model fields natural_key owner references')
+BACKUP_ENTRIES = [
+    BackupEntry('decks.jsonl', Deck, [
+        'id', 'title', 'description', 'is_published', 'created_at',
+    ], ('created_at', 'title'), 'owner', {}),
+    BackupEntry('flashcards.jsonl', Flashcard, [
+        'id', 'topic', 'front', 'back', 'created_at', 'updated_at',
+        'times_reviewed', 'times_correct', 'last_reviewed', 'is_known',
+        'front_image_id', 'back_image_id',
+    ], ('created_at', 'topic', 'front'), 'user', {'deck': ('decks.jsonl', False)}),
+    BackupEntry('study_sessions.jsonl', StudySession, [
+        'id', 'started_at', 'ended_at', 'cards_studied', 'cards_known', 'topic',
+    ], ('started_at', 'topic'), 'user', {}),
+    BackupEntry('deck_subscriptions.jsonl', DeckSubscription, [
+        'id', 'created_at',
+    ], ('deck_id',), 'user', {'deck': ('decks.jsonl', True)}),
+    BackupEntry('card_progress.jsonl', CardProgress, [
+        'id', 'times_reviewed', 'times_correct', 'last_reviewed', 'is_known',
+    ], ('flashcard_id',), 'user', {'flashcard': ('flashcards.jsonl', True)}),
+    BackupEntry('reviews.jsonl', Review, [
+        'id', 'review_id', 'is_correct', 'reviewed_at', 'created_at',
+    ], ('review_id',), 'user', {
+        'flashcard': ('flashcards.jsonl', True),
+        'session': ('study_sessions.jsonl', False),
+    }),
+]
+ENTRIES_BY_NAME = {entry.name: entry for entry in BACKUP_ENTRIES}
+
+# The account being restored into, the username the archive was made for,
+# the image hashes the archive really contains and the id maps of old archives
+RestoreContext = namedtuple('RestoreContext', 'user username images id_maps')
+
+
+def _key_columns(field, target):
+    """Columns identifying a referenced row of any user: owner username and natural key"""
+    return [f'{field}__{target.owner}__username'] + [f'{field}__{key}' for key in target.natural_key]
+
+
+def _export_columns(entry):
+    columns = list(entry.fields)
+    for field, (target_name, _) in entry.references.items():
+        columns.append(f'{field}_id')
+        columns += _key_columns(field, ENTRIES_BY_NAME[target_name])
+    return columns
+
+
+def _legacy_mapped_entries(manifest):
+    """Entries whose archive ids must be remembered to restore an older archive
+
+    Before version 4, references that cannot be shared (a card's deck, a
+    review's session) were written as ids only. Restoring such an archive
+    keeps an id map for decks and study sessions, which grows with their
+    number but not with the number of cards or reviews.
+    """
+    if manifest.get('version', 0) >= 4:
+        return set()
+    return {target for entry in BACKUP_ENTRIES for target, shared in entry.references.values() if not shared}
+
+
+class StreamBuffer(io.RawIOBase):
+    """Unseekable sink that collects what ZipFile writes until it is drained"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+def iter_backup(user):
+    """Yield the bytes of a backup archive for ``user``"""
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('manifest.json', json.dumps({
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'created_at': timezone.now().isoformat(),
+            'username': user.username,
+            'entries': [entry.name for entry in BACKUP_ENTRIES],
+        }))
+
+        for backup_entry in BACKUP_ENTRIES:
+            rows = backup_entry.model.objects.filter(
+                **{backup_entry.owner: user}
+            ).order_by('pk').values(*_export_columns(backup_entry))
+            with archive.open(backup_entry.name, 'w', force_zip64=True) as entry:
+                for row in rows.iterator(chunk_size=BACKUP_CHUNK_SIZE):
+                    entry.write(json.dumps(row, default=_encode_value).encode('utf-8') + b'\n')
+                    if buffer.size >= STREAM_FLUSH_BYTES:
+                        yield buffer.drain()
+            yield buffer.drain()
+
+        # Images are already compressed, so they are stored without deflate
+        for asset in _user_images(user).iterator(chunk_size=BACKUP_CHUNK_SIZE):
+            with asset.image.open('rb') as source, \
+                    archive.open(zipfile.ZipInfo(MEDIA_PREFIX + asset.sha256), 'w', force_zip64=True) as entry:
+                for chunk in iter(lambda: source.read(STREAM_FLUSH_BYTES), b''):
+                    entry.write(chunk)
+                    yield buffer.drain()
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def _user_images(user):
+    """Image assets attached to any of ``user``'s flashcards"""
+    cards = Flashcard.objects.filter(user=user)
+    return ImageAsset.objects.filter(
+        Q(sha256__in=cards.values('front_image_id')) | Q(sha256__in=cards.values('back_image_id'))
+    ).order_by('sha256')
+
+
+def _encode_value(value):
+    """JSON-encode datetimes with full microsecond precision, and review UUIDs"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def write_backup(user, fileobj):
+    """Write a backup archive for ``user`` to an open binary file"""
+    for chunk in iter_backup(user):
+        fileobj.write(chunk)
+
+
+def restore_backup(user, fileobj, batch_size=RESTORE_BATCH_SIZE, progress=None):
+    """Restore a backup archive into ``user``'s account
+
+    Rows are inserted in batches with new primary keys assigned by the target
+    database, so archives move freely between SQLite and Postgres
+    deployments. Rows whose natural key already exists are skipped, which
+    makes a restore safe to re-run. ``updated_at`` is reset to the restore
+    time. Archives of older versions lack some entries, which are skipped.
+    Returns the number of rows created per entry.
+    """
+    created = {}
+    # Entry name -> {id in the archive: id in this database}, for old archives only
+    id_maps = {}
+    restored = 0
+    with zipfile.ZipFile(fileobj) as archive:
+        manifest = _read_manifest(archive)
+        images = _restore_media(archive)
+        mapped = _legacy_mapped_entries(manifest)
+        context = RestoreContext(user, manifest.get('username'), images, id_maps)
+        for backup_entry in BACKUP_ENTRIES:
+            created[backup_entry.name] = 0
+            if backup_entry.name in mapped:
+                id_maps[backup_entry.name] = {}
+            if backup_entry.name not in manifest['entries']:
+                continue
+            with archive.open(backup_entry.name) as entry:
+                rows = (json.loads(line) for line in entry if line.strip())
+                while True:
+                    batch = list(islice(rows, batch_size))
+                    if not batch:
+                        break
+                    created[backup_entry.name] += _restore_batch(context, backup_entry, batch)
+                    restored += len(batch)
+                    if progress:
+                        progress(restored)
+    return created
+
+
+def _read_manifest(archive):
+    """Load and validate the archive manifest"""
+    try:
+        manifest = json.loads(archive.read('manifest.json'))
+    except KeyError:
+        raise ValueError('Not a backup archive: manifest.json is missing')
+    if manifest.get('format') != FORMAT_NAME:
+        raise ValueError('Not a FlashMaster backup archive')
+    if manifest.get('version', 0) > FORMAT_VERSION:
+        raise ValueError(f"Backup version {manifest['version']} is newer than this server supports")
+    return manifest
+
+
+def _restore_media(archive):
+    """Store the archive's images and return the hashes the files really have
+
+    A file only counts when its content matches its name, so an archive
+    cannot attach an image stored on this server just by naming its hash.
+    """
+    images = set()
+    for name in archive.namelist():
+        if not name.startswith(MEDIA_PREFIX):
+            continue
+        with archive.open(name) as source:
+            try:
+                asset = store_image(source)
+            except ValueError:
+                continue
+        if asset.sha256 == name[len(MEDIA_PREFIX):]:
+            images.add(asset.sha256)
+    return images
+
+
+def _restore_batch(context, backup_entry, batch):
+    """Insert one batch of rows, skipping rows that were restored before"""
+    user = context.user
+    model, natural_key = backup_entry.model, backup_entry.natural_key
+    references = {
+        field: _resolve_references(context, backup_entry, field, batch)
+        for field in backup_entry.references
+    }
+    rows, objects = [], []
+    for row in batch:
+        values = {
+            field: model._meta.get_field(field).to_python(row[field])
+            for field in backup_entry.fields if field != 'id' and field in row
+        }
+        for field, resolved in references.items():
+            values[f'{field}_id'] = resolved.get(row.get(f'{field}_id'))
+            if values[f'{field}_id'] is None and not model._meta.get_field(field).null:
+                break
+        else:
+            rows.append(row)
+            objects.append(model(**{backup_entry.owner: user}, **values))
+
+    first_key = natural_key[0]
+    existing = {
+        tuple(key): pk for pk, *key in model.objects.filter(**{
+            backup_entry.owner: user,
+            f'{first_key}__in': [getattr(obj, first_key) for obj in objects],
+        }).values_list('pk', *natural_key)
+    }
+
+    new_objects = {}
+    for obj in objects:
+        key = tuple(getattr(obj, field) for field in natural_key)
+        if key not in existing and key not in new_objects:
+            new_objects[key] = obj
+
+    if model is Flashcard:
+        # Drop references to images that were missing from the archive
+        images = context.images | resolve_images(
+            (sha for obj in new_objects.values() for sha in (obj.front_image_id, obj.back_image_id)), user
+        )
+        for obj in new_objects.values():
+            if obj.front_image_id not in images:
+                obj.front_image_id = None
+            if obj.back_image_id not in images:
+                obj.back_image_id = None
+            obj.render_content()
+    model.objects.bulk_create(new_objects.values())
+    if model is Flashcard:
+        store_vectors(list(new_objects.values()))
+
+    id_map = context.id_maps.get(backup_entry.name)
+    if id_map is not None:
+        existing.update((key, obj.pk) for key, obj in new_objects.items())
+        for row, obj in zip(rows, objects):
+            id_map[row['id']] = existing[tuple(getattr(obj, field) for field in natural_key)]
+    return len(new_objects)
+
+
+def _resolve_references(context, backup_entry, field, batch):
+    """Map the archive ids in ``field`` of ``batch`` to ids in this database
+
+    A reference to a row owned by the archive's account is looked up among
+    the restored account's rows; one to another user's row only among what
+    that user publishes, and only where sharing is allowed.
+    """
+    target_name, shared = backup_entry.references[field]
+    target = ENTRIES_BY_NAME[target_name]
+    columns = _key_columns(field, target)
+    id_map = context.id_maps.get(target_name, {})
+    resolved = {}
+    own, others = {}, {}
+    for row in batch:
+        archive_id = row.get(f'{field}_id')
+        if archive_id is None:
+            continue
+        if columns[0] not in row:
+            # Older archives name references the account owns by id only
+            if archive_id in id_map:
+                resolved[archive_id] = id_map[archive_id]
+            continue
+        key = tuple(
+            target.model._meta.get_field(name).to_python(row[column])
+            for name, column in zip(target.natural_key, columns[1:])
+        )
+        if row[columns[0]] == context.username:
+            own.setdefault(key, set()).add(archive_id)
+        elif shared:
+            others.setdefault((row[columns[0]],) + key, set()).add(archive_id)
+
+    first_key = target.natural_key[0]
+    if own:
+        rows = target.model.objects.filter(**{
+            target.owner: context.user,
+            f'{first_key}__in': {key[0] for key in own},
+        }).values_list('pk', *target.natural_key)
+        for pk, *key in rows:
+            for archive_id in own.get(tuple(key), ()):
+                resolved[archive_id] = pk
+    if not others:
+        return resolved
+
+    candidates = target.model.objects.filter(**{
+        f'{target.owner}__username__in': {key[0] for key in others},
+        f'{first_key}__in': {key[1] for key in others},
+    }).exclude(**{target.owner: context.user})
+    # Only what other users share through published decks
+    if target.model is Deck:
+        candidates = candidates.filter(is_published=True)
+    else:
+        candidates = candidates.filter(deck__is_published=True)
+    for pk, *key in candidates.values_list('pk', f'{target.owner}__username', *target.natural_key):
+        for archive_id in others.get(tuple(key), ()):
+            resolved[archive_id] = pk
+    return resolved
@@ -0,0 +1,85 @@
+"""
+Conditional GET for per-user pages.
+
+A page that shows a user's cards, progress and sessions changes only when one
+of those rows does, so a handful of indexed aggregates (counts and latest
+change times) identify its content. They make up the page's ETag; a browser
+that already holds the page gets ``304 Not Modified`` without the view
+running its main queries or rendering a template.
+
+Only an ETag is sent for pages. Deleting a card changes a count but no
+timestamp, so ``If-Modified-Since`` alone could not notice it.
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib import messages
+from django.db.models import Count, Max, Sum
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .decks import visible_cards
+from .models import CardProgress, Deck, DeckSubscription, Job, StudySession
+from .writebehind import pending_reviews
+
+# Bump when page markup changes, so browsers do not keep reusing old pages
+PAGE_VERSION = 1
+
+
+def user_version(user):
+    """Counts and latest changes of everything the user's pages are built from"""
+    cards = visible_cards(user).aggregate(count=Count('pk'), changed=Max('updated_at'))
+    progress = CardProgress.objects.filter(user=user).aggregate(
+        count=Count('pk'), reviews=Sum('times_reviewed'), changed=Max('last_reviewed')
+    )
+    sessions = StudySession.objects.filter(user=user).aggregate(
+        count=Count('pk'), started=Max('started_at'), ended=Max('ended_at')
+    )
+    # Two aggregates rather than one over owner OR subscriber, which no index
+    # can answer and so scans every deck
+    owned = Deck.objects.filter(owner=user).aggregate(count=Count('pk'), changed=Max('updated_at'))
+    subscribed = DeckSubscription.objects.filter(user=user).aggregate(
+        count=Count('pk'), changed=Max('deck__updated_at')
+    )
+    return [cards, progress, sessions, owned, subscribed]
+
+
+def content_version(user):
+    """Short hash of ``user_version``; equal hashes mean the same card content"""
+    return hashlib.sha1(repr([user.pk, user_version(user)]).encode()).hexdigest()
+
+
+def user_etag(request, *args, **kwargs):
+    """ETag of a per-user page, or None when the page must be rendered anyway"""
+    # Rendering the page is what consumes pending flash messages
+    if len(messages.get_messages(request)):
+        return None
+    # The CSRF cookie is part of it: after a new login the cached page's form
+    # tokens would no longer be accepted
+    parts = [PAGE_VERSION, request.META.get('CSRF_COOKIE', ''), content_version(request.user)]
+    # Reviews buffered by write-behind show on the page before they reach the database
+    parts.append(len(pending_reviews(request.user.pk)))
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def conditional_page(view):
+    """Answer repeat visits to a per-user page with 304 while nothing changed
+
+    Pages are marked ``private, no-cache`` so browsers revalidate each visit
+    instead of showing a stale copy.
+    """
+    conditional_view = condition(etag_func=user_etag)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper
+
+
+def job_finished_at(request, pk):
+    """Last-Modified of a job's result file, which never changes once written"""
+    return Job.objects.filter(pk=pk, user=request.user, status=Job.STATUS_DONE).values_list(
+        'finished_at', flat=True
+    ).first()
@@ -0,0 +1,94 @@
+"""
+Shared decks.
+
+A published deck's cards are stored once, as the author's Flashcard rows.
+Subscribers see those rows next to their own cards, and their progress on
+them lives in the narrow CardProgress table. ``cards_for`` hides the
+difference from views: every card it returns is annotated with the viewing
+user's progress, whoever owns the row.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, FilteredRelation, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import CardProgress, DeckSubscription, Flashcard
+
+
+def visible_cards_filter(user):
+    """Q matching the user's own cards and the cards of decks they subscribe to"""
+    subscribed = DeckSubscription.objects.filter(user=user, deck__is_published=True).values('deck_id')
+    return Q(user=user) | Q(deck__in=subscribed)
+
+
+def visible_cards(user):
+    """Own and subscribed cards, without progress annotations"""
+    return Flashcard.objects.filter(visible_cards_filter(user))
+
+
+def cards_for(user):
+    """Own and subscribed cards annotated with the user's progress
+
+    Adds ``progress_reviews``, ``progress_correct``, ``progress_last_reviewed``,
+    ``progress_known`` and ``is_shared``. Filter and order on these instead of
+    the card's own progress columns, which belong to the card's author.
+    """
+    own = Q(user=user)
+    return visible_cards(user).annotate(
+        my_progress=FilteredRelation('progress_records', condition=Q(progress_records__user=user)),
+    ).annotate(
+        is_shared=Case(When(own, then=Value(False)), default=Value(True)),
+        progress_reviews=Case(
+            When(own, then=F('times_reviewed')), default=Coalesce(F('my_progress__times_reviewed'), 0)
+        ),
+        progress_correct=Case(
+            When(own, then=F('times_correct')), default=Coalesce(F('my_progress__times_correct'), 0)
+        ),
+        progress_last_reviewed=Case(
+            When(own, then=F('last_reviewed')), default=F('my_progress__last_reviewed')
+        ),
+        progress_known=Case(
+            When(own, then=F('is_known')), default=Coalesce(F('my_progress__is_known'), Value(False))
+        ),
+    )
+
+
+def record_shared_review(user, flashcard_id, is_correct, reviewed_at):
+    """Update the user's progress row for a shared card, creating it on first review"""
+    counts = {
+        'times_reviewed': F('times_reviewed') + 1,
+        'times_correct': F('times_correct') + (1 if is_correct else 0),
+        'last_reviewed': reviewed_at,
+        'is_known': is_correct,
+    }
+    progress = CardProgress.objects.filter(user=user, flashcard_id=flashcard_id)
+    if progress.update(**counts):
+        return
+    try:
+        with transaction.atomic():
+            CardProgress.objects.create(
+                user=user,
+                flashcard_id=flashcard_id,
+                times_reviewed=1,
+                times_correct=1 if is_correct else 0,
+                last_reviewed=reviewed_at,
+                is_known=is_correct,
+            )
+    except IntegrityError:
+        # A concurrent first review created the row
+        progress.update(**counts)
+
+
+def with_deck_counts(decks):
+    """Annotate decks with ``card_count`` and ``subscriber_count``
+
+    Each count is a correlated subquery; joining both relations at once would
+    multiply cards by subscribers.
+    """
+    cards = Flashcard.objects.filter(deck=OuterRef('pk')).order_by().values('deck').annotate(
+        count=Count('id')).values('count')
+    subscribers = DeckSubscription.objects.filter(deck=OuterRef('pk')).order_by().values('deck').annotate(
+        count=Count('id')).values('count')
+    return decks.annotate(
+        card_count=Coalesce(Subquery(cards), 0),
+        subscriber_count=Coalesce(Subquery(subscribers), 0),
+    )
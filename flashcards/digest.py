@@ -0,0 +1,91 @@
+"""
+Daily due-card digest emails.
+
+Users are walked in primary-key order, one batch at a time. Each batch costs
+a fixed handful of GROUP BY queries, whatever the number of users or cards,
+and its emails go out through one backend connection. The day's
+``DigestRun`` remembers the last user handled. An interrupted run therefore
+resumes after the last finished batch, and at most that one batch is sent
+twice.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Count, F
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import CardProgress, DeckSubscription, DigestRun, Flashcard
+
+DIGEST_BATCH_SIZE = 1000
+
+
+def due_counts(user_ids):
+    """Cards marked for review per user, own and subscribed, for the given users"""
+    counts = dict(
+        Flashcard.objects.filter(user_id__in=user_ids, is_known=False)
+        .values('user_id').annotate(count=Count('pk')).values_list('user_id', 'count')
+    )
+    # Shared cards are due unless the subscriber's progress says known
+    subscribed = (
+        DeckSubscription.objects.filter(user_id__in=user_ids, deck__is_published=True)
+        .values('user_id').annotate(count=Count('deck__cards')).values_list('user_id', 'count')
+    )
+    known = dict(
+        CardProgress.objects.filter(
+            user_id__in=user_ids,
+            is_known=True,
+            flashcard__deck__is_published=True,
+            flashcard__deck__subscriptions__user_id=F('user_id'),
+        ).values('user_id').annotate(count=Count('pk')).values_list('user_id', 'count')
+    )
+    for user_id, cards in subscribed:
+        counts[user_id] = counts.get(user_id, 0) + cards - known.get(user_id, 0)
+    return counts
+
+
+def send_digests(day=None, batch_size=DIGEST_BATCH_SIZE, progress=None):
+    """Email every active user with cards to review, once per day
+
+    Returns the day's DigestRun. Calling it again on a day whose run has
+    finished does nothing.
+    """
+    run, _ = DigestRun.objects.get_or_create(date=day or timezone.localdate())
+    if run.finished_at:
+        return run
+
+    subject_template = get_template('flashcards/email/digest_subject.txt')
+    body_template = get_template('flashcards/email/digest.txt')
+    study_url = settings.FLASHCARD_SITE_URL.rstrip('/') + reverse('flashcards:study_mode') + '?only_review=1'
+    users = User.objects.filter(is_active=True).exclude(email='').order_by('pk')
+
+    with get_connection() as connection:
+        while True:
+            batch = list(users.filter(pk__gt=run.last_user_id).values_list('pk', 'username', 'email')[:batch_size])
+            if not batch:
+                break
+            counts = due_counts([pk for pk, _, _ in batch])
+            messages = []
+            for pk, username, email in batch:
+                if counts.get(pk, 0) <= 0:
+                    continue
+                context = {'username': username, 'due': counts[pk], 'study_url': study_url}
+                messages.append(EmailMessage(
+                    subject=subject_template.render(context).strip(),
+                    body=body_template.render(context),
+                    to=[email],
+                    connection=connection,
+                ))
+            if messages:
+                connection.send_messages(messages)
+
+            run.last_user_id = batch[-1][0]
+            run.sent += len(messages)
+            run.save(update_fields=['last_user_id', 'sent'])
+            if progress:
+                progress(run.sent)
+
+    run.finished_at = timezone.now()
+    run.save(update_fields=['finished_at'])
+    return run
@@ -0,0 +1,244 @@
+"""
+Retention forecast for the statistics page.
+
+Recall is modelled with an exponential forgetting curve, ``exp(-t / S)``,
+where the stability ``S`` of a card grows by a constant factor with every
+correct answer in a row: ``S = base * growth ** streak``. ``base`` and
+``growth`` are fitted per user by maximum likelihood over the intervals
+between consecutive reviews of the same card, evaluated for a whole grid of
+candidate values at once with NumPy.
+
+With the fitted curve every card gets a predicted recall and the date on
+which it drops below TARGET_RECALL. The due-card projection assumes each card
+is reviewed on its due day and recalled, which pushes its next due date out.
+The result is cached per user until their next review.
+"""
+import math
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from .decks import cards_for
+from .models import Review
+
+FORECAST_DAYS = 30
+FORECAST_CACHE_TIMEOUT = 60 * 60
+TARGET_RECALL = 0.9
+# Reviews older than this are ignored, which bounds the work for old accounts
+HISTORY_DAYS = 365
+# The fit uses the most recent intervals only; more barely moves the optimum
+MAX_FIT_INTERVALS = 20000
+MIN_FIT_INTERVALS = 20
+
+DEFAULT_BASE = 1.0
+DEFAULT_GROWTH = 2.5
+BASE_GRID = np.geomspace(0.1, 30.0, 32)
+GROWTH_GRID = np.linspace(1.2, 5.0, 20)
+# Long streaks would otherwise overflow; a century is as good as forever
+MAX_STABILITY = 36500.0
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def forecast_cache_key(user_id):
+    return f'forecast:{user_id}'
+
+
+def invalidate_forecast(user_id):
+    """Forget the cached forecast of a user, e.g. after a review"""
+    cache.delete(forecast_cache_key(user_id))
+
+
+def get_forecast(user):
+    """Due-card projection and predicted recall per topic, as compact lists
+
+    ``days`` rows are ``[date, cards due]`` and ``topics`` rows are
+    ``[topic, reviewed cards, recall % now, recall % in FORECAST_DAYS days]``.
+    """
+    key = forecast_cache_key(user.pk)
+    forecast = cache.get(key)
+    # Due counts are bucketed by day, so a forecast from yesterday is stale
+    if forecast is None or forecast['start'] != timezone.localdate().isoformat():
+        forecast = compute_forecast(user)
+        cache.set(key, forecast, FORECAST_CACHE_TIMEOUT)
+    return forecast
+
+
+def compute_forecast(user):
+    """Fit the user's forgetting curve and project it over all of their cards"""
+    today = timezone.localdate()
+    start = timezone.make_aware(datetime.combine(today, time.min)).timestamp()
+    now = timezone.now().timestamp()
+
+    rows = list(cards_for(user).order_by('pk').values_list(
+        'pk', 'topic', 'progress_last_reviewed', 'progress_known'
+    ))
+    card_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    topics = [row[1] for row in rows]
+    last_reviewed = np.array(
+        [row[2].timestamp() if row[2] else np.nan for row in rows], dtype=np.float64
+    )
+    # Cards reviewed before the review log existed only know their last answer
+    streaks = np.array([1 if row[3] else 0 for row in rows], dtype=np.int64)
+
+    history = load_history(user, since=now - HISTORY_DAYS * SECONDS_PER_DAY)
+    intervals, outcomes, prior_streaks, latest = review_intervals(*history)
+    base, growth, fitted = fit_curve(intervals, outcomes, prior_streaks)
+
+    # Prefer the streak from the log for cards that have one
+    logged_ids, logged_streaks = latest
+    if len(card_ids) and len(logged_ids):
+        position = np.minimum(np.searchsorted(card_ids, logged_ids), len(card_ids) - 1)
+        matched = card_ids[position] == logged_ids
+        streaks[position[matched]] = logged_streaks[matched]
+
+    reviewed = ~np.isnan(last_reviewed)
+    stability = card_stability(base, growth, streaks[reviewed])
+    elapsed = np.maximum(now - last_reviewed[reviewed], 0) / SECONDS_PER_DAY
+    recall_now = np.exp(-elapsed / stability)
+    recall_later = np.exp(-(elapsed + FORECAST_DAYS) / stability)
+
+    # Day on which each reviewed card first drops below the target recall
+    due_at = last_reviewed[reviewed] + interval_days(stability) * SECONDS_PER_DAY
+    due_day = np.maximum(np.floor((due_at - start) / SECONDS_PER_DAY), 0).astype(np.int64)
+    due = project_due(due_day, streaks[reviewed].copy(), base, growth)
+
+    return {
+        'start': today.isoformat(),
+        'days': [
+            [(today + timedelta(days=offset)).isoformat(), int(count)]
+            for offset, count in enumerate(due)
+        ],
+        'overdue': int(np.count_nonzero(due_at < now)),
+        'new': int(np.count_nonzero(~reviewed)),
+        'recall': round(float(recall_now.mean()) * 100) if len(recall_now) else None,
+        'topics': topic_recall([t for t, r in zip(topics, reviewed) if r], recall_now, recall_later),
+        'model': {
+            'stability_days': round(base, 2),
+            'growth': round(growth, 2),
+            'intervals': int(len(intervals)),
+            'fitted': fitted,
+        },
+    }
+
+
+def load_history(user, since):
+    """Card ids, timestamps and outcomes of the user's recent reviews"""
+    since = datetime.fromtimestamp(since, tz=dt_timezone.utc)
+    rows = (
+        Review.objects
+        .filter(user=user, reviewed_at__gte=since)
+        .order_by()
+        .values_list('flashcard_id', 'reviewed_at', 'is_correct')
+    )
+    card_ids, times, correct = [], [], []
+    for card_id, reviewed_at, is_correct in rows.iterator(chunk_size=5000):
+        card_ids.append(card_id)
+        times.append(reviewed_at.timestamp())
+        correct.append(is_correct)
+    return (
+        np.array(card_ids, dtype=np.int64),
+        np.array(times, dtype=np.float64),
+        np.array(correct, dtype=bool),
+    )
+
+
+def review_intervals(card_ids, times, correct):
+    """Turn a review log into fitting data and each card's current streak
+
+    Returns the days between consecutive reviews of a card (oldest first),
+    whether the later review was correct, the card's correct-answer streak
+    before it, and the ids and final streaks of every card in the log.
+    """
+    if not len(card_ids):
+        empty = np.zeros(0, dtype=np.int64)
+        return np.zeros(0), np.zeros(0, dtype=bool), empty, (empty, empty)
+
+    order = np.lexsort((times, card_ids))
+    card_ids, times, correct = card_ids[order], times[order], correct[order]
+    index = np.arange(len(card_ids))
+    first = np.ones(len(card_ids), dtype=bool)
+    first[1:] = card_ids[1:] != card_ids[:-1]
+
+    # Correct answers in a row, ending at each review: the distance back to
+    # the last wrong answer, or to just before the card's first review
+    resets = np.where(~correct, index, np.where(first, index - 1, -1))
+    streak = index - np.maximum.accumulate(resets)
+
+    # Oldest first, so the most recent intervals are the ones kept for fitting
+    follow = np.flatnonzero(~first)
+    follow = follow[np.argsort(times[follow], kind='stable')]
+    intervals = (times[follow] - times[follow - 1]) / SECONDS_PER_DAY
+    prior_streaks = streak[follow - 1]
+    outcomes = correct[follow]
+
+    last = np.ones(len(card_ids), dtype=bool)
+    last[:-1] = first[1:]
+    return intervals, outcomes, prior_streaks, (card_ids[last], streak[last])
+
+
+def fit_curve(intervals, outcomes, streaks):
+    """Maximum-likelihood ``(base, growth, fitted)`` of the forgetting curve
+
+    Falls back to defaults when there are too few intervals to say anything.
+    """
+    if len(intervals) < MIN_FIT_INTERVALS:
+        return DEFAULT_BASE, DEFAULT_GROWTH, False
+    intervals = intervals[-MAX_FIT_INTERVALS:]
+    outcomes = outcomes[-MAX_FIT_INTERVALS:]
+    streaks = streaks[-MAX_FIT_INTERVALS:]
+
+    # Log-likelihood of every base for one growth at a time, which keeps the
+    # temporaries at len(BASE_GRID) x MAX_FIT_INTERVALS
+    likelihood = np.empty((len(BASE_GRID), len(GROWTH_GRID)))
+    for column, growth in enumerate(GROWTH_GRID):
+        stability = card_stability(BASE_GRID[:, None], growth, streaks[None, :])
+        recall = np.clip(np.exp(-intervals[None, :] / stability), 1e-6, 1 - 1e-6)
+        likelihood[:, column] = np.where(outcomes, np.log(recall), np.log1p(-recall)).sum(axis=1)
+
+    best_base, best_growth = np.unravel_index(np.argmax(likelihood), likelihood.shape)
+    return float(BASE_GRID[best_base]), float(GROWTH_GRID[best_growth]), True
+
+
+def card_stability(base, growth, streaks):
+    """Stability in days of cards with the given correct-answer streaks"""
+    return np.minimum(base * growth ** streaks.astype(np.float64), MAX_STABILITY)
+
+
+def interval_days(stability):
+    """Days until recall drops to TARGET_RECALL, at least one"""
+    return np.maximum(stability * -math.log(TARGET_RECALL), 1.0)
+
+
+def project_due(due_day, streaks, base, growth):
+    """Count reviews per day over the forecast, rescheduling each one
+
+    Every pass moves all cards due inside the window forward by at least a
+    day, so there are at most FORECAST_DAYS passes over the card arrays.
+    """
+    counts = np.zeros(FORECAST_DAYS, dtype=np.int64)
+    pending = due_day < FORECAST_DAYS
+    while pending.any():
+        counts += np.bincount(due_day[pending], minlength=FORECAST_DAYS)
+        streaks[pending] += 1
+        due_day[pending] += np.rint(interval_days(card_stability(base, growth, streaks[pending]))).astype(np.int64)
+        pending &= due_day < FORECAST_DAYS
+    return counts
+
+
+def topic_recall(topics, recall_now, recall_later):
+    """Mean predicted recall per topic, most cards first"""
+    if not topics:
+        return []
+    names, codes = np.unique(np.array(topics, dtype=object), return_inverse=True)
+    cards = np.bincount(codes)
+    now = np.bincount(codes, weights=recall_now) / cards
+    later = np.bincount(codes, weights=recall_later) / cards
+    rows = [
+        [str(name), int(count), round(float(n) * 100), round(float(l) * 100)]
+        for name, count, n, l in zip(names, cards, now, later)
+    ]
+    return sorted(rows, key=lambda row: (-row[1], row[0]))
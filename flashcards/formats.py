@@ -0,0 +1,281 @@
+"""
+Import and export formats for flashcards.
+
+Every importer is a generator that yields plain dicts with ``topic``, ``front``
+and ``back`` keys, so all formats share the batched insert path in
+``import_rows`` and never hold a whole file in memory.
+"""
+import codecs
+import csv
+import html
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+from itertools import islice
+
+from django.db import transaction
+from django.utils.html import strip_tags
+
+from .images import resolve_images, store_image
+from .models import Flashcard, ImageAsset
+from .similarity import store_vectors
+
+IMPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 2000
+
+CSV_HEADER = ['Topic', 'Question (Front)', 'Answer (Back)', 'Created Date', 'Times Reviewed', 'Success Rate']
+
+# Anki separates note fields with the ASCII unit separator
+ANKI_FIELD_SEPARATOR = '\x1f'
+ANKI_COLLECTIONS = ('collection.anki21', 'collection.anki2')
+ANKI_LINE_BREAK = re.compile(r'<br\s*/?>|</div>|</p>', re.IGNORECASE)
+ANKI_SOUND = re.compile(r'\[sound:[^\]]*\]')
+ANKI_IMAGE = re.compile(r'<img[^>]*\ssrc=["\']?([^"\'>]+)', re.IGNORECASE)
+
+
+def iter_csv_rows(fileobj):
+    """Yield flashcard rows from a CSV upload, one line at a time"""
+    reader = csv.DictReader(codecs.iterdecode(fileobj, 'utf-8-sig'))
+    for row in reader:
+        yield {
+            'topic': row.get('Topic', 'Imported'),
+            'front': row.get('Question (Front)', row.get('Front', '')),
+            'back': row.get('Answer (Back)', row.get('Back', '')),
+        }
+
+
+def iter_jsonl_rows(fileobj):
+    """Yield flashcard rows from a JSON Lines upload"""
+    for line_number, line in enumerate(codecs.iterdecode(fileobj, 'utf-8-sig'), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise ValueError(f'Line {line_number} is not valid JSON')
+        if not isinstance(row, dict):
+            raise ValueError(f'Line {line_number} is not a JSON object')
+        yield row
+
+
+def iter_apkg_rows(fileobj):
+    """Yield flashcard rows from an Anki .apkg package
+
+    The package is a zip holding a SQLite collection. The collection is copied
+    to a temporary file (SQLite cannot read from inside a zip) and the notes
+    are streamed from a cursor, so memory stays bounded for large decks. The
+    first image of each field is stored as the card side's image.
+    """
+    with zipfile.ZipFile(fileobj) as package:
+        names = set(package.namelist())
+        collection = next((name for name in ANKI_COLLECTIONS if name in names), None)
+        if collection is None:
+            if 'collection.anki21b' in names:
+                raise ValueError('This Anki package uses the newer compressed format. '
+                                 'Export it from Anki with "Support older Anki versions" enabled.')
+            raise ValueError('Not an Anki package: no collection database found')
+
+        with tempfile.NamedTemporaryFile(suffix='.anki2', delete=False) as tmp:
+            with package.open(collection) as source:
+                shutil.copyfileobj(source, tmp)
+
+        media = AnkiMedia(package)
+        try:
+            connection = sqlite3.connect(tmp.name)
+            try:
+                deck_names = _anki_deck_names(connection)
+                cursor = connection.execute(
+                    'SELECT n.flds, MIN(c.did) FROM notes n LEFT JOIN cards c ON c.nid = n.id '
+                    'GROUP BY n.id ORDER BY n.id'
+                )
+                for fields, deck_id in cursor:
+                    fields = fields.split(ANKI_FIELD_SEPARATOR)
+                    back = fields[1] if len(fields) > 1 else ''
+                    yield {
+                        'topic': deck_names.get(deck_id, 'Imported'),
+                        'front': _anki_text(fields[0]),
+                        'back': _anki_text(back),
+                        'front_image': media.image_for(fields[0]),
+                        'back_image': media.image_for(back),
+                    }
+            finally:
+                connection.close()
+        finally:
+            os.unlink(tmp.name)
+
+
+class AnkiMedia:
+    """Store images referenced by Anki fields, each package file only once"""
+
+    def __init__(self, package):
+        self.package = package
+        try:
+            # The media map is {"0": "diagram.png", ...}; files are stored by number
+            self.members = {name: member for member, name in json.loads(package.read('media')).items()}
+        except (KeyError, ValueError):
+            self.members = {}
+        self.stored = {}
+
+    def image_for(self, field):
+        """Return the ImageAsset of the first usable image in ``field``"""
+        for filename in ANKI_IMAGE.findall(field):
+            filename = html.unescape(filename)
+            if filename not in self.stored:
+                self.stored[filename] = self._store(filename)
+            if self.stored[filename]:
+                return self.stored[filename]
+        return None
+
+    def _store(self, filename):
+        member = self.members.get(filename)
+        if member is None:
+            return None
+        try:
+            with self.package.open(member) as source:
+                return store_image(source)
+        except (KeyError, ValueError):
+            return None
+
+
+def _anki_deck_names(connection):
+    """Map Anki deck ids to display names for old and new collection schemas"""
+    try:
+        row = connection.execute('SELECT decks FROM col').fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    decks = json.loads(row[0]) if row and row[0] else {}
+    if decks:
+        return {int(deck_id): deck['name'] for deck_id, deck in decks.items()}
+
+    # Schema 18+ keeps decks in their own table with a unit-separated hierarchy
+    try:
+        rows = connection.execute('SELECT id, name FROM decks').fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {deck_id: name.replace(ANKI_FIELD_SEPARATOR, '::') for deck_id, name in rows}
+
+
+def _anki_text(value):
+    """Convert an Anki HTML field to plain text"""
+    value = ANKI_SOUND.sub('', value)
+    value = ANKI_LINE_BREAK.sub('\n', value)
+    return html.unescape(strip_tags(value)).strip()
+
+
+IMPORTERS = {
+    '.csv': iter_csv_rows,
+    '.jsonl': iter_jsonl_rows,
+    '.apkg': iter_apkg_rows,
+}
+
+
+def get_importer(filename):
+    """Return the row iterator for a file name, based on its extension"""
+    extension = os.path.splitext(filename)[1].lower()
+    try:
+        return IMPORTERS[extension]
+    except KeyError:
+        raise ValueError(f'Unsupported file type "{extension}". Use .csv, .jsonl or .apkg')
+
+
+def import_rows(user, rows, batch_size=IMPORT_BATCH_SIZE, progress=None, skip=0):
+    """Create flashcards for ``user`` from ``rows`` in batches and return the count
+
+    Each batch is committed on its own so that progress is visible while a
+    long import runs. ``progress`` is called with the running count inside
+    each batch's transaction, so the count it records always matches the
+    cards committed. Passing that count back as ``skip`` resumes an
+    interrupted import without duplicating cards.
+    """
+    rows = islice(rows, skip, None)
+    count = skip
+    while True:
+        rows_batch = list(islice(rows, batch_size))
+        if not rows_batch:
+            break
+        # Image hashes from the file only attach to images the user can
+        # already see; the package's own images arrive as ImageAssets
+        images = resolve_images(
+            (row.get(field) for row in rows_batch for field in ('front_image', 'back_image')), user
+        )
+        batch = [
+            Flashcard(
+                user=user,
+                topic=(row.get('topic') or 'Imported')[:100],
+                front=row.get('front') or '',
+                back=row.get('back') or '',
+                front_image_id=_image_id(row.get('front_image'), images),
+                back_image_id=_image_id(row.get('back_image'), images),
+            )
+            for row in rows_batch
+        ]
+        for card in batch:
+            card.render_content()
+        count += len(batch)
+        with transaction.atomic():
+            Flashcard.objects.bulk_create(batch)
+            store_vectors(batch)
+            if progress:
+                progress(count)
+    return count
+
+
+def _image_id(value, images):
+    """Return the hash to attach for a row's image value, or None"""
+    if isinstance(value, ImageAsset):
+        return value.sha256
+    return value if value in images else None
+
+
+class Echo:
+    """File-like object that returns what is written, for streaming csv output"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv_lines(flashcards):
+    """Yield CSV export lines for a flashcard queryset"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for card in flashcards.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow([
+            card.topic,
+            card.front,
+            card.back,
+            card.created_at.strftime('%Y-%m-%d'),
+            getattr(card, 'progress_reviews', card.times_reviewed),
+            f"{card.get_success_rate()}%"
+        ])
+
+
+def iter_jsonl_lines(flashcards):
+    """Yield JSON Lines export lines for a flashcard queryset"""
+    for card in flashcards.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        # Querysets from decks.cards_for() carry the exporting user's progress
+        last_reviewed = getattr(card, 'progress_last_reviewed', card.last_reviewed)
+        yield json.dumps({
+            'topic': card.topic,
+            'front': card.front,
+            'back': card.back,
+            'front_html': card.front_html,
+            'back_html': card.back_html,
+            'front_image': card.front_image_id,
+            'back_image': card.back_image_id,
+            'created_at': card.created_at.isoformat(),
+            'times_reviewed': getattr(card, 'progress_reviews', card.times_reviewed),
+            'times_correct': getattr(card, 'progress_correct', card.times_correct),
+            'last_reviewed': last_reviewed.isoformat() if last_reviewed else None,
+            'is_known': getattr(card, 'progress_known', card.is_known),
+        }) + '\n'
+
+
+EXPORTERS = {
+    'csv': (iter_csv_lines, 'text/csv', 'flashcards.csv'),
+    'jsonl': (iter_jsonl_lines, 'application/x-ndjson', 'flashcards.jsonl'),
+}
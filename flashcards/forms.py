@@ -1,13 +1,34 @@
 from django import forms
-from .models import Flashcard
+from .models import Deck, Flashcard
+from .images import check_image, store_image
 
 
 class FlashcardForm(forms.ModelForm):
     """Form for creating and editing flashcards"""
+    front_image_upload = forms.ImageField(
+        required=False,
+        label='Question Image',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': 'image/*'})
+    )
+    back_image_upload = forms.ImageField(
+        required=False,
+        label='Answer Image',
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': 'image/*'})
+    )
+    remove_front_image = forms.BooleanField(
+        required=False,
+        label='Remove question image',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+    remove_back_image = forms.BooleanField(
+        required=False,
+        label='Remove answer image',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
     
     class Meta:
         model = Flashcard
-        fields = ['front', 'back', 'topic']
+        fields = ['front', 'back', 'topic', 'deck']
         widgets = {
             'front': forms.Textarea(attrs={
                 'class': 'form-control',
@@ -23,12 +44,88 @@ class FlashcardForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'e.g., Mathematics, History, Biology'
             }),
+            'deck': forms.Select(attrs={
+                'class': 'form-select'
+            }),
         }
         labels = {
             'front': 'Question (Front)',
             'back': 'Answer (Back)',
             'topic': 'Topic/Subject',
+            'deck': 'Deck',
         }
+    
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Cards can only be added to the author's own decks
+        self.fields['deck'].queryset = Deck.objects.filter(owner=user) if user else Deck.objects.none()
+        self.fields['deck'].empty_label = 'No deck (personal card)'
+    
+    def image_fields(self):
+        """(side, upload field, remove field, current image hash) for each card side"""
+        return [
+            (side, self[f'{side}_image_upload'], self[f'remove_{side}_image'],
+             getattr(self.instance, f'{side}_image_id'))
+            for side in ('front', 'back')
+        ]
+    
+    def clean(self):
+        """Check uploaded images; they are only stored once the whole form is valid"""
+        cleaned_data = super().clean()
+        for side in ('front', 'back'):
+            upload = cleaned_data.get(f'{side}_image_upload')
+            if upload:
+                try:
+                    check_image(upload)
+                except ValueError as e:
+                    self.add_error(f'{side}_image_upload', str(e))
+        return cleaned_data
+    
+    def save(self, commit=True):
+        """Store uploaded images, reusing identical images already on the server"""
+        flashcard = super().save(commit=False)
+        for side in ('front', 'back'):
+            if self.cleaned_data.get(f'{side}_image_upload'):
+                setattr(flashcard, f'{side}_image', store_image(self.cleaned_data[f'{side}_image_upload']))
+            elif self.cleaned_data.get(f'remove_{side}_image'):
+                setattr(flashcard, f'{side}_image', None)
+        if commit:
+            flashcard.save()
+        return flashcard
+
+
+class DeckForm(forms.ModelForm):
+    """Form for creating and editing decks"""
+    add_topic = forms.ChoiceField(
+        required=False,
+        label='Add cards from topic',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    
+    class Meta:
+        model = Deck
+        fields = ['title', 'description', 'is_published']
+        widgets = {
+            'title': forms.TextInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'e.g., Human Anatomy 101'
+            }),
+            'description': forms.Textarea(attrs={
+                'class': 'form-control',
+                'rows': 3,
+                'placeholder': 'What does this deck cover?'
+            }),
+            'is_published': forms.CheckboxInput(attrs={
+                'class': 'form-check-input'
+            }),
+        }
+        labels = {
+            'is_published': 'Published',
+        }
+    
+    def __init__(self, *args, topics=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['add_topic'].choices = [('', '---------')] + [(topic, topic) for topic in topics]
 
 
 class FlashcardSearchForm(forms.Form):
@@ -0,0 +1,121 @@
+"""
+Content-addressed image storage for card attachments.
+
+An image is stored once under its SHA-256 hash, no matter how many cards use
+it, and its thumbnail is generated once when it is first stored. Because the
+URL contains the hash, files can be served with immutable cache headers.
+"""
+import hashlib
+import io
+
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from PIL import Image, UnidentifiedImageError
+
+from .decks import visible_cards
+from .models import ImageAsset
+
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+THUMBNAIL_SIZE = (400, 400)
+
+CONTENT_TYPES = {
+    'PNG': ('image/png', 'png'),
+    'JPEG': ('image/jpeg', 'jpg'),
+    'GIF': ('image/gif', 'gif'),
+    'WEBP': ('image/webp', 'webp'),
+}
+
+
+def store_image(fileobj):
+    """Store an image file and return its ImageAsset, reusing an existing one
+
+    Raises ValueError for files that are too large or not a supported image.
+    """
+    data = read_image_data(fileobj)
+    sha256 = hashlib.sha256(data).hexdigest()
+    asset = ImageAsset.objects.filter(sha256=sha256).first()
+    if asset is not None:
+        return asset
+
+    image = open_image(data)
+    content_type, extension = CONTENT_TYPES[image.format]
+
+    asset = ImageAsset(
+        sha256=sha256,
+        content_type=content_type,
+        width=image.width,
+        height=image.height,
+        size=len(data),
+    )
+    prefix = f'{sha256[:2]}/{sha256}'
+    asset.image.save(f'{prefix}.{extension}', ContentFile(data), save=False)
+    asset.thumbnail.save(f'{prefix}.webp', ContentFile(make_thumbnail(image)), save=False)
+
+    try:
+        with transaction.atomic():
+            asset.save(force_insert=True)
+    except IntegrityError:
+        # Another request stored the same image first
+        asset.image.delete(save=False)
+        asset.thumbnail.delete(save=False)
+        asset = ImageAsset.objects.get(sha256=sha256)
+    return asset
+
+
+def check_image(fileobj):
+    """Raise ValueError unless store_image would accept the file, without storing it"""
+    open_image(read_image_data(fileobj))
+    fileobj.seek(0)
+
+
+def read_image_data(fileobj):
+    """Read an image file, raising ValueError if it is too large"""
+    data = fileobj.read(MAX_IMAGE_BYTES + 1)
+    if len(data) > MAX_IMAGE_BYTES:
+        raise ValueError(f'Images must be smaller than {MAX_IMAGE_BYTES // (1024 * 1024)} MB')
+    return data
+
+
+def open_image(data):
+    """Decode image bytes, raising ValueError unless they are a supported format"""
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError):
+        raise ValueError('Upload a valid PNG, JPEG, GIF or WebP image')
+    if image.format not in CONTENT_TYPES:
+        raise ValueError('Upload a valid PNG, JPEG, GIF or WebP image')
+    return image
+
+
+def make_thumbnail(image):
+    """Return WebP bytes of ``image`` scaled down to fit THUMBNAIL_SIZE"""
+    thumbnail = image.copy()
+    if thumbnail.mode not in ('RGB', 'RGBA'):
+        thumbnail = thumbnail.convert('RGBA')
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+    output = io.BytesIO()
+    thumbnail.save(output, 'WEBP', quality=80)
+    return output.getvalue()
+
+
+def resolve_images(shas, user=None):
+    """Map the given content hashes to the ones that exist as ImageAssets
+
+    With ``user``, only hashes of images on cards that user can see are kept,
+    so knowing a hash is not enough to get hold of someone else's image.
+    """
+    shas = {sha for sha in shas if isinstance(sha, str) and sha}
+    if not shas:
+        return set()
+    assets = ImageAsset.objects.filter(sha256__in=shas)
+    if user is not None:
+        assets = assets.filter(visible_images_filter(user))
+    return set(assets.values_list('sha256', flat=True))
+
+
+def visible_images_filter(user):
+    """Q matching the images on the user's own and subscribed cards"""
+    cards = visible_cards(user)
+    return Q(sha256__in=cards.values('front_image_id')) | Q(sha256__in=cards.values('back_image_id'))
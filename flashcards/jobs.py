@@ -0,0 +1,251 @@
+"""
+Database-backed job queue.
+
+Jobs are rows in ``flashcards_job``. Workers started with ``manage.py
+run_worker`` claim them with a conditional UPDATE, so several worker
+processes can share the queue without a broker and a job only ever runs once.
+Handlers are registered with ``@job_handler('kind')``.
+"""
+import logging
+import os
+import socket
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .activity import invalidate_activity
+from .analytics import refresh_analytics
+from .backup import restore_backup
+from .decks import cards_for
+from .digest import send_digests
+from .forecast import invalidate_forecast
+from .formats import EXPORTERS, get_importer, import_rows
+from .models import Job, ScheduledJob
+from .purge import PURGE_BATCH_SIZE, purge_user
+from .quiz import invalidate_quiz_pools
+from .sessions import compact_sessions
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+# Running jobs that have not reported progress for this long have lost their
+# worker and are retried
+STALE_JOB_TIMEOUT = timedelta(hours=1)
+MAX_ATTEMPTS = 3
+PROGRESS_EVERY = 1000
+
+
+def job_handler(kind):
+    """Register ``func(job)`` as the handler for jobs of ``kind``"""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, user=None, payload=None, input_file=None, run_at=None):
+    """Add a job to the queue and return it
+
+    With ``FLASHCARD_JOBS_EAGER`` enabled the job runs immediately in the
+    current process, which is handy for development without a worker.
+    """
+    job = Job(kind=kind, user=user, payload=payload or {}, run_at=run_at or timezone.now())
+    if input_file is not None:
+        job.input_file.save(os.path.basename(input_file.name), input_file, save=False)
+    job.save()
+
+    if getattr(settings, 'FLASHCARD_JOBS_EAGER', False):
+        now = timezone.now()
+        if Job.objects.filter(pk=job.pk, status=Job.STATUS_QUEUED).update(
+                status=Job.STATUS_RUNNING, started_at=now, heartbeat_at=now, attempts=1):
+            job.refresh_from_db()
+            run_job(job)
+    return job
+
+
+def worker_id():
+    """Identify this worker process in ``Job.locked_by``"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next_job(worker, limit=10):
+    """Atomically claim the oldest due job, or return None if the queue is empty
+
+    Only the worker whose UPDATE changes the row from queued to running owns
+    the job, which gives row-level claiming on SQLite and Postgres alike.
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(
+        status=Job.STATUS_QUEUED, run_at__lte=now
+    ).order_by('run_at', 'id').values_list('pk', flat=True)[:limit]
+
+    for pk in candidates:
+        claimed = Job.objects.filter(pk=pk, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING,
+            locked_by=worker,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome"""
+    handler = HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f'No handler registered for job kind "{job.kind}"')
+        handler(job)
+    except Exception as e:
+        logger.exception('Job %s failed', job.pk)
+        job.status = Job.STATUS_FAILED
+        job.message = str(e)
+    else:
+        job.status = Job.STATUS_DONE
+    job.finished_at = timezone.now()
+    # input_file too: handlers delete the upload once it has been read
+    job.save(update_fields=['status', 'message', 'input_file', 'result_file', 'finished_at'])
+    return job
+
+
+def requeue_stale_jobs():
+    """Put back jobs whose worker died mid-run, failing them after MAX_ATTEMPTS
+
+    Only the heartbeat counts, so a long job that keeps reporting progress is
+    never run a second time while its worker is still busy with it.
+    """
+    cutoff = timezone.now() - STALE_JOB_TIMEOUT
+    stale = Job.objects.filter(status=Job.STATUS_RUNNING).filter(
+        # Jobs claimed before heartbeats were recorded
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=Job.STATUS_FAILED, finished_at=timezone.now(), message='Worker stopped responding'
+    )
+    return stale.filter(attempts__lt=MAX_ATTEMPTS).update(status=Job.STATUS_QUEUED, locked_by='')
+
+
+def sync_schedules():
+    """Create ScheduledJob rows for the kinds listed in FLASHCARD_JOB_SCHEDULE"""
+    for kind, interval_minutes in getattr(settings, 'FLASHCARD_JOB_SCHEDULE', {}).items():
+        ScheduledJob.objects.get_or_create(kind=kind, defaults={'interval_minutes': interval_minutes})
+
+
+def enqueue_due_schedules():
+    """Enqueue every recurring job that is due and return how many were enqueued
+
+    Moving ``next_run_at`` forward is a conditional UPDATE, so when several
+    workers look at the same schedule only one of them enqueues it.
+    """
+    now = timezone.now()
+    enqueued = 0
+    for schedule in ScheduledJob.objects.filter(is_active=True, next_run_at__lte=now):
+        next_run_at = now + timedelta(minutes=schedule.interval_minutes)
+        if ScheduledJob.objects.filter(pk=schedule.pk, next_run_at=schedule.next_run_at).update(
+                next_run_at=next_run_at):
+            enqueue(schedule.kind)
+            enqueued += 1
+    return enqueued
+
+
+@job_handler('import_flashcards')
+def import_flashcards_job(job):
+    """Import the uploaded file of an import job
+
+    ``job.progress`` is committed together with each batch of cards, so a
+    retried job skips the rows an earlier attempt already imported.
+    """
+    importer = get_importer(job.payload.get('filename', job.input_file.name))
+    try:
+        with job.input_file.open('rb') as import_file:
+            count = import_rows(job.user, importer(import_file), progress=job.set_progress, skip=job.progress)
+    finally:
+        job.input_file.delete(save=False)
+    invalidate_quiz_pools(job.user_id)
+    job.message = f'Successfully imported {count} flashcards!'
+
+
+@job_handler('export_flashcards')
+def export_flashcards_job(job):
+    """Write the user's flashcards to a downloadable file"""
+    iter_lines, _, filename = EXPORTERS[job.payload.get('format', 'csv')]
+    flashcards = cards_for(job.user)
+    job.set_progress(0, total=flashcards.count())
+
+    with tempfile.TemporaryFile('w+b') as output:
+        for line_number, line in enumerate(iter_lines(flashcards), start=1):
+            output.write(line.encode('utf-8'))
+            if line_number % PROGRESS_EVERY == 0:
+                job.set_progress(line_number)
+        output.seek(0)
+        job.result_file.save(filename, File(output), save=False)
+    job.set_progress(job.total)
+    job.message = f'Exported {job.total} flashcards.'
+
+
+@job_handler('restore_backup')
+def restore_backup_job(job):
+    """Restore an uploaded backup archive into the job owner's account"""
+    try:
+        with job.input_file.open('rb') as archive:
+            created = restore_backup(job.user, archive, progress=job.set_progress)
+    finally:
+        job.input_file.delete(save=False)
+    invalidate_activity(job.user_id)
+    invalidate_forecast(job.user_id)
+    invalidate_quiz_pools(job.user_id)
+    job.message = (f"Restored {created['flashcards.jsonl']} flashcards, "
+                   f"{created['study_sessions.jsonl']} study sessions and {created['reviews.jsonl']} reviews.")
+
+
+@job_handler('refresh_analytics')
+def refresh_analytics_job(job):
+    """Fold new rows into the operator analytics tables"""
+    processed = refresh_analytics(progress=job.set_progress)
+    job.message = f"Processed {processed['reviews']} reviews and {processed['flashcards']} flashcards."
+
+
+@job_handler('compact_sessions')
+def compact_sessions_job(job):
+    """Delete abandoned study sessions and summarise old ones"""
+    result = compact_sessions(progress=job.set_progress)
+    job.message = f"Deleted {result['deleted']} abandoned sessions and summarised {result['compacted']}."
+
+
+@job_handler('purge_user')
+def purge_user_job(job):
+    """Delete the account in ``payload['user_id']`` with all of its data
+
+    The account is named in the payload rather than ``job.user``, which would
+    delete the job itself along with the account.
+    """
+    user = User.objects.filter(pk=job.payload['user_id']).first()
+    if user is None:
+        job.message = 'The account was already deleted.'
+        return
+    username = user.username
+    deleted = purge_user(
+        user,
+        batch_size=job.payload.get('batch_size', PURGE_BATCH_SIZE),
+        progress=lambda done, total: job.set_progress(done, total=total),
+    )
+    job.message = f'Deleted {username} and {deleted} rows of their data.'
+
+
+@job_handler('send_digests')
+def send_digests_job(job):
+    """Send today's due-card digests once FLASHCARD_DIGEST_HOUR has passed"""
+    if timezone.localtime().hour < getattr(settings, 'FLASHCARD_DIGEST_HOUR', 0):
+        job.message = "Too early for today's digest."
+        return
+    run = send_digests(progress=job.set_progress)
+    job.message = f'{run.sent} digests sent for {run.date}.'
@@ -0,0 +1,22 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from flashcards.backup import write_backup
+
+
+class Command(BaseCommand):
+    help = "Write a full backup archive of a user's flashcards and study sessions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('output', help='Path of the .zip archive to write')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User \"{options['username']}\" does not exist")
+
+        with open(options['output'], 'wb') as output:
+            write_backup(user, output)
+        self.stdout.write(self.style.SUCCESS(f"Wrote backup of {user.username} to {options['output']}"))
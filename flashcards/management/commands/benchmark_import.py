@@ -0,0 +1,102 @@
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+import uuid
+import zipfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from flashcards.formats import iter_apkg_rows, iter_jsonl_lines, iter_jsonl_rows, import_rows
+from flashcards.models import Flashcard
+
+
+def build_anki_package(path, note_count, deck_count=10):
+    """Write a synthetic Anki .apkg with ``note_count`` notes spread over ``deck_count`` decks"""
+    decks = {
+        str(deck_id): {'id': deck_id, 'name': f'Deck {deck_id}'}
+        for deck_id in range(1, deck_count + 1)
+    }
+    with tempfile.TemporaryDirectory() as tmpdir:
+        collection_path = os.path.join(tmpdir, 'collection.anki2')
+        connection = sqlite3.connect(collection_path)
+        connection.executescript(
+            'CREATE TABLE col (id INTEGER PRIMARY KEY, decks TEXT NOT NULL);'
+            'CREATE TABLE notes (id INTEGER PRIMARY KEY, flds TEXT NOT NULL, tags TEXT NOT NULL);'
+            'CREATE TABLE cards (id INTEGER PRIMARY KEY, nid INTEGER NOT NULL, did INTEGER NOT NULL, ord INTEGER NOT NULL);'
+            'CREATE INDEX ix_cards_nid ON cards (nid);'
+        )
+        connection.execute('INSERT INTO col (id, decks) VALUES (1, ?)', [json.dumps(decks)])
+        connection.executemany(
+            'INSERT INTO notes (id, flds, tags) VALUES (?, ?, ?)',
+            ((i, f'Question <b>{i}</b>\x1fAnswer {i}<br>line two', '') for i in range(1, note_count + 1))
+        )
+        connection.executemany(
+            'INSERT INTO cards (id, nid, did, ord) VALUES (?, ?, ?, 0)',
+            ((i, i, i % deck_count + 1) for i in range(1, note_count + 1))
+        )
+        connection.commit()
+        connection.close()
+
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as package:
+            package.write(collection_path, 'collection.anki2')
+            package.writestr('media', '{}')
+
+
+class Command(BaseCommand):
+    help = 'Round-trip a synthetic Anki package through import and JSON Lines export/import'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--notes', type=int, default=100000, help='Number of notes in the synthetic package')
+        parser.add_argument('--decks', type=int, default=10, help='Number of decks in the synthetic package')
+        parser.add_argument('--trace-memory', action='store_true',
+                            help='Report peak Python memory with tracemalloc (several times slower)')
+
+    def handle(self, *args, **options):
+        self.trace_memory = options['trace_memory']
+        with tempfile.TemporaryDirectory() as tmpdir:
+            package_path = os.path.join(tmpdir, 'synthetic.apkg')
+            started = time.perf_counter()
+            build_anki_package(package_path, options['notes'], options['decks'])
+            self.stdout.write(f"Built {options['notes']} note package "
+                              f"({os.path.getsize(package_path) / 1e6:.1f} MB) in {time.perf_counter() - started:.2f}s")
+
+            # Everything runs in a transaction that is rolled back, so the
+            # benchmark leaves no rows behind.
+            with transaction.atomic():
+                user = User.objects.create_user(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+
+                with open(package_path, 'rb') as package:
+                    self._measure('Import .apkg', lambda: import_rows(user, iter_apkg_rows(package)))
+
+                jsonl_path = os.path.join(tmpdir, 'export.jsonl')
+
+                def export():
+                    with open(jsonl_path, 'w', encoding='utf-8') as output:
+                        for line in iter_jsonl_lines(Flashcard.objects.filter(user=user)):
+                            output.write(line)
+                    return Flashcard.objects.filter(user=user).count()
+
+                self._measure('Export .jsonl', export)
+
+                with open(jsonl_path, 'rb') as jsonl:
+                    self._measure('Import .jsonl', lambda: import_rows(user, iter_jsonl_rows(jsonl)))
+
+                transaction.set_rollback(True)
+
+    def _measure(self, label, func):
+        if self.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        count = func()
+        elapsed = time.perf_counter() - started
+        line = f'{label}: {count} cards in {elapsed:.2f}s ({count / elapsed:,.0f} cards/s'
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            line += f', peak Python memory {peak / 1e6:.1f} MB'
+        self.stdout.write(line + ')')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from flashcards.sessions import COMPACT_BATCH_SIZE, compact_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned study sessions and fold old ones into monthly summaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Keep individual sessions this many days (default: FLASHCARD_SESSION_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=COMPACT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        result = compact_sessions(
+            retention_days=options['days'],
+            batch_size=options['batch_size'],
+            progress=lambda count: self.stdout.write(f'Processed {count} sessions'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {result['deleted']} abandoned sessions deleted, {result['compacted']} sessions summarised"
+        ))
@@ -0,0 +1,305 @@
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.urls import reverse
+
+from flashcards.formats import import_rows
+from flashcards.models import Flashcard
+from flashcards.purge import purge_user
+
+# "enqueue" uploads a CSV import and only times queueing it; the import runs
+# on whatever worker processes the queue, so it is not in the default mix
+ACTIONS = ('study', 'review', 'list', 'search', 'statistics', 'enqueue')
+DEFAULT_MIX = 'review=10,study=2,list=3,search=2,statistics=1'
+PASSWORD = 'loadtest-password'
+TOPICS = ['Biology', 'Chemistry', 'History', 'Math', 'Physics']
+IMPORT_ROWS = 20
+REQUEST_TIMEOUT = 60
+
+
+class NoRedirect(HTTPRedirectHandler):
+    """Return redirects as responses, so every request is timed on its own"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class LoadTestServer(ThreadedWSGIServer):
+    # Room for every simulated user to connect at once
+    request_queue_size = 1024
+
+
+class SimulatedUser:
+    """One browser: cookies, CSRF token, ETags, and a timing for every request"""
+
+    def __init__(self, base_url, origin, username, card_ids, results, rng):
+        self.base_url = base_url
+        self.origin = origin
+        self.username = username
+        self.card_ids = card_ids
+        self.results = results
+        self.rng = rng
+        self.cookies = {}
+        self.etags = {}
+        self.opener = build_opener(NoRedirect)
+
+    def request(self, endpoint, path, data=None, content_type=None, expect=(200,)):
+        headers = {'Cookie': '; '.join(f'{name}={value}' for name, value in self.cookies.items())}
+        if data is not None:
+            # Django checks the token and the origin of every POST
+            headers.update({
+                'X-CSRFToken': self.cookies.get('csrftoken', ''),
+                'Origin': self.origin,
+                'Referer': self.origin + '/',
+                'Content-Type': content_type or 'application/x-www-form-urlencoded',
+            })
+        elif path in self.etags:
+            # Browsers revalidate the per-user pages they already hold
+            headers['If-None-Match'] = self.etags[path]
+
+        started = time.perf_counter()
+        try:
+            with self.opener.open(Request(self.base_url + path, data, headers), timeout=REQUEST_TIMEOUT) as response:
+                status, response_headers = response.status, response.headers
+                response.read()
+        except HTTPError as error:
+            status, response_headers = error.code, error.headers
+            error.read()
+        except (URLError, OSError):
+            status, response_headers = None, None
+        elapsed = time.perf_counter() - started
+
+        if response_headers is not None:
+            for header in response_headers.get_all('Set-Cookie') or []:
+                for name, morsel in SimpleCookie(header).items():
+                    self.cookies[name] = morsel.value
+            if data is None and response_headers.get('ETag'):
+                self.etags[path] = response_headers['ETag']
+        ok = status in expect or (status == 304 and data is None)
+        self.results.append((endpoint, elapsed, ok, status))
+        return ok
+
+    def login(self):
+        path = reverse('accounts:login')
+        self.request('login', path)
+        data = urlencode({'username': self.username, 'password': PASSWORD}).encode()
+        return self.request('login', path, data, expect=(302,))
+
+    def study(self):
+        self.request('study', reverse('flashcards:study_mode'))
+
+    def review(self):
+        data = urlencode({
+            'action': self.rng.choice(['known', 'review']),
+            'review_id': str(uuid.uuid4()),
+        }).encode()
+        self.request('review', reverse('flashcards:mark_flashcard', args=[self.rng.choice(self.card_ids)]), data)
+
+    def card_list(self):
+        self.request('list', reverse('flashcards:flashcard_list'))
+
+    def search(self):
+        query = urlencode({'search': self.rng.choice(TOPICS)[:4], 'sort': 'topic'})
+        self.request('search', f"{reverse('flashcards:flashcard_list')}?{query}")
+
+    def statistics(self):
+        self.request('statistics', reverse('flashcards:statistics'))
+
+    def enqueue_import(self):
+        boundary = uuid.uuid4().hex
+        rows = ''.join(f'Imported,Question {uuid.uuid4().hex[:8]},Answer\r\n' for _ in range(IMPORT_ROWS))
+        body = (
+            f'--{boundary}\r\n'
+            'Content-Disposition: form-data; name="import_file"; filename="cards.csv"\r\n'
+            'Content-Type: text/csv\r\n\r\n'
+            'Topic,Question (Front),Answer (Back)\r\n'
+            f'{rows}\r\n--{boundary}--\r\n'
+        ).encode()
+        self.request(
+            'enqueue', reverse('flashcards:import_flashcards'), body,
+            content_type=f'multipart/form-data; boundary={boundary}', expect=(302,),
+        )
+
+    def run(self, mix, deadline, think):
+        if not self.login():
+            return
+        actions = dict(zip(ACTIONS, [
+            self.study, self.review, self.card_list, self.search, self.statistics, self.enqueue_import,
+        ]))
+        names, weights = zip(*mix.items())
+        while time.monotonic() < deadline:
+            actions[self.rng.choices(names, weights)[0]]()
+            if think:
+                time.sleep(self.rng.expovariate(1 / think))
+
+
+class Command(BaseCommand):
+    help = ('Replay a concurrent study workload against the app and report throughput, '
+            'latency percentiles and error rates per endpoint. Without --url the app is served '
+            'in this process, sharing the GIL with the simulated users; only --url runs are '
+            'comparable between server configurations')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Number of concurrent simulated users')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run the workload for')
+        parser.add_argument('--mix', default=DEFAULT_MIX,
+                            help=f'Relative weights of the actions {", ".join(ACTIONS)} (default {DEFAULT_MIX})')
+        parser.add_argument('--think', type=float, default=0,
+                            help='Mean pause in seconds between the actions of one user')
+        parser.add_argument('--cards', type=int, default=200, help='Cards created for each new simulated user')
+        parser.add_argument('--url',
+                            help='Drive an already running server (using this database) instead of starting '
+                                 'one; use this to compare server configurations')
+        parser.add_argument('--prefix', default='loadtest', help='Username prefix of the simulated users')
+        parser.add_argument('--keep-users', action='store_true',
+                            help='Keep the users created for this run, to reuse them in the next one')
+        parser.add_argument('--seed', type=int, help='Seed for the random choices of the simulated users')
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file as JSON')
+
+    def handle(self, *args, **options):
+        mix = self._parse_mix(options['mix'])
+        users, created = self._prepare_users(options['prefix'], options['users'], options['cards'])
+        server = None
+        try:
+            if options['url']:
+                base_url = options['url'].rstrip('/')
+                parts = urlsplit(base_url)
+                origin = f'{parts.scheme}://{parts.netloc}'
+            else:
+                server, base_url, origin = self._start_server()
+                self.stdout.write(self.style.WARNING(
+                    'Serving the app in this process: the numbers include contention with the simulated '
+                    'users, so compare server configurations with --url'
+                ))
+            self.stdout.write(f"Running {len(users)} users against {base_url} for {options['duration']:g}s")
+
+            results = []
+            rng = random.Random(options['seed'])
+            simulated = [
+                SimulatedUser(base_url, origin, user.username, card_ids, results, random.Random(rng.random()))
+                for user, card_ids in users
+            ]
+            started = time.monotonic()
+            deadline = started + options['duration']
+            with ThreadPoolExecutor(max_workers=len(simulated)) as pool:
+                for future in [pool.submit(user.run, mix, deadline, options['think']) for user in simulated]:
+                    future.result()
+            elapsed = time.monotonic() - started
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            if not options['keep_users']:
+                for user in created:
+                    purge_user(user)
+
+        report = self._summarise(results, elapsed)
+        self._print_report(report)
+        if options['json_path']:
+            with open(options['json_path'], 'w') as output:
+                json.dump({'users': len(users), 'duration': elapsed, 'mix': mix, 'endpoints': report}, output, indent=2)
+
+    def _parse_mix(self, value):
+        mix = {}
+        for item in value.split(','):
+            name, _, weight = item.partition('=')
+            if name.strip() not in ACTIONS:
+                raise CommandError(f'Unknown action "{name.strip()}" in --mix')
+            try:
+                mix[name.strip()] = float(weight)
+            except ValueError:
+                raise CommandError(f'Weight of "{name.strip()}" in --mix must be a number')
+        if not any(weight > 0 for weight in mix.values()):
+            raise CommandError('--mix needs at least one action with a positive weight')
+        return mix
+
+    def _prepare_users(self, prefix, count, cards):
+        """Return ``(user, card ids)`` pairs and the users that were created for this run"""
+        users, created = [], []
+        for i in range(count):
+            user, is_new = User.objects.get_or_create(username=f'{prefix}-{i}')
+            if is_new:
+                user.set_password(PASSWORD)
+                user.save(update_fields=['password'])
+                import_rows(user, (
+                    {'topic': TOPICS[n % len(TOPICS)], 'front': f'Question {n}', 'back': f'Answer {n}'}
+                    for n in range(cards)
+                ))
+                created.append(user)
+            card_ids = list(Flashcard.objects.filter(user=user).values_list('pk', flat=True))
+            if not card_ids:
+                raise CommandError(f'{user.username} has no cards; delete the user or pass --cards')
+            users.append((user, card_ids))
+        return users, created
+
+    def _start_server(self):
+        """Serve the app from a threaded WSGI server on a free local port"""
+        app = get_wsgi_application()
+
+        def forwarded_https(environ, start_response):
+            # Stand in for the TLS-terminating proxy in front of production, so
+            # SSL redirects and secure cookies behave as deployed
+            environ['wsgi.url_scheme'] = 'https'
+            return app(environ, start_response)
+
+        server = LoadTestServer(('127.0.0.1', 0), QuietRequestHandler)
+        server.set_app(forwarded_https)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+        return server, f'http://{host}:{port}', f'https://{host}:{port}'
+
+    def _summarise(self, results, elapsed):
+        """Requests, throughput, error rate and latency percentiles per endpoint"""
+        by_endpoint = defaultdict(list)
+        for endpoint, seconds, ok, status in results:
+            by_endpoint[endpoint].append((seconds, ok, status))
+            by_endpoint['all'].append((seconds, ok, status))
+        report = {}
+        for endpoint, samples in sorted(by_endpoint.items(), key=lambda item: item[0] == 'all'):
+            latencies = np.array([seconds for seconds, _, _ in samples]) * 1000
+            # Failed connections and timeouts have no status
+            failed = [str(status or 'no response') for _, ok, status in samples if not ok]
+            errors = len(failed)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            report[endpoint] = {
+                'requests': len(samples),
+                'throughput': len(samples) / elapsed,
+                'errors': errors,
+                'error_rate': errors / len(samples),
+                'errors_by_status': {status: failed.count(status) for status in sorted(set(failed))},
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+            }
+        return report
+
+    def _print_report(self, report):
+        self.stdout.write(
+            f"{'endpoint':<12}{'requests':>10}{'req/s':>9}{'errors':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        )
+        for endpoint, row in report.items():
+            self.stdout.write(
+                f"{endpoint:<12}{row['requests']:>10}{row['throughput']:>9.1f}{row['error_rate']:>8.1%} "
+                f"{row['p50_ms']:>8.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+            )
+        if not report:
+            self.stdout.write(self.style.WARNING('No requests were made'))
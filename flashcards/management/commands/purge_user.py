@@ -0,0 +1,40 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from flashcards.jobs import enqueue
+from flashcards.purge import PURGE_BATCH_SIZE, purge_user
+
+
+class Command(BaseCommand):
+    help = 'Delete a user with all of their cards, reviews, decks and sessions, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--batch-size', type=int, default=PURGE_BATCH_SIZE)
+        parser.add_argument('--background', action='store_true',
+                            help='Queue the purge for the worker instead of running it here')
+        parser.add_argument('--no-input', action='store_false', dest='interactive',
+                            help='Do not ask for confirmation')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User \"{options['username']}\" does not exist")
+
+        if options['interactive']:
+            answer = input(f'This permanently deletes {user.username} and all of their data. Type "yes" to continue: ')
+            if answer != 'yes':
+                raise CommandError('Purge cancelled')
+
+        if options['background']:
+            job = enqueue('purge_user', payload={'user_id': user.pk, 'batch_size': options['batch_size']})
+            self.stdout.write(self.style.SUCCESS(f'Queued purge of {user.username} as job #{job.pk}'))
+            return
+
+        deleted = purge_user(
+            user,
+            batch_size=options['batch_size'],
+            progress=lambda done, total: self.stdout.write(f'Deleted {done} of {total} rows'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Purged {user.username}: {deleted} rows deleted'))
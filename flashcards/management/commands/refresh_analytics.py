@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from flashcards.analytics import REFRESH_BATCH_SIZE, rebuild_analytics, refresh_analytics
+
+
+class Command(BaseCommand):
+    help = 'Fold reviews and flashcards created since the last run into the analytics tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REFRESH_BATCH_SIZE)
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Empty the analytics tables and recompute them from all rows')
+
+    def handle(self, *args, **options):
+        refresh = rebuild_analytics if options['rebuild'] else refresh_analytics
+        processed = refresh(
+            batch_size=options['batch_size'],
+            progress=lambda count: self.stdout.write(f'Processed {count} rows'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {processed['reviews']} reviews and {processed['flashcards']} flashcards processed"
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from flashcards.models import Flashcard
+from flashcards.rendering import RENDERER_VERSION
+
+
+class Command(BaseCommand):
+    help = 'Re-render stored card HTML for cards rendered by an older renderer version'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true', help='Re-render every card, not only stale ones')
+
+    def handle(self, *args, **options):
+        stale = Flashcard.objects.all()
+        if not options['all']:
+            stale = stale.filter(render_version__lt=RENDERER_VERSION)
+
+        last_pk = 0
+        total = 0
+        while True:
+            # Walk the table by primary key so every batch is an index range scan
+            batch = list(
+                stale.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'front', 'back')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            now = timezone.now()
+            for card in batch:
+                card.render_content()
+                card.updated_at = now
+            Flashcard.objects.bulk_update(
+                batch, ['front_html', 'back_html', 'render_version', 'updated_at']
+            )
+            last_pk = batch[-1].pk
+            total += len(batch)
+            self.stdout.write(f'Re-rendered {total} cards')
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {total} cards re-rendered (renderer version {RENDERER_VERSION})'))
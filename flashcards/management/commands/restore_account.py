@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from flashcards.backup import restore_backup
+
+
+class Command(BaseCommand):
+    help = "Restore a backup archive into a user's account, creating the user if needed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('archive', help='Path of the .zip archive to restore')
+        parser.add_argument('--create-user', action='store_true',
+                            help='Create the user (without a usable password) if it does not exist')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            if not options['create_user']:
+                raise CommandError(f"User \"{options['username']}\" does not exist (use --create-user)")
+            user = User.objects.create_user(username=options['username'])
+
+        try:
+            with open(options['archive'], 'rb') as archive:
+                created = restore_backup(user, archive)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for name, count in created.items():
+            self.stdout.write(f'{name}: {count} rows restored')
+        self.stdout.write(self.style.SUCCESS(f'Restored backup into {user.username}'))
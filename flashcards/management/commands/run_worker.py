@@ -0,0 +1,67 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from flashcards.jobs import (
+    claim_next_job, enqueue_due_schedules, requeue_stale_jobs, run_job, sync_schedules, worker_id,
+)
+
+
+def work(sleep, once):
+    """Process jobs until stopped, or until the queue is empty with ``once``"""
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    worker = worker_id()
+
+    while not stopping:
+        enqueue_due_schedules()
+        requeue_stale_jobs()
+        job = claim_next_job(worker)
+        if job is not None:
+            run_job(job)
+        elif once:
+            break
+        else:
+            time.sleep(sleep)
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers for imports, exports and scheduled rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Number of worker processes')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        sync_schedules()
+        if options['processes'] <= 1:
+            self.stdout.write('Worker started')
+            work(options['sleep'], options['once'])
+            return
+
+        # Child processes must open their own database connections
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=work, args=(options['sleep'], options['once']))
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f'Started {len(processes)} worker processes')
+
+        def stop(*args):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            stop()
+            for process in processes:
+                process.join()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from flashcards.digest import DIGEST_BATCH_SIZE, send_digests
+
+
+class Command(BaseCommand):
+    help = "Email every user how many cards they have to review, resuming today's run if interrupted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DIGEST_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        run = send_digests(
+            batch_size=options['batch_size'],
+            progress=lambda sent: self.stdout.write(f'Sent {sent} digests'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Done: {run.sent} digests sent for {run.date}'))
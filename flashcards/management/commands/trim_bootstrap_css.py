@@ -0,0 +1,152 @@
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.messages.constants import DEFAULT_TAGS
+from django.core.management.base import BaseCommand, CommandError
+
+# Classes Bootstrap's own scripts add at runtime, for the collapse, dropdown,
+# alert and modal components the templates use
+SCRIPT_CLASSES = {
+    'active', 'collapse', 'collapsed', 'collapsing', 'disabled', 'fade', 'hiding',
+    'modal-backdrop', 'modal-open', 'modal-static', 'show', 'showing',
+}
+# Message levels become alert-<tag> classes in base.html
+MESSAGE_CLASSES = {f'alert-{tag}' for tag in DEFAULT_TAGS.values()}
+
+CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+TOKEN_RE = re.compile(r'[a-z][a-z0-9]*(?:-[a-z0-9]+)*')
+# Selectors inside these only narrow a rule; the rule applies without them
+NEGATION_RE = re.compile(r':not\([^()]*\)')
+
+
+def used_classes(base_dir=None):
+    """Every word that could be a class in the templates, scripts and Python code
+
+    Scanning words rather than class attributes also picks up classes added
+    from JavaScript and set on form widgets, at the cost of keeping a few
+    rules whose class names happen to be ordinary words.
+    """
+    base_dir = Path(base_dir or settings.BASE_DIR)
+    sources = [
+        *(base_dir / 'templates').rglob('*.html'),
+        *(base_dir / 'static' / 'js').glob('*.js'),
+        *(base_dir / 'flashcards').glob('*.py'),
+        *(base_dir / 'accounts').glob('*.py'),
+    ]
+    words = set()
+    for path in sources:
+        words.update(TOKEN_RE.findall(path.read_text()))
+    return words | SCRIPT_CLASSES | MESSAGE_CLASSES
+
+
+def trim_css(css, keep):
+    """Drop the rules of ``css`` whose selectors need a class missing from ``keep``"""
+    return ''.join(_trim_block(css, keep))
+
+
+def _trim_block(css, keep):
+    position = 0
+    while position < len(css):
+        if css.startswith('/*', position):
+            end = css.index('*/', position) + 2
+            comment = css[position:end]
+            # License comments stay; source map references point at files we don't ship
+            if comment.startswith('/*!'):
+                yield comment
+            position = end
+            continue
+        brace = _find(css, '{', position)
+        semicolon = _find(css, ';', position)
+        if semicolon < brace:
+            # Statement at-rules such as @charset
+            yield css[position:semicolon + 1]
+            position = semicolon + 1
+            continue
+        if brace == len(css):
+            yield css[position:]
+            return
+        prelude = css[position:brace]
+        end = _matching_brace(css, brace)
+        body = css[brace + 1:end]
+        position = end + 1
+
+        if prelude.startswith(('@media', '@supports', '@container', '@layer')):
+            inner = trim_css(body, keep)
+            if inner:
+                yield f'{prelude}{{{inner}}}'
+        elif prelude.startswith('@'):
+            # @keyframes, @font-face and friends have no selectors to check
+            yield f'{prelude}{{{body}}}'
+        else:
+            selectors = [selector for selector in _split_selectors(prelude) if _needed(selector, keep)]
+            if selectors:
+                yield f"{','.join(selectors)}{{{body}}}"
+
+
+def _needed(selector, keep):
+    selector = NEGATION_RE.sub('', re.sub(r'\[[^\]]*\]', '', selector))
+    return all(name in keep for name in CLASS_RE.findall(selector))
+
+
+def _split_selectors(prelude):
+    selectors, depth, start = [], 0, 0
+    for index, char in enumerate(prelude):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(prelude[start:index])
+            start = index + 1
+    selectors.append(prelude[start:])
+    return selectors
+
+
+def _find(css, char, start):
+    """Index of ``char`` outside strings, or len(css)"""
+    quote = None
+    index = start
+    while index < len(css):
+        current = css[index]
+        if quote:
+            if current == '\\':
+                index += 1
+            elif current == quote:
+                quote = None
+        elif current in '"\'':
+            quote = current
+        elif current == char:
+            return index
+        index += 1
+    return len(css)
+
+
+def _matching_brace(css, start):
+    depth = 0
+    index = start
+    while index < len(css):
+        index = min(_find(css, '{', index), _find(css, '}', index))
+        if index == len(css):
+            break
+        depth += 1 if css[index] == '{' else -1
+        if depth == 0:
+            return index
+        index += 1
+    raise CommandError(f'Unbalanced braces after offset {start}')
+
+
+class Command(BaseCommand):
+    help = ('Cut an upstream bootstrap.min.css down to the rules for the classes the templates, '
+            'scripts and forms use, and write it to static/vendor/bootstrap')
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Path of the upstream bootstrap.min.css')
+        parser.add_argument('--output', default=str(Path(settings.BASE_DIR) / 'static' / 'vendor' / 'bootstrap'
+                                                    / 'bootstrap.min.css'))
+
+    def handle(self, *args, **options):
+        css = Path(options['source']).read_text()
+        trimmed = trim_css(css, used_classes())
+        Path(options['output']).write_text(trimmed)
+        self.stdout.write(f'Wrote {options["output"]}: {len(css) // 1024} KB -> {len(trimmed) // 1024} KB')
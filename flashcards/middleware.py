@@ -0,0 +1,21 @@
+class FragmentCacheMetricsMiddleware:
+    """Report fragment cache hits and estimated render time saved per page
+
+    The numbers are sent as a ``Server-Timing`` header, which browsers show
+    in the network panel of their developer tools.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        stats = getattr(request, 'fragment_stats', None)
+        if stats:
+            response['Server-Timing'] = (
+                f'fragments;desc="{stats["hits"]} hits, {stats["misses"]} misses";'
+                f'dur={stats["render_seconds"] * 1000:.1f}, '
+                f'fragments-saved;desc="Estimated render time saved";'
+                f'dur={stats["saved_seconds"] * 1000:.1f}'
+            )
+        return response
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flashcards', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50, unique=True)),
+                ('interval_minutes', models.IntegerField(default=60)),
+                ('next_run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['kind'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='flashcard',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.AlterField(
+            model_name='studysession',
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('input_file', models.FileField(blank=True, upload_to='jobs/input/')),
+                ('result_file', models.FileField(blank=True, upload_to='jobs/output/')),
+                ('progress', models.IntegerField(default=0)),
+                ('total', models.IntegerField(blank=True, null=True)),
+                ('message', models.TextField(blank=True)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('attempts', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_at'], name='flashcards__status_e926e7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0002_job_scheduledjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcard',
+            name='back_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='front_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='render_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0003_flashcard_rendered_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageAsset',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('image', models.FileField(upload_to='images/')),
+                ('thumbnail', models.FileField(blank=True, upload_to='images/thumbs/')),
+                ('content_type', models.CharField(max_length=50)),
+                ('width', models.PositiveIntegerField(default=0)),
+                ('height', models.PositiveIntegerField(default=0)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='back_image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='back_of_cards', to='flashcards.imageasset'),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='front_image',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='front_of_cards', to='flashcards.imageasset'),
+        ),
+    ]
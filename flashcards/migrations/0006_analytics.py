@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:36
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0005_review'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyActiveUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('user_id', models.IntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('active_users', models.IntegerField(default=0)),
+                ('reviews', models.IntegerField(default=0)),
+                ('correct_reviews', models.IntegerField(default=0)),
+                ('cards_created', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TopicStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=100, unique=True)),
+                ('reviews', models.IntegerField(default=0)),
+                ('cards_created', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-reviews'],
+                'indexes': [models.Index(fields=['-reviews'], name='flashcards__reviews_cb2578_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyactiveuser',
+            constraint=models.UniqueConstraint(fields=('date', 'user_id'), name='unique_daily_active_user'),
+        ),
+    ]
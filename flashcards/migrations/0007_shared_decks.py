@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flashcards', '0006_analytics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Deck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True)),
+                ('is_published', models.BooleanField(default=False, help_text='Let other users find and subscribe to this deck')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='decks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['title'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DeckSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='flashcards.deck')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deck_subscriptions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CardProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('times_reviewed', models.IntegerField(default=0)),
+                ('times_correct', models.IntegerField(default=0)),
+                ('last_reviewed', models.DateTimeField(blank=True, null=True)),
+                ('is_known', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('flashcard', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress_records', to='flashcards.flashcard')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='card_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='deck',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cards', to='flashcards.deck'),
+        ),
+        migrations.AddConstraint(
+            model_name='decksubscription',
+            constraint=models.UniqueConstraint(fields=('user', 'deck'), name='unique_deck_subscription'),
+        ),
+        migrations.AddConstraint(
+            model_name='cardprogress',
+            constraint=models.UniqueConstraint(fields=('user', 'flashcard'), name='unique_card_progress'),
+        ),
+    ]
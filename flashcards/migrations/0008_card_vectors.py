@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0007_shared_decks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardVector',
+            fields=[
+                ('flashcard', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to='flashcards.flashcard')),
+                ('vector', models.BinaryField()),
+            ],
+        ),
+    ]
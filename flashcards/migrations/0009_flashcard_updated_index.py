@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0008_card_vectors'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flashcard',
+            index=models.Index(fields=['user', 'updated_at'], name='flashcards__user_id_a17cbb_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flashcards', '0009_flashcard_updated_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudySessionSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('sessions', models.IntegerField(default=0)),
+                ('cards_studied', models.IntegerField(default=0)),
+                ('cards_known', models.IntegerField(default=0)),
+                ('minutes', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['user', '-started_at'], name='flashcards__user_id_1bc1c5_idx'),
+        ),
+        migrations.AddField(
+            model_name='studysessionsummary',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='session_summaries', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='studysessionsummary',
+            constraint=models.UniqueConstraint(fields=('user', 'month'), name='unique_session_summary'),
+        ),
+    ]
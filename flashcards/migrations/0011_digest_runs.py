@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:56
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0010_session_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('last_user_id', models.BigIntegerField(default=0)),
+                ('sent', models.IntegerField(default=0)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0011_digest_runs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flashcard',
+            index=models.Index(condition=models.Q(('is_known', False)), fields=['user'], name='flashcard_to_review_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', 'reviewed_at'], name='flashcards__user_id_7a8dd1_idx'),
+        ),
+    ]
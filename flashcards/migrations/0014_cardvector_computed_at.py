@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:44
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0013_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cardvector',
+            name='computed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
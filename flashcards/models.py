@@ -2,6 +2,43 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .rendering import RENDERER_VERSION, render_card_text
+
+
+class ImageAsset(models.Model):
+    """Image stored once per content hash and shared by any number of cards"""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    image = models.FileField(upload_to='images/')
+    thumbnail = models.FileField(upload_to='images/thumbs/', blank=True)
+    content_type = models.CharField(max_length=50)
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.width}x{self.height})"
+
+
+class Deck(models.Model):
+    """A set of one author's flashcards that other users can subscribe to
+
+    Subscribers study the author's card rows directly; only their progress
+    is stored per user, in CardProgress.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='decks')
+    title = models.CharField(max_length=100)
+    description = models.TextField(blank=True)
+    is_published = models.BooleanField(default=False, help_text='Let other users find and subscribe to this deck')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['title']
+    
+    def __str__(self):
+        return self.title
+
 
 class Flashcard(models.Model):
     """Model representing a flashcard"""
@@ -9,10 +46,25 @@ class Flashcard(models.Model):
     front = models.TextField(help_text='Question or prompt')
     back = models.TextField(help_text='Answer or explanation')
     topic = models.CharField(max_length=100, help_text='Subject or category')
+    
+    # Sanitized HTML rendered from front/back when the card is saved
+    front_html = models.TextField(blank=True, editable=False)
+    back_html = models.TextField(blank=True, editable=False)
+    render_version = models.PositiveSmallIntegerField(default=0, editable=False)
+    
+    # Optional images; the foreign key value is the image's content hash
+    front_image = models.ForeignKey(ImageAsset, on_delete=models.PROTECT, null=True, blank=True,
+                                    related_name='front_of_cards')
+    back_image = models.ForeignKey(ImageAsset, on_delete=models.PROTECT, null=True, blank=True,
+                                   related_name='back_of_cards')
+    
+    # Deck the card is published in; its subscribers see the card too
+    deck = models.ForeignKey(Deck, on_delete=models.SET_NULL, null=True, blank=True, related_name='cards')
+    
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
-    # Study tracking fields
+    # Study tracking fields (the owner's progress; subscribers use CardProgress)
     times_reviewed = models.IntegerField(default=0)
     times_correct = models.IntegerField(default=0)
     last_reviewed = models.DateTimeField(null=True, blank=True)
@@ -23,24 +75,98 @@ class Flashcard(models.Model):
         indexes = [
             models.Index(fields=['user', 'topic']),
             models.Index(fields=['user', '-created_at']),
+            models.Index(fields=['user', 'updated_at']),
+            # Own cards still to review: due counts and the review queue
+            models.Index(fields=['user'], condition=models.Q(is_known=False), name='flashcard_to_review_idx'),
         ]
     
     def __str__(self):
         return f"{self.topic}: {self.front[:50]}"
     
+    def save(self, *args, **kwargs):
+        """Render Markdown/LaTeX content whenever the card text is saved"""
+        update_fields = kwargs.get('update_fields')
+        content_changed = update_fields is None or bool({'front', 'back'} & set(update_fields))
+        adding = self._state.adding
+        if content_changed:
+            self.render_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'front_html', 'back_html', 'render_version'}
+        super().save(*args, **kwargs)
+        if content_changed and not adding:
+            # The similarity index recomputes missing vectors when it is next loaded
+            CardVector.objects.filter(flashcard_id=self.pk).delete()
+    
+    def render_content(self):
+        """Store sanitized HTML for the front and back of the card"""
+        self.front_html = render_card_text(self.front)
+        self.back_html = render_card_text(self.back)
+        self.render_version = RENDERER_VERSION
+    
     def mark_reviewed(self, is_correct=True):
         """Mark card as reviewed and update statistics"""
         self.times_reviewed += 1
         if is_correct:
             self.times_correct += 1
         self.last_reviewed = timezone.now()
-        self.save()
+        self.save(update_fields=['times_reviewed', 'times_correct', 'last_reviewed', 'is_known', 'updated_at'])
     
     def get_success_rate(self):
         """Calculate success rate as percentage"""
-        if self.times_reviewed == 0:
+        # Cards from decks.cards_for() carry the viewing user's progress
+        times_reviewed = getattr(self, 'progress_reviews', self.times_reviewed)
+        times_correct = getattr(self, 'progress_correct', self.times_correct)
+        if times_reviewed == 0:
             return 0
-        return int((self.times_correct / self.times_reviewed) * 100)
+        return int((times_correct / times_reviewed) * 100)
+
+
+class CardVector(models.Model):
+    """Hashed n-gram vector of a card's text for the similar-card index"""
+    flashcard = models.OneToOneField(Flashcard, on_delete=models.CASCADE, primary_key=True, related_name='vector')
+    vector = models.BinaryField()
+    computed_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Vector for card {self.flashcard_id}"
+
+
+class DeckSubscription(models.Model):
+    """A user studying a published deck"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='deck_subscriptions')
+    deck = models.ForeignKey(Deck, on_delete=models.CASCADE, related_name='subscriptions')
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'deck'], name='unique_deck_subscription'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.deck.title}"
+
+
+class CardProgress(models.Model):
+    """A subscriber's progress on a card from a shared deck
+
+    Rows are created on the first review, so subscribing to a large deck
+    writes nothing per card.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='card_progress')
+    flashcard = models.ForeignKey(Flashcard, on_delete=models.CASCADE, related_name='progress_records')
+    times_reviewed = models.IntegerField(default=0)
+    times_correct = models.IntegerField(default=0)
+    last_reviewed = models.DateTimeField(null=True, blank=True)
+    is_known = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'flashcard'], name='unique_card_progress'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.flashcard_id}"
 
 
 class StudySession(models.Model):
@@ -54,6 +180,9 @@ class StudySession(models.Model):
     
     class Meta:
         ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['user', '-started_at']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.started_at.strftime('%Y-%m-%d %H:%M')}"
@@ -64,3 +193,197 @@ class StudySession(models.Model):
             duration = self.ended_at - self.started_at
             return int(duration.total_seconds() / 60)
         return 0
+
+
+class StudySessionSummary(models.Model):
+    """Monthly totals of a user's study sessions that ``compact_sessions`` removed"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='session_summaries')
+    month = models.DateField()
+    sessions = models.IntegerField(default=0)
+    cards_studied = models.IntegerField(default=0)
+    cards_known = models.IntegerField(default=0)
+    minutes = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='unique_session_summary'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.month:%Y-%m}: {self.sessions} sessions"
+
+
+class Review(models.Model):
+    """One answer to a flashcard, identified by an id generated on the client
+
+    The unique ``review_id`` lets study mode retry a queued review as often as
+    it likes; the server applies each review exactly once.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
+    flashcard = models.ForeignKey(Flashcard, on_delete=models.CASCADE, related_name='reviews')
+    session = models.ForeignKey(StudySession, on_delete=models.SET_NULL, null=True, blank=True, related_name='reviews')
+    review_id = models.UUIDField()
+    is_correct = models.BooleanField()
+    reviewed_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-reviewed_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'review_id'], name='unique_review_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'reviewed_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.flashcard_id} ({'known' if self.is_correct else 'review'})"
+
+
+class Job(models.Model):
+    """Background job stored in the database and run by the run_worker command"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs', null=True, blank=True)
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    payload = models.JSONField(default=dict, blank=True)
+    input_file = models.FileField(upload_to='jobs/input/', blank=True)
+    result_file = models.FileField(upload_to='jobs/output/', blank=True)
+    
+    # Progress reporting
+    progress = models.IntegerField(default=0)
+    total = models.IntegerField(null=True, blank=True)
+    message = models.TextField(blank=True)
+    
+    # Scheduling and claiming
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Touched on every progress report; a running job with an old heartbeat has lost its worker
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    attempts = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+    
+    def set_progress(self, progress, total=None):
+        """Record progress and a heartbeat without touching the other columns of the row"""
+        self.progress = progress
+        self.heartbeat_at = timezone.now()
+        fields = {'progress': progress, 'heartbeat_at': self.heartbeat_at}
+        if total is not None:
+            self.total = total
+            fields['total'] = total
+        Job.objects.filter(pk=self.pk).update(**fields)
+    
+    def get_percent(self):
+        """Progress as a percentage, or None when the total is unknown"""
+        if not self.total:
+            return None
+        return min(100, int((self.progress / self.total) * 100))
+    
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+
+class ScheduledJob(models.Model):
+    """Recurring job that workers enqueue every ``interval_minutes``"""
+    kind = models.CharField(max_length=50, unique=True)
+    interval_minutes = models.IntegerField(default=60)
+    next_run_at = models.DateTimeField(default=timezone.now)
+    is_active = models.BooleanField(default=True)
+    
+    class Meta:
+        ordering = ['kind']
+    
+    def __str__(self):
+        return f"{self.kind} every {self.interval_minutes} min"
+
+
+class DigestRun(models.Model):
+    """Progress of one day's due-card digest emails, so an interrupted run can resume"""
+    date = models.DateField(unique=True)
+    last_user_id = models.BigIntegerField(default=0)
+    sent = models.IntegerField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"Digest {self.date}: {self.sent} sent"
+
+
+class DailyStat(models.Model):
+    """Site-wide totals for one day, maintained by ``refresh_analytics``"""
+    date = models.DateField(unique=True)
+    active_users = models.IntegerField(default=0)
+    reviews = models.IntegerField(default=0)
+    correct_reviews = models.IntegerField(default=0)
+    cards_created = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"{self.date}: {self.reviews} reviews"
+
+
+class DailyActiveUser(models.Model):
+    """A user who reviewed at least one card on a given day
+
+    ``user_id`` is a plain integer so history survives account deletion.
+    """
+    date = models.DateField()
+    user_id = models.IntegerField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'user_id'], name='unique_daily_active_user'),
+        ]
+
+
+class TopicStat(models.Model):
+    """Site-wide totals for one topic, maintained by ``refresh_analytics``"""
+    topic = models.CharField(max_length=100, unique=True)
+    reviews = models.IntegerField(default=0)
+    cards_created = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-reviews']
+        indexes = [
+            models.Index(fields=['-reviews']),
+        ]
+    
+    def __str__(self):
+        return f"{self.topic}: {self.reviews} reviews"
+
+
+class AnalyticsWatermark(models.Model):
+    """Highest source row id already folded into the analytics tables"""
+    source = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.source} up to #{self.last_id}"
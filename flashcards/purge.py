@@ -0,0 +1,122 @@
+"""
+Deleting accounts with all of their data.
+
+``User.delete()`` lets Django's deletion collector load every related row
+into Python before deleting it, which does not scale to accounts with
+hundreds of thousands of cards and reviews. ``purge_user`` deletes the
+dependent tables first, leaf tables before the ones they point to, with one
+set-based DELETE per primary-key batch. Each batch is its own short
+transaction, so locks are held briefly and memory stays bounded. Once the
+big tables are empty, the user row itself is deleted normally, which only
+leaves a few small relations for the collector. Images that were on the
+user's cards and are no longer on anyone's are deleted with their files.
+
+A purge can be interrupted and run again: every step only deletes what is
+still there. Images of cards deleted by the interrupted run are not found
+again, and are left in place.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import ProtectedError, Q
+
+from .models import (
+    CardProgress, CardVector, Deck, DeckSubscription, Flashcard, ImageAsset, Job, Review, StudySession,
+    StudySessionSummary,
+)
+
+PURGE_BATCH_SIZE = 1000
+
+
+def purge_steps(user):
+    """Querysets to delete, in an order that never leaves a dangling reference
+
+    Other users' reviews, progress and subscriptions on this user's published
+    cards and decks go too, since the rows they point to are deleted.
+    """
+    return [
+        Review.objects.filter(Q(user=user) | Q(flashcard__user=user)),
+        CardProgress.objects.filter(Q(user=user) | Q(flashcard__user=user)),
+        CardVector.objects.filter(flashcard__user=user),
+        DeckSubscription.objects.filter(Q(user=user) | Q(deck__owner=user)),
+        Flashcard.objects.filter(user=user),
+        Deck.objects.filter(owner=user),
+        StudySession.objects.filter(user=user),
+        StudySessionSummary.objects.filter(user=user),
+    ]
+
+
+def purge_user(user, batch_size=PURGE_BATCH_SIZE, progress=None):
+    """Delete a user and everything they own, a batch of rows at a time
+
+    ``progress(done, total)`` is called after every batch. Returns the number
+    of rows deleted, not counting the user row and unused images.
+    """
+    # Stop new data from arriving while the purge runs: the user can no
+    # longer log in and subscribers no longer see the user's decks
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    Deck.objects.filter(owner=user).update(is_published=False)
+    Flashcard.objects.filter(deck__owner=user).exclude(user=user).update(deck=None)
+
+    cards = Flashcard.objects.filter(user=user)
+    images = set(cards.exclude(front_image=None).values_list('front_image_id', flat=True))
+    images.update(cards.exclude(back_image=None).values_list('back_image_id', flat=True))
+
+    steps = purge_steps(user)
+    total = sum(queryset.count() for queryset in steps)
+    done = 0
+    if progress:
+        progress(done, total)
+    for queryset in steps:
+        for deleted in _delete_in_batches(queryset, batch_size):
+            done += deleted
+            if progress:
+                progress(done, total)
+
+    for job in Job.objects.filter(user=user):
+        job.input_file.delete(save=False)
+        job.result_file.delete(save=False)
+    done += Job.objects.filter(user=user).delete()[0]
+    user.delete()
+    _delete_unused_images(images, batch_size)
+    return done
+
+
+def _delete_in_batches(queryset, batch_size):
+    """Delete the rows of ``queryset`` one primary-key batch at a time, yielding each count
+
+    Each batch is a single ``DELETE ... WHERE id IN (...)`` that skips the
+    deletion collector, so no rows are loaded and no delete signals are sent
+    (none of these models has receivers). That is only safe because
+    ``purge_steps`` empties every table pointing at a model before the model
+    itself: reviews, progress and vectors before cards, cards and
+    subscriptions before decks, reviews before sessions. A row added after
+    its step, such as a queued review flushed mid-purge, makes the database
+    reject the DELETE on its foreign key; running the purge again removes it.
+    """
+    model = queryset.model
+    while True:
+        with transaction.atomic():
+            batch = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return
+            pks = model.objects.filter(pk__in=batch)
+            deleted = pks._raw_delete(pks.db)
+        yield deleted
+
+
+def _delete_unused_images(shas, batch_size):
+    """Delete the image assets among ``shas`` that no card uses, with their files"""
+    shas = sorted(shas)
+    for start in range(0, len(shas), batch_size):
+        batch = shas[start:start + batch_size]
+        used = set(Flashcard.objects.filter(front_image__in=batch).values_list('front_image_id', flat=True))
+        used.update(Flashcard.objects.filter(back_image__in=batch).values_list('back_image_id', flat=True))
+        unused = ImageAsset.objects.filter(pk__in=set(batch) - used)
+        for asset in unused:
+            try:
+                asset.delete()
+            except ProtectedError:
+                # Another user's card picked the image up since the check
+                continue
+            asset.image.delete(save=False)
+            asset.thumbnail.delete(save=False)
@@ -0,0 +1,126 @@
+"""
+Multiple-choice quizzes.
+
+Every question shows a card's front with its own back and QUIZ_CHOICES - 1
+backs of other cards from the same topic. Questions and distractors are
+drawn with ``random.sample`` from cached lists of card ids per topic. That
+makes each draw O(1) in the size of the topic. Only the drawn cards are then
+loaded, in one query. A pool is rebuilt with one id-only query when it is
+missing; ``invalidate_quiz_pools`` drops a user's pools when their set of
+cards changes.
+
+Pages show choices under random tokens from ``deal_choices`` rather than
+card ids, since the right answer's id is also the question's.
+"""
+import hashlib
+import random
+import secrets
+import time
+from array import array
+
+from django.core.cache import cache
+
+from .decks import cards_for, visible_cards
+
+QUIZ_CHOICES = 4
+DEFAULT_QUIZ_QUESTIONS = 20
+MAX_QUIZ_QUESTIONS = 50
+POOL_TIMEOUT = 60 * 60
+# Extra distractor candidates per question, in case some repeat an answer
+SPARE_CANDIDATES = 2
+
+
+def _generation(user_id):
+    return cache.get_or_set(f'quiz-generation:{user_id}', time.time_ns, None)
+
+
+def invalidate_quiz_pools(user_id):
+    """Forget all cached id pools of a user, e.g. after cards were added or deleted"""
+    # A fresh timestamp rather than a counter, so an evicted generation can
+    # never come back with a value that old pools were cached under
+    cache.set(f'quiz-generation:{user_id}', time.time_ns(), None)
+
+
+def topic_pools(user, topics):
+    """Map each topic ('' for all topics) to the ids of the user's cards in it"""
+    generation = _generation(user.pk)
+    keys = {
+        topic: f'quiz-pool:{user.pk}:{generation}:{hashlib.md5(topic.encode()).hexdigest()}'
+        for topic in set(topics)
+    }
+    cached = cache.get_many(keys.values())
+    pools = {topic: cached[key] for topic, key in keys.items() if key in cached}
+
+    missing = [topic for topic in keys if topic not in pools]
+    # Pools are kept as arrays of 64-bit ints, which the cache unpickles far
+    # faster than lists of Python ints
+    if '' in missing:
+        pools[''] = array('q', visible_cards(user).values_list('pk', flat=True))
+        missing.remove('')
+    if missing:
+        for topic in missing:
+            pools[topic] = array('q')
+        rows = visible_cards(user).filter(topic__in=missing).values_list('topic', 'pk')
+        for topic, pk in rows:
+            pools[topic].append(pk)
+    cache.set_many({keys[topic]: pools[topic] for topic in keys if keys[topic] not in cached}, POOL_TIMEOUT)
+    return pools
+
+
+def build_quiz(user, topic='', count=DEFAULT_QUIZ_QUESTIONS):
+    """Draw up to ``count`` questions, each with its answer and distractors
+
+    Returns ``(card, choices)`` pairs where ``choices`` is a shuffled list of
+    ``(card id, back html)``; the right choice carries the card's own id.
+    Topics with too few cards for a full set of choices borrow distractors
+    from all of the user's cards.
+    """
+    count = max(1, min(count, MAX_QUIZ_QUESTIONS))
+    question_pool = topic_pools(user, [topic])[topic]
+    question_ids = random.sample(question_pool, min(count, len(question_pool)))
+    cards = cards_for(user).in_bulk(question_ids)
+    questions = [cards[pk] for pk in question_ids if pk in cards]
+
+    pools = topic_pools(user, [card.topic for card in questions] + [''])
+    wanted = QUIZ_CHOICES - 1 + SPARE_CANDIDATES
+    candidates = {}
+    for card in questions:
+        pool = pools[card.topic] if len(pools[card.topic]) >= QUIZ_CHOICES else pools['']
+        drawn = random.sample(pool, min(wanted + 1, len(pool)))
+        candidates[card.pk] = [pk for pk in drawn if pk != card.pk][:wanted]
+
+    backs = dict(
+        visible_cards(user)
+        .filter(pk__in={pk for ids in candidates.values() for pk in ids})
+        .values_list('pk', 'back_html')
+    )
+
+    quiz = []
+    for card in questions:
+        choices = [(card.pk, card.back_html)]
+        seen = {card.back_html}
+        for pk in candidates[card.pk]:
+            if len(choices) == QUIZ_CHOICES:
+                break
+            # Skip cards deleted since the pool was cached and repeated answers
+            if pk in backs and backs[pk] not in seen:
+                choices.append((pk, backs[pk]))
+                seen.add(backs[pk])
+        random.shuffle(choices)
+        quiz.append((card, choices))
+    return quiz
+
+
+def deal_choices(quiz):
+    """Give every choice of a ``build_quiz`` result a random token instead of its card id
+
+    Returns the quiz with ``(token, back html)`` choices and a map of question
+    card id (as a string, for the session) to the token of its right answer.
+    """
+    dealt = []
+    answers = {}
+    for card, choices in quiz:
+        tokens = {pk: secrets.token_urlsafe(12) for pk, _ in choices}
+        dealt.append((card, [(tokens[pk], back_html) for pk, back_html in choices]))
+        answers[str(card.pk)] = tokens[card.pk]
+    return dealt, answers
@@ -0,0 +1,95 @@
+"""
+Markdown and LaTeX rendering for card content.
+
+Cards are rendered once when they are saved or imported and the sanitized
+HTML is stored next to the source text, so views never render Markdown per
+request. Math becomes MathML at the same time, which browsers display
+without any script. Bump RENDERER_VERSION whenever the output changes and
+run ``manage.py rerender_cards`` to refresh stored HTML.
+"""
+import re
+import uuid
+
+import markdown
+import nh3
+from django.utils.html import escape
+from latex2mathml.converter import convert as latex_to_mathml
+
+RENDERER_VERSION = 2
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables', 'sane_lists', 'nl2br']
+
+ALLOWED_TAGS = {
+    'p', 'br', 'hr', 'strong', 'em', 'del', 'code', 'pre', 'blockquote',
+    'ul', 'ol', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'a',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'code': {'class'},
+    'th': {'align'},
+    'td': {'align'},
+}
+
+# The MathML that latex2mathml produces, minus style, class and href
+MATHML_TAGS = {
+    'math', 'mrow', 'mi', 'mn', 'mo', 'mtext', 'mspace', 'msup', 'msub', 'msubsup',
+    'mfrac', 'msqrt', 'mroot', 'mstyle', 'mpadded', 'mphantom', 'menclose',
+    'munder', 'mover', 'munderover', 'mtable', 'mtr', 'mtd', 'none',
+}
+MATHML_ATTRIBUTES = {
+    'accent', 'columnalign', 'columnlines', 'columnspacing', 'depth', 'display', 'displaystyle',
+    'fence', 'form', 'height', 'largeop', 'linethickness', 'lspace', 'mathbackground', 'mathcolor',
+    'mathsize', 'mathvariant', 'maxsize', 'minsize', 'movablelimits', 'notation', 'rowlines',
+    'rowspacing', 'rspace', 'scriptlevel', 'separator', 'stretchy', 'voffset', 'width', 'xmlns',
+}
+
+# $$display$$, \[display\], \(inline\) and $inline$. Inline dollars must hug
+# their content and not be followed by a digit, so "$5 and $10" stays text.
+MATH = re.compile(
+    r'\$\$(?P<display>.+?)\$\$'
+    r'|\\\[(?P<display_bracket>.+?)\\\]'
+    r'|\\\((?P<inline_paren>.+?)\\\)'
+    r'|\$(?!\s)(?P<inline>[^$\n]+?)(?<!\s)\$(?!\d)',
+    re.DOTALL,
+)
+
+
+def render_card_text(text):
+    """Render card source text to sanitized HTML
+
+    Math is lifted out before Markdown runs (so ``_`` and ``*`` inside
+    formulas are not treated as emphasis) and put back afterwards as MathML.
+    Everything is sanitized last, since ``\\text{}`` passes its content
+    through to the MathML unescaped.
+    """
+    formulas = []
+    token = f'math{uuid.uuid4().hex}'
+
+    def stash(match):
+        formulas.append(match)
+        return f'{token}x{len(formulas) - 1}x'
+
+    source = MATH.sub(stash, text or '')
+    html = markdown.markdown(source, extensions=MARKDOWN_EXTENSIONS, output_format='html')
+
+    def restore(match):
+        formula = formulas[int(match.group(1))]
+        display = formula.group('display') or formula.group('display_bracket')
+        if display is not None:
+            return render_math(display, display=True)
+        return render_math(formula.group('inline_paren') or formula.group('inline'), display=False)
+
+    html = re.sub(rf'{token}x(\d+)x', restore, html)
+    attributes = {**ALLOWED_ATTRIBUTES, **{tag: MATHML_ATTRIBUTES for tag in MATHML_TAGS}}
+    return nh3.clean(html, tags=ALLOWED_TAGS | MATHML_TAGS, attributes=attributes).strip()
+
+
+def render_math(latex, display):
+    """Convert one LaTeX formula to MathML, or to its source as code if it cannot be parsed"""
+    try:
+        return latex_to_mathml(latex, display='block' if display else 'inline')
+    except Exception:
+        # latex2mathml raises assorted exception types on malformed input
+        delimiters = ('\\[', '\\]') if display else ('\\(', '\\)')
+        return '<code class="math">%s</code>' % escape(delimiters[0] + latex + delimiters[1])
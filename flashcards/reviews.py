@@ -0,0 +1,132 @@
+"""
+Recording flashcard reviews.
+
+Study mode answers cards locally and syncs them later, so the same review can
+reach the server more than once. Every review carries a client-generated id
+and is stored as a ``Review`` row; the unique constraint on that id is what
+makes applying a review idempotent. With write-behind enabled, reviews are
+buffered and written in batches instead; see ``writebehind``.
+"""
+import uuid
+from datetime import timezone as dt_timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .decks import record_shared_review, visible_cards
+from .forecast import invalidate_forecast
+from .models import Flashcard, Review, StudySession
+from .writebehind import buffer_review, write_behind_enabled
+
+MAX_SYNC_BATCH = 500
+
+
+def apply_review(user, flashcard_id, is_correct, review_id=None, session_id=None, reviewed_at=None):
+    """Record one review and update card and session counters
+
+    Returns False without changing anything when a review with the same id
+    was already applied. Counters are updated with F() expressions so that
+    reviews synced concurrently from several devices are not lost.
+    """
+    now = timezone.now()
+    # Clients can have wrong clocks; never record a review in the future
+    reviewed_at = min(reviewed_at or now, now)
+    if write_behind_enabled():
+        # Session ownership and duplicates already written are checked when
+        # the buffer is flushed
+        return buffer_review(
+            user.pk, flashcard_id, is_correct, review_id or uuid.uuid4(), session_id, reviewed_at, now
+        )
+    if session_id and not StudySession.objects.filter(pk=session_id, user=user).exists():
+        session_id = None
+
+    try:
+        with transaction.atomic():
+            Review.objects.create(
+                user=user,
+                flashcard_id=flashcard_id,
+                session_id=session_id,
+                review_id=review_id or uuid.uuid4(),
+                is_correct=is_correct,
+                reviewed_at=reviewed_at,
+                created_at=now,
+            )
+            own_card = Flashcard.objects.filter(pk=flashcard_id, user=user).update(
+                times_reviewed=F('times_reviewed') + 1,
+                times_correct=F('times_correct') + (1 if is_correct else 0),
+                last_reviewed=reviewed_at,
+                is_known=is_correct,
+                updated_at=now,
+            )
+            if not own_card:
+                # A card from a subscribed deck: progress is kept per user
+                record_shared_review(user, flashcard_id, is_correct, reviewed_at)
+            if session_id:
+                StudySession.objects.filter(pk=session_id).update(
+                    cards_studied=F('cards_studied') + 1,
+                    cards_known=F('cards_known') + (1 if is_correct else 0),
+                )
+    except IntegrityError:
+        return False
+    invalidate_forecast(user.pk)
+    return True
+
+
+def apply_reviews(user, reviews):
+    """Apply a batch of queued client reviews
+
+    ``reviews`` are dicts with ``id``, ``card``, ``action`` and optionally
+    ``session`` and ``reviewed_at`` (ISO 8601). Returns the ids that were
+    applied, the ids already applied before and the ids that were rejected.
+    Clients can drop every id in the first two lists from their queue.
+    """
+    result = {'applied': [], 'duplicates': [], 'rejected': []}
+    reviews = list(reviews)[:MAX_SYNC_BATCH]
+
+    parsed = []
+    for review in reviews:
+        try:
+            review_id = uuid.UUID(str(review['id']))
+            card_id = int(review['card'])
+            if review.get('action') not in ('known', 'review'):
+                raise ValueError
+            reviewed_at = _parse_datetime(review.get('reviewed_at'))
+            session_id = int(review['session']) if review.get('session') else None
+        except (KeyError, TypeError, ValueError):
+            result['rejected'].append(review.get('id') if isinstance(review, dict) else None)
+            continue
+        parsed.append((str(review['id']), review_id, card_id, review['action'] == 'known', reviewed_at, session_id))
+
+    visible = set(visible_cards(user).filter(
+        pk__in={item[2] for item in parsed}
+    ).values_list('pk', flat=True))
+    seen = set(Review.objects.filter(
+        user=user, review_id__in=[item[1] for item in parsed]
+    ).values_list('review_id', flat=True))
+
+    for client_id, review_id, card_id, is_correct, reviewed_at, session_id in parsed:
+        if review_id in seen:
+            result['duplicates'].append(client_id)
+        elif card_id not in visible:
+            # Deleted or unsubscribed since the deck was cached; nothing left to update
+            result['rejected'].append(client_id)
+        elif apply_review(user, card_id, is_correct, review_id, session_id, reviewed_at):
+            seen.add(review_id)
+            result['applied'].append(client_id)
+        else:
+            result['duplicates'].append(client_id)
+    return result
+
+
+def _parse_datetime(value):
+    """Parse an ISO 8601 timestamp from the client, or return None"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
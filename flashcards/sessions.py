@@ -0,0 +1,97 @@
+"""
+Retention for study sessions.
+
+Study mode starts a session on every visit, so the table only grows.
+``compact_sessions`` keeps it bounded: sessions in which no card was studied
+are deleted once they are clearly abandoned, and sessions older than the
+retention period are folded into per-user ``StudySessionSummary`` rows for
+their month and then deleted. Both steps work in primary-key batches, and
+each compaction batch adds to the summaries and deletes its sessions in one
+transaction, so an interrupted run never counts a session twice.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .activity import ACTIVITY_DAYS
+from .models import StudySession, StudySessionSummary
+
+DEFAULT_RETENTION_DAYS = 400
+# Sessions without a single card are kept this long in case they are still open
+ABANDONED_AFTER = timedelta(days=1)
+COMPACT_BATCH_SIZE = 5000
+
+
+def compact_sessions(retention_days=None, batch_size=COMPACT_BATCH_SIZE, progress=None):
+    """Delete abandoned sessions and summarise old ones
+
+    Returns how many sessions were deleted as abandoned and how many were
+    folded into monthly summaries.
+    """
+    if retention_days is None:
+        retention_days = getattr(settings, 'FLASHCARD_SESSION_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+    # The statistics heatmap is built from individual sessions
+    retention_days = max(retention_days, ACTIVITY_DAYS)
+    now = timezone.now()
+
+    abandoned = StudySession.objects.filter(cards_studied=0, started_at__lt=now - ABANDONED_AFTER)
+    deleted = 0
+    for batch in _batches(abandoned, batch_size):
+        deleted += StudySession.objects.filter(pk__in=batch).delete()[1].get(StudySession._meta.label, 0)
+        if progress:
+            progress(deleted)
+
+    old = StudySession.objects.filter(started_at__lt=now - timedelta(days=retention_days))
+    compacted = 0
+    for batch in _batches(old, batch_size):
+        with transaction.atomic():
+            sessions = StudySession.objects.filter(pk__in=batch)
+            _summarise(sessions)
+            compacted += sessions.delete()[1].get(StudySession._meta.label, 0)
+        if progress:
+            progress(deleted + compacted)
+    return {'deleted': deleted, 'compacted': compacted}
+
+
+def _batches(queryset, batch_size):
+    """Yield lists of primary keys from ``queryset`` until it is empty
+
+    Callers delete each batch before asking for the next one.
+    """
+    while True:
+        batch = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return
+        yield batch
+
+
+def _summarise(sessions):
+    """Add ``sessions`` to the monthly summaries of their users"""
+    rows = (
+        sessions
+        .annotate(month=TruncMonth('started_at', output_field=DateField()))
+        .values('user_id', 'month')
+        .annotate(
+            count=Count('id'),
+            cards=Sum('cards_studied'),
+            known=Sum('cards_known'),
+            duration=Sum(F('ended_at') - F('started_at'), filter=Q(ended_at__isnull=False)),
+        )
+        .order_by()
+    )
+    for row in rows:
+        counts = {
+            'sessions': row['count'],
+            'cards_studied': row['cards'],
+            'cards_known': row['known'],
+            'minutes': int(row['duration'].total_seconds() // 60) if row['duration'] else 0,
+        }
+        updated = StudySessionSummary.objects.filter(user_id=row['user_id'], month=row['month']).update(
+            **{field: F(field) + value for field, value in counts.items()}
+        )
+        if not updated:
+            StudySessionSummary.objects.create(user_id=row['user_id'], month=row['month'], **counts)
@@ -0,0 +1,244 @@
+"""
+Similar-card index.
+
+Each card is turned into a hashed bag of word and character-trigram features
+(sublinear term frequencies, stored as float16 in ``CardVector``). When an
+index is needed the vectors of a set of cards are stacked into one matrix,
+weighted by IDF over that set and normalised, so cosine similarity is a
+matrix product.
+
+Vectors are computed when cards are imported and lazily for any card that
+has none, e.g. after an edit (``Flashcard.save`` drops the stale vector).
+Indexes are kept in process memory, up to INDEX_CACHE_BYTES, and are only
+brought up to date when a card's text or the set of cards changes. Reviews
+do not touch them.
+"""
+import re
+import threading
+import zlib
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .decks import visible_cards
+from .models import CardVector
+
+DIMENSIONS = 512
+VECTOR_DTYPE = np.float16
+# Memory for the indexes kept per process, least recently used dropped first
+INDEX_CACHE_BYTES = 64 * 1024 * 1024
+# Vectors per query when loading only the changed cards of an index
+LOAD_CHUNK_SIZE = 500
+# Rows per block when comparing every card with every other card
+BLOCK_SIZE = 1024
+DUPLICATE_THRESHOLD = 0.9
+SIMILAR_THRESHOLD = 0.2
+
+# Near-duplicate screening works on a fixed random projection of the vectors
+SCREEN_DIMENSIONS = 128
+SCREEN_MARGIN = 0.1
+PROJECTION = (
+    np.random.default_rng(0).standard_normal((DIMENSIONS, SCREEN_DIMENSIONS)) / np.sqrt(SCREEN_DIMENSIONS)
+).astype(np.float32)
+
+WORD = re.compile(r'\w+')
+
+
+def _features(text):
+    """Words plus the character trigrams of each word"""
+    for word in WORD.findall(text.lower()):
+        yield word
+        padded = f' {word} '
+        for i in range(len(padded) - 2):
+            yield '#' + padded[i:i + 3]
+
+
+def card_vector(front, back):
+    """Hashed term-frequency vector for one card's text"""
+    buckets = [zlib.crc32(feature.encode('utf-8')) % DIMENSIONS for feature in _features(f'{front} {back}')]
+    counts = np.bincount(np.asarray(buckets, dtype=np.int64), minlength=DIMENSIONS).astype(np.float32)
+    return np.log1p(counts).astype(VECTOR_DTYPE)
+
+
+def store_vectors(cards):
+    """Compute and save vectors for cards that were just created or changed"""
+    now = timezone.now()
+    CardVector.objects.bulk_create(
+        [
+            CardVector(flashcard_id=card.pk, vector=card_vector(card.front, card.back).tobytes(), computed_at=now)
+            for card in cards if card.pk is not None
+        ],
+        update_conflicts=True,
+        unique_fields=['flashcard'],
+        update_fields=['vector', 'computed_at'],
+    )
+
+
+def ensure_vectors(cards, batch_size=1000):
+    """Fill in missing vectors for a card queryset"""
+    missing = cards.filter(vector__isnull=True).only('pk', 'front', 'back').order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(missing.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        store_vectors(batch)
+        last_pk = batch[-1].pk
+
+
+# ``stamp`` identifies the vectors an index was built from; ``vectors`` holds
+# them unweighted so a changed index can reuse the rows that did not change
+Index = namedtuple('Index', 'stamp ids versions vectors matrix')
+
+_indexes = OrderedDict()
+_indexes_bytes = 0
+_indexes_lock = threading.Lock()
+
+
+def get_index(scope, cards):
+    """Card ids and the TF-IDF matrix (unit rows, float32) for a named set of cards
+
+    The index is reused while the number of vectors, the sum of their card
+    ids and their latest ``computed_at`` are unchanged, which only editing,
+    adding or removing cards affects. Otherwise only the vectors of new or
+    edited cards are loaded. The returned matrix is shared and read-only.
+    """
+    ensure_vectors(cards)
+    vectors = CardVector.objects.filter(flashcard__in=cards.values('pk'))
+    stamp = tuple(vectors.aggregate(
+        count=Count('pk'), ids=Sum('pk'), latest=Max('computed_at')
+    ).values())
+    with _indexes_lock:
+        index = _indexes.get(scope)
+        if index is not None and index.stamp == stamp:
+            _indexes.move_to_end(scope)
+            return index.ids, index.matrix
+
+    index = _update_index(index, stamp, vectors)
+    _remember(scope, index)
+    return index.ids, index.matrix
+
+
+def _update_index(index, stamp, vectors):
+    """Build the index for ``vectors``, reusing unchanged rows of ``index``"""
+    rows = list(vectors.order_by('flashcard_id').values_list('flashcard_id', 'computed_at'))
+    ids = np.asarray([card_id for card_id, _ in rows], dtype=np.int64)
+    versions = [computed_at for _, computed_at in rows]
+    raw = np.zeros((len(rows), DIMENSIONS), dtype=VECTOR_DTYPE)
+    positions = {card_id: position for position, card_id in enumerate(ids.tolist())}
+
+    missing = list(positions)
+    if index is not None:
+        old = {card_id: position for position, card_id in enumerate(index.ids.tolist())}
+        missing = []
+        for position, (card_id, computed_at) in enumerate(rows):
+            old_position = old.get(card_id)
+            if old_position is not None and index.versions[old_position] == computed_at:
+                raw[position] = index.vectors[old_position]
+            else:
+                missing.append(card_id)
+
+    if len(missing) == len(rows):
+        loaded = vectors.values_list('flashcard_id', 'vector').iterator(chunk_size=2000)
+    else:
+        loaded = (
+            row
+            for start in range(0, len(missing), LOAD_CHUNK_SIZE)
+            for row in CardVector.objects.filter(
+                pk__in=missing[start:start + LOAD_CHUNK_SIZE]
+            ).values_list('flashcard_id', 'vector')
+        )
+    for card_id, vector in loaded:
+        # Skip cards added since the ids were read; the next stamp picks them up
+        if card_id in positions:
+            raw[positions[card_id]] = np.frombuffer(bytes(vector), dtype=VECTOR_DTYPE)
+
+    matrix = _weight(raw)
+    matrix.flags.writeable = False
+    return Index(stamp, ids, versions, raw, matrix)
+
+
+def _weight(raw):
+    """Apply IDF over the rows of ``raw`` and scale each row to unit length"""
+    matrix = raw.astype(np.float32)
+    document_frequency = np.count_nonzero(matrix, axis=0)
+    matrix *= np.log((1 + len(matrix)) / (1 + document_frequency)) + 1
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.maximum(norms, 1e-12)
+    return matrix
+
+
+def _remember(scope, index):
+    """Keep ``index`` for ``scope``, dropping the least recently used past the limit"""
+    global _indexes_bytes
+    size = index.vectors.nbytes + index.matrix.nbytes
+    with _indexes_lock:
+        previous = _indexes.pop(scope, None)
+        if previous is not None:
+            _indexes_bytes -= previous.vectors.nbytes + previous.matrix.nbytes
+        if size > INDEX_CACHE_BYTES:
+            return
+        _indexes[scope] = index
+        _indexes_bytes += size
+        while _indexes_bytes > INDEX_CACHE_BYTES:
+            _, dropped = _indexes.popitem(last=False)
+            _indexes_bytes -= dropped.vectors.nbytes + dropped.matrix.nbytes
+
+
+def similar_to(ids, matrix, card_id, limit=5, threshold=SIMILAR_THRESHOLD):
+    """Return ``[(card id, score)]`` of the cards most similar to ``card_id``"""
+    position = np.searchsorted(ids, card_id)
+    if position >= len(ids) or ids[position] != card_id:
+        return []
+    scores = matrix @ matrix[position]
+    scores[position] = -1
+    limit = min(limit, len(ids) - 1)
+    if limit <= 0:
+        return []
+    top = np.argpartition(-scores, limit - 1)[:limit]
+    top = top[np.argsort(-scores[top])]
+    return [(int(ids[i]), float(scores[i])) for i in top if scores[i] >= threshold]
+
+
+def near_duplicates(ids, matrix, threshold=DUPLICATE_THRESHOLD, limit=200):
+    """Return ``[(card id, card id, score)]`` for pairs at least ``threshold`` similar
+
+    All pairs are first screened on a random projection of the matrix to
+    SCREEN_DIMENSIONS, in row blocks so memory stays at BLOCK_SIZE x n and
+    each pair is scored once. The few candidates that pass are then checked
+    against the full vectors. For pairs this similar the projected score is
+    within a few hundredths of the real one, so SCREEN_MARGIN loses none.
+    """
+    screen = matrix @ PROJECTION
+    screen /= np.maximum(np.linalg.norm(screen, axis=1, keepdims=True), 1e-12)
+
+    candidates = []
+    for start in range(0, len(ids), BLOCK_SIZE):
+        block = screen[start:start + BLOCK_SIZE] @ screen[start:].T
+        # Keep only pairs (i, j) with j > i
+        size = block.shape[0]
+        block[:, :size] = np.triu(block[:, :size], k=1)
+        # Most rows have no candidate at all; a row maximum is cheaper than a full scan
+        hit_rows = np.flatnonzero(block.max(axis=1) >= threshold - SCREEN_MARGIN)
+        rows, columns = np.nonzero(block[hit_rows] >= threshold - SCREEN_MARGIN)
+        if len(rows):
+            candidates.append(np.stack([hit_rows[rows] + start, columns + start], axis=1))
+    if not candidates:
+        return []
+
+    pairs = np.concatenate(candidates)
+    scores = np.einsum('ij,ij->i', matrix[pairs[:, 0]], matrix[pairs[:, 1]])
+    keep = scores >= threshold
+    pairs, scores = pairs[keep], scores[keep]
+    order = np.argsort(-scores)[:limit]
+    return [(int(ids[pairs[i, 0]]), int(ids[pairs[i, 1]]), float(scores[i])) for i in order]
+
+
+def similar_cards(user, card, limit=5):
+    """Cards visible to ``user`` that are most similar to ``card``, with scores"""
+    ids, matrix = get_index(f'user:{user.pk}', visible_cards(user))
+    matches = similar_to(ids, matrix, card.pk, limit=limit)
+    cards = visible_cards(user).in_bulk([card_id for card_id, _ in matches])
+    return [(cards[card_id], score) for card_id, score in matches if card_id in cards]
@@ -0,0 +1,85 @@
+import time
+
+from django import template
+from django.core.cache import cache
+
+register = template.Library()
+
+# Bump when the markup of a cached fragment changes
+FRAGMENT_VERSION = 4
+FRAGMENT_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def fragment_key(name, card):
+    """Cache key for a card fragment; it changes whenever the card is saved
+
+    Cards from a subscribed deck are shown with the viewer's progress, which
+    does not touch the card row, so that progress is part of their key. So is
+    the progress of cards with reviews still buffered by write-behind.
+    """
+    key = f"fragment:{FRAGMENT_VERSION}:{name}:{card.pk}:{card.updated_at.timestamp()}"
+    if getattr(card, 'is_shared', False) or getattr(card, 'has_pending_reviews', False):
+        key += f":shared:{card.progress_reviews}:{card.progress_correct}:{card.progress_known:d}"
+    return key
+
+
+def get_fragment_stats(request):
+    """Per-request fragment cache counters, read by FragmentCacheMetricsMiddleware"""
+    if not hasattr(request, 'fragment_stats'):
+        request.fragment_stats = {
+            'hits': 0, 'misses': 0, 'render_seconds': 0.0, 'saved_seconds': 0.0, 'costs': {},
+        }
+    return request.fragment_stats
+
+
+class CardCacheNode(template.Node):
+    def __init__(self, nodelist, name, card):
+        self.nodelist = nodelist
+        self.name = name
+        self.card = card
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        card = self.card.resolve(context)
+        key = fragment_key(name, card)
+        cost_key = f"fragment-cost:{FRAGMENT_VERSION}:{name}"
+        request = context.get('request')
+        stats = get_fragment_stats(request) if request is not None else None
+
+        content = cache.get(key)
+        if content is not None:
+            if stats is not None:
+                if name not in stats['costs']:
+                    stats['costs'][name] = cache.get(cost_key, 0.0)
+                stats['hits'] += 1
+                stats['saved_seconds'] += stats['costs'][name]
+            return content
+
+        started = time.perf_counter()
+        content = self.nodelist.render(context)
+        elapsed = time.perf_counter() - started
+        cache.set(key, content, FRAGMENT_TIMEOUT)
+
+        # Keep a moving average of what one render costs, to estimate savings
+        average = cache.get(cost_key)
+        cache.set(cost_key, elapsed if average is None else average * 0.9 + elapsed * 0.1, None)
+        if stats is not None:
+            stats['misses'] += 1
+            stats['render_seconds'] += elapsed
+        return content
+
+
+@register.tag
+def cardcache(parser, token):
+    """Cache the enclosed markup for one card until the card is next saved
+
+    Usage::
+
+        {% cardcache 'card_row' flashcard %} ... {% endcardcache %}
+    """
+    bits = token.split_contents()
+    if len(bits) != 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a fragment name and a card")
+    nodelist = parser.parse(('endcardcache',))
+    parser.delete_first_token()
+    return CardCacheNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]))
@@ -1,7 +1,75 @@
-from django.test import TestCase, Client
+import io
+import json
+import os
+import re
+import zipfile
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+import numpy as np
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
 from django.urls import reverse
-from .models import Flashcard, StudySession
+from django.utils import timezone
+from PIL import Image
+from .models import (
+    Flashcard, StudySession, Review, Job, ScheduledJob, ImageAsset, DailyStat, TopicStat, AnalyticsWatermark,
+    Deck, DeckSubscription, CardProgress, CardVector, StudySessionSummary,
+    DigestRun
+)
+from .analytics import COMMIT_LAG, refresh_analytics
+from .backup import iter_backup, restore_backup
+from .digest import due_counts, send_digests
+from .forecast import fit_curve, review_intervals
+from .formats import import_rows, iter_jsonl_lines
+from .images import store_image
+from .purge import purge_user
+from .quiz import QUIZ_CHOICES, build_quiz
+from .reviews import apply_review
+from .sessions import compact_sessions
+from .similarity import get_index, near_duplicates
+from .writebehind import flush, pending_reviews
+from .rendering import RENDERER_VERSION, render_card_text
+from .jobs import (
+    HANDLERS, STALE_JOB_TIMEOUT, claim_next_job, enqueue, enqueue_due_schedules, job_handler,
+    requeue_stale_jobs, run_job,
+)
+from .management.commands.benchmark_import import build_anki_package
+from .management.commands.trim_bootstrap_css import trim_css, used_classes
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+# Pages render {% static %} without a collectstatic manifest; StaticAssetTests
+# runs collectstatic and renders pages with the manifest storage
+plain_static_storage = override_settings(
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'
+)
+
+
+def make_png(color='red', size=(800, 600)):
+    """Return the bytes of a solid-colour PNG image"""
+    output = io.BytesIO()
+    Image.new('RGB', size, color).save(output, 'PNG')
+    return output.getvalue()
+
+
+def setUpModule():
+    plain_static_storage.enable()
+
+
+def tearDownModule():
+    plain_static_storage.disable()
+    shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
 
 
 class FlashcardModelTests(TestCase):
@@ -167,3 +235,1548 @@ class StudySessionTests(TestCase):
         response = self.client.get(reverse('flashcards:study_mode'))
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'flashcards/study_mode.html')
+
+
+
+class OfflineStudyTests(TestCase):
+    """Test cases for syncing reviews queued by offline study mode"""
+    
+    def setUp(self):
+        """Set up test user, card and study session"""
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+        self.card = Flashcard.objects.create(user=self.user, front='Q', back='A', topic='Test')
+        self.session = StudySession.objects.create(user=self.user, topic='Test')
+    
+    def _sync(self, reviews):
+        return self.client.post(
+            reverse('flashcards:sync_reviews'),
+            json.dumps({'reviews': reviews}),
+            content_type='application/json'
+        ).json()
+    
+    def _review(self, action='known', card=None):
+        return {
+            'id': str(uuid.uuid4()),
+            'card': card or self.card.pk,
+            'action': action,
+            'session': self.session.pk,
+            'reviewed_at': timezone.now().isoformat(),
+        }
+    
+    def test_sync_is_idempotent(self):
+        """Test a review sent twice is only applied once"""
+        review = self._review()
+        first = self._sync([review])
+        second = self._sync([review, review])
+        self.assertEqual(first['applied'], [review['id']])
+        self.assertEqual(second['duplicates'], [review['id'], review['id']])
+        self.card.refresh_from_db()
+        self.session.refresh_from_db()
+        self.assertEqual(self.card.times_reviewed, 1)
+        self.assertTrue(self.card.is_known)
+        self.assertEqual((self.session.cards_studied, self.session.cards_known), (1, 1))
+        self.assertEqual(Review.objects.count(), 1)
+    
+    def test_sync_rejects_other_users_cards(self):
+        """Test reviews for cards the user does not own are rejected"""
+        other = User.objects.create_user(username='otheruser', password='otherpass123')
+        card = Flashcard.objects.create(user=other, front='Q', back='A', topic='Test')
+        bad = {'id': 'not-a-uuid', 'card': self.card.pk, 'action': 'known'}
+        result = self._sync([self._review(card=card.pk), bad])
+        self.assertEqual(len(result['rejected']), 2)
+        card.refresh_from_db()
+        self.assertEqual(card.times_reviewed, 0)
+    
+    def test_mark_with_review_id_is_idempotent(self):
+        """Test the online mark endpoint honours client review ids"""
+        review_id = str(uuid.uuid4())
+        url = reverse('flashcards:mark_flashcard', args=[self.card.pk])
+        for _ in range(2):
+            response = self.client.post(url, {'action': 'review', 'review_id': review_id})
+            self.assertEqual(response.json()['status'], 'success')
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.times_reviewed, 1)
+        self.assertFalse(self.card.is_known)
+    
+    def test_service_worker_and_manifest(self):
+        """Test the service worker and manifest are served for installation"""
+        response = self.client.get(reverse('flashcards:service_worker'))
+        self.assertEqual(response['Content-Type'], 'application/javascript')
+        self.assertContains(response, reverse('flashcards:study_mode'))
+        other = User.objects.create_user(username='otheruser', password='otherpass123')
+        self.client.force_login(other)
+        other_worker = self.client.get(reverse('flashcards:service_worker'))
+        cache_name = re.compile(r"CACHE_NAME = '([^']+)'")
+        self.assertNotEqual(
+            cache_name.search(response.content.decode()).group(1),
+            cache_name.search(other_worker.content.decode()).group(1),
+        )
+        manifest = self.client.get(reverse('flashcards:web_manifest')).json()
+        self.assertEqual(manifest['start_url'], reverse('flashcards:study_mode'))
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, FLASHCARD_JOBS_EAGER=True)
+class ImportExportTests(TestCase):
+    """Test cases for import and export formats"""
+    
+    def setUp(self):
+        """Set up logged in test user"""
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+    
+    def test_import_csv(self):
+        """Test importing flashcards from CSV"""
+        upload = SimpleUploadedFile(
+            'cards.csv',
+            b'Topic,Question (Front),Answer (Back)\nMath,"What is\n2+2?",4\nScience,What is H2O?,Water\n'
+        )
+        response = self.client.post(reverse('flashcards:import_flashcards'), {'import_file': upload})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Flashcard.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(Flashcard.objects.filter(front='What is\n2+2?', back='4', topic='Math').exists())
+        # The upload is deleted and the job no longer names it
+        self.assertEqual(Job.objects.get(kind='import_flashcards').input_file.name, '')
+    
+    def test_import_jsonl(self):
+        """Test importing flashcards from JSON Lines"""
+        upload = SimpleUploadedFile(
+            'cards.jsonl',
+            b'{"topic": "Math", "front": "1+1", "back": "2"}\n\n{"front": "No topic", "back": "x"}\n'
+        )
+        self.client.post(reverse('flashcards:import_flashcards'), {'import_file': upload})
+        self.assertTrue(Flashcard.objects.filter(user=self.user, topic='Math', front='1+1').exists())
+        self.assertTrue(Flashcard.objects.filter(user=self.user, topic='Imported', front='No topic').exists())
+    
+    def test_import_apkg(self):
+        """Test importing an Anki package uses deck names as topics"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'deck.apkg')
+            build_anki_package(path, note_count=25, deck_count=2)
+            with open(path, 'rb') as package:
+                upload = SimpleUploadedFile('deck.apkg', package.read())
+        self.client.post(reverse('flashcards:import_flashcards'), {'import_file': upload})
+        cards = Flashcard.objects.filter(user=self.user)
+        self.assertEqual(cards.count(), 25)
+        card = cards.get(front='Question 1')
+        self.assertEqual(card.back, 'Answer 1\nline two')
+        self.assertEqual(card.topic, 'Deck 2')
+    
+    def test_import_rejects_unknown_format(self):
+        """Test unsupported file types create no flashcards"""
+        upload = SimpleUploadedFile('cards.txt', b'hello')
+        self.client.post(reverse('flashcards:import_flashcards'), {'import_file': upload})
+        self.assertFalse(Flashcard.objects.filter(user=self.user).exists())
+    
+    def test_export_jsonl_round_trip(self):
+        """Test JSON Lines export can be imported again"""
+        Flashcard.objects.create(user=self.user, front='Q', back='A', topic='T')
+        body = self._export('jsonl')
+        self.assertEqual(json.loads(body.decode())['front'], 'Q')
+        
+        upload = SimpleUploadedFile('export.jsonl', body)
+        self.client.post(reverse('flashcards:import_flashcards'), {'import_file': upload})
+        self.assertEqual(Flashcard.objects.filter(user=self.user, front='Q', topic='T').count(), 2)
+    
+    def test_export_csv(self):
+        """Test CSV export includes a header and card rows"""
+        Flashcard.objects.create(user=self.user, front='Q', back='A', topic='T')
+        body = self._export('csv').decode()
+        self.assertTrue(body.startswith('Topic,Question (Front)'))
+        self.assertIn('T,Q,A', body)
+    
+    def _export(self, export_format):
+        """Run an export job through the views and return the downloaded file"""
+        response = self.client.post(reverse('flashcards:export_flashcards'), {'format': export_format})
+        job = Job.objects.get(user=self.user, kind='export_flashcards')
+        self.assertRedirects(response, reverse('flashcards:job_detail', args=[job.pk]))
+        
+        status = self.client.get(reverse('flashcards:job_detail', args=[job.pk]) + '?format=json').json()
+        self.assertEqual(status['status'], 'done')
+        response = self.client.get(status['download_url'])
+        return b''.join(response.streaming_content)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class JobQueueTests(TestCase):
+    """Test cases for the background job queue"""
+    
+    def setUp(self):
+        """Set up test user and a recording job handler"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.ran = []
+        job_handler('test_job')(lambda job: self.ran.append(job.pk))
+        self.addCleanup(HANDLERS.pop, 'test_job')
+    
+    def test_job_is_claimed_once(self):
+        """Test a queued job can only be claimed by one worker"""
+        job = enqueue('test_job', user=self.user)
+        claimed = claim_next_job('worker-1')
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, Job.STATUS_RUNNING)
+        self.assertIsNone(claim_next_job('worker-2'))
+        
+        run_job(claimed)
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, Job.STATUS_DONE)
+        self.assertEqual(self.ran, [job.pk])
+    
+    def test_future_jobs_wait(self):
+        """Test jobs scheduled in the future are not claimed yet"""
+        enqueue('test_job', run_at=timezone.now() + timedelta(hours=1))
+        self.assertIsNone(claim_next_job('worker-1'))
+    
+    def test_failed_job_records_error(self):
+        """Test jobs without a handler are marked as failed"""
+        enqueue('missing_handler')
+        job = run_job(claim_next_job('worker-1'))
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertIn('missing_handler', job.message)
+    
+    def test_due_schedule_enqueues_once(self):
+        """Test a due recurring job is enqueued once and rescheduled"""
+        ScheduledJob.objects.create(kind='test_job', interval_minutes=30)
+        self.assertEqual(enqueue_due_schedules(), 1)
+        self.assertEqual(enqueue_due_schedules(), 0)
+        self.assertEqual(Job.objects.filter(kind='test_job').count(), 1)
+    
+    def test_only_jobs_without_heartbeat_are_requeued(self):
+        """Test a long job that reports progress is left to its worker"""
+        enqueue('test_job', user=self.user)
+        job = claim_next_job('worker-1')
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - STALE_JOB_TIMEOUT * 3)
+        job.set_progress(10)
+        self.assertEqual(requeue_stale_jobs(), 0)
+        
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - STALE_JOB_TIMEOUT * 2)
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(claim_next_job('worker-2').pk, job.pk)
+    
+    def test_interrupted_import_resumes_without_duplicates(self):
+        """Test an import retried from its recorded progress creates each card once"""
+        rows = [{'topic': 'Math', 'front': f'Q{i}', 'back': 'A'} for i in range(5)]
+        recorded = []
+        
+        def crash_after_first_batch(count):
+            if recorded:
+                raise RuntimeError('worker died')
+            recorded.append(count)
+        
+        with self.assertRaises(RuntimeError):
+            import_rows(self.user, rows, batch_size=2, progress=crash_after_first_batch)
+        # The batch that was being written when the worker died is rolled back
+        self.assertEqual(Flashcard.objects.filter(user=self.user).count(), 2)
+        
+        self.assertEqual(import_rows(self.user, rows, batch_size=2, skip=recorded[0]), 5)
+        fronts = sorted(Flashcard.objects.filter(user=self.user).values_list('front', flat=True))
+        self.assertEqual(fronts, [f'Q{i}' for i in range(5)])
+    
+    def test_job_detail_is_private(self):
+        """Test users cannot see other users' jobs"""
+        job = enqueue('test_job', user=self.user)
+        User.objects.create_user(username='otheruser', password='otherpass123')
+        client = Client()
+        client.login(username='otheruser', password='otherpass123')
+        response = client.get(reverse('flashcards:job_detail', args=[job.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, FLASHCARD_JOBS_EAGER=True)
+class BackupRestoreTests(TestCase):
+    """Test cases for full-account backup and restore"""
+    
+    def setUp(self):
+        """Set up a user with reviewed cards and a study session"""
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.card = Flashcard.objects.create(
+            user=self.user,
+            front='What is Django?',
+            back='A Python web framework',
+            topic='Programming',
+            times_reviewed=4,
+            times_correct=3,
+            last_reviewed=timezone.now(),
+            is_known=True
+        )
+        StudySession.objects.create(
+            user=self.user,
+            ended_at=timezone.now(),
+            cards_studied=4,
+            cards_known=3,
+            topic='Programming'
+        )
+        self.other = User.objects.create_user(
+            username='otheruser',
+            password='otherpass123'
+        )
+    
+    def _archive(self):
+        return io.BytesIO(b''.join(iter_backup(self.user)))
+    
+    def test_backup_contains_manifest_and_entries(self):
+        """Test the backup is a zip with a manifest and JSON Lines entries"""
+        with zipfile.ZipFile(self._archive()) as archive:
+            manifest = json.loads(archive.read('manifest.json'))
+            card = json.loads(archive.read('flashcards.jsonl').splitlines()[0])
+        self.assertEqual(manifest['version'], 4)
+        self.assertEqual(card['times_correct'], 3)
+        self.assertTrue(card['is_known'])
+    
+    def test_restore_keeps_progress(self):
+        """Test restoring into another account keeps progress fields"""
+        created = restore_backup(self.other, self._archive())
+        self.assertEqual(created['flashcards.jsonl'], 1)
+        self.assertEqual(created['study_sessions.jsonl'], 1)
+        card = Flashcard.objects.get(user=self.other)
+        self.assertNotEqual(card.pk, self.card.pk)
+        self.assertEqual(card.times_reviewed, 4)
+        self.assertEqual(card.last_reviewed, self.card.last_reviewed)
+        self.assertEqual(StudySession.objects.get(user=self.other).cards_known, 3)
+    
+    def test_restore_is_safe_to_rerun(self):
+        """Test restoring the same archive twice creates no duplicates"""
+        restore_backup(self.other, self._archive())
+        created = restore_backup(self.other, self._archive())
+        self.assertEqual(set(created.values()), {0})
+        self.assertEqual(Flashcard.objects.filter(user=self.other).count(), 1)
+        # Restoring into the source account is a no-op as well
+        restore_backup(self.user, self._archive())
+        self.assertEqual(Flashcard.objects.filter(user=self.user).count(), 1)
+    
+    def test_restore_keeps_reviews_and_shared_deck_progress(self):
+        """Test reviews, decks, subscriptions and progress survive a round trip with remapped ids"""
+        author = User.objects.create_user(username='author', password='authorpass123')
+        deck = Deck.objects.create(owner=author, title='Anatomy', is_published=True)
+        shared = Flashcard.objects.create(user=author, front='Largest bone?', back='Femur', topic='Bio', deck=deck)
+        own_deck = Deck.objects.create(owner=self.user, title='Web')
+        Flashcard.objects.filter(pk=self.card.pk).update(deck=own_deck)
+        DeckSubscription.objects.create(user=self.user, deck=deck)
+        CardProgress.objects.create(user=self.user, flashcard=shared, times_reviewed=2, times_correct=1)
+        session = StudySession.objects.get(user=self.user)
+        Review.objects.create(user=self.user, flashcard=self.card, session=session, review_id=uuid.uuid4(),
+                              is_correct=True)
+        Review.objects.create(user=self.user, flashcard=shared, review_id=uuid.uuid4(), is_correct=False)
+        
+        created = restore_backup(self.other, self._archive())
+        self.assertEqual((created['decks.jsonl'], created['deck_subscriptions.jsonl']), (1, 1))
+        self.assertEqual((created['card_progress.jsonl'], created['reviews.jsonl']), (1, 2))
+        card = Flashcard.objects.get(user=self.other)
+        self.assertEqual(card.deck.owner, self.other)
+        self.assertTrue(DeckSubscription.objects.filter(user=self.other, deck=deck).exists())
+        progress = CardProgress.objects.get(user=self.other)
+        self.assertEqual((progress.flashcard_id, progress.times_reviewed), (shared.pk, 2))
+        own_review = Review.objects.get(user=self.other, flashcard=card)
+        self.assertEqual(own_review.session, StudySession.objects.get(user=self.other))
+        self.assertTrue(Review.objects.filter(user=self.other, flashcard=shared, is_correct=False).exists())
+        
+        # Without the author's deck on the target server, its progress and reviews are skipped
+        Deck.objects.filter(pk=deck.pk).update(is_published=False)
+        third = User.objects.create_user(username='third', password='thirdpass123')
+        created = restore_backup(third, self._archive())
+        self.assertEqual((created['card_progress.jsonl'], created['reviews.jsonl']), (0, 1))
+    
+    def test_restore_reads_version_2_archives(self):
+        """Test archives written before reviews and decks were backed up still restore"""
+        source = self._archive()
+        archive = io.BytesIO()
+        with zipfile.ZipFile(source) as old, zipfile.ZipFile(archive, 'w') as package:
+            manifest = json.loads(old.read('manifest.json'))
+            manifest.update(version=2, entries=['flashcards.jsonl', 'study_sessions.jsonl'])
+            package.writestr('manifest.json', json.dumps(manifest))
+            for name in manifest['entries']:
+                package.writestr(name, old.read(name))
+        created = restore_backup(self.other, archive)
+        self.assertEqual((created['flashcards.jsonl'], created['reviews.jsonl']), (1, 0))
+    
+    def test_restore_reads_version_3_archives(self):
+        """Test archives naming a card's deck and a review's session by id only still restore"""
+        deck = Deck.objects.create(owner=self.user, title='Web')
+        Flashcard.objects.filter(pk=self.card.pk).update(deck=deck)
+        session = StudySession.objects.get(user=self.user)
+        Review.objects.create(user=self.user, flashcard=self.card, session=session, review_id=uuid.uuid4(),
+                              is_correct=True)
+        source = self._archive()
+        archive = io.BytesIO()
+        with zipfile.ZipFile(source) as new, zipfile.ZipFile(archive, 'w') as package:
+            manifest = json.loads(new.read('manifest.json'))
+            manifest.update(version=3)
+            package.writestr('manifest.json', json.dumps(manifest))
+            for name in manifest['entries']:
+                rows = [json.loads(line) for line in new.read(name).splitlines()]
+                rows = [
+                    {column: value for column, value in row.items()
+                     if not column.startswith(('deck__', 'session__'))}
+                    for row in rows
+                ]
+                package.writestr(name, ''.join(json.dumps(row) + '\n' for row in rows))
+        restore_backup(self.other, archive)
+        card = Flashcard.objects.get(user=self.other)
+        self.assertEqual(card.deck.owner, self.other)
+        self.assertEqual(Review.objects.get(user=self.other).session, StudySession.objects.get(user=self.other))
+    
+    def test_restore_rejects_other_archives(self):
+        """Test archives without a backup manifest are rejected"""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as package:
+            package.writestr('notes.txt', 'hello')
+        with self.assertRaises(ValueError):
+            restore_backup(self.other, archive)
+    
+    def test_backup_and_restore_views(self):
+        """Test downloading a backup and restoring it through the views"""
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('flashcards:backup_account'))
+        body = b''.join(response.streaming_content)
+        
+        self.client.login(username='otheruser', password='otherpass123')
+        self.client.post(reverse('flashcards:restore_account'), {
+            'backup_file': SimpleUploadedFile('backup.zip', body)
+        })
+        job = Job.objects.get(user=self.other, kind='restore_backup')
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertTrue(Flashcard.objects.filter(user=self.other, front='What is Django?').exists())
+
+
+class FragmentCacheTests(TestCase):
+    """Test cases for cached card fragments"""
+    
+    def setUp(self):
+        """Set up logged in user with a flashcard and an empty cache"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.flashcard = Flashcard.objects.create(
+            user=self.user,
+            front='Test Question',
+            back='Test Answer',
+            topic='Test Topic'
+        )
+        self.client.login(username='testuser', password='testpass123')
+    
+    def test_second_render_hits_cache(self):
+        """Test card rows are served from the cache on repeat visits"""
+        first = self.client.get(reverse('flashcards:flashcard_list'))
+        self.assertIn('1 misses', first['Server-Timing'])
+        second = self.client.get(reverse('flashcards:flashcard_list'))
+        self.assertIn('1 hits, 0 misses', second['Server-Timing'])
+        self.assertContains(second, 'Test Question')
+    
+    def test_saving_card_invalidates_fragment(self):
+        """Test a saved card is re-rendered with its new content"""
+        url = reverse('flashcards:flashcard_detail', args=[self.flashcard.pk])
+        self.client.get(url)
+        self.flashcard.is_known = True
+        self.flashcard.mark_reviewed(is_correct=True)
+        response = self.client.get(url)
+        self.assertIn('0 hits, 1 misses', response['Server-Timing'])
+        self.assertContains(response, '100%')
+
+
+class RenderingTests(TestCase):
+    """Test cases for Markdown and LaTeX card content"""
+    
+    def setUp(self):
+        """Set up test user"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+    
+    def test_markdown_is_rendered_on_save(self):
+        """Test cards store rendered HTML next to the source text"""
+        card = Flashcard.objects.create(
+            user=self.user,
+            front='What is **bold**?',
+            back='```\ncode\n```',
+            topic='Markdown'
+        )
+        self.assertEqual(card.front_html, '<p>What is <strong>bold</strong>?</p>')
+        self.assertIn('<pre><code>code', card.back_html)
+        self.assertEqual(card.render_version, RENDERER_VERSION)
+    
+    def test_html_is_sanitized(self):
+        """Test scripts and javascript links are removed"""
+        html = render_card_text('<script>alert(1)</script>[x](javascript:alert(1)) <b onclick="x()">hi</b>')
+        self.assertNotIn('script', html)
+        self.assertNotIn('javascript', html)
+        self.assertNotIn('onclick', html)
+    
+    def test_math_is_rendered_to_mathml(self):
+        """Test formulas survive Markdown as MathML and dollar amounts stay text"""
+        html = render_card_text('$a_1 * b_2$ costs $5 and $10')
+        self.assertIn('<math xmlns="http://www.w3.org/1998/Math/MathML" display="inline">', html)
+        self.assertIn('<msub><mi>a</mi><mn>1</mn></msub><mo>*</mo>', html)
+        self.assertIn('costs $5 and $10', html)
+        self.assertIn('display="block"', render_card_text('$$x^2$$'))
+    
+    def test_math_text_is_sanitized(self):
+        """Test markup inside \\text{} does not reach the stored HTML"""
+        html = render_card_text('$$\\text{<script>alert(1)</script>}$$')
+        self.assertIn('<math', html)
+        self.assertNotIn('script', html)
+    
+    def test_review_does_not_rerender(self):
+        """Test marking a card reviewed leaves the stored HTML alone"""
+        card = Flashcard.objects.create(user=self.user, front='Q', back='A', topic='T')
+        Flashcard.objects.filter(pk=card.pk).update(front_html='cached')
+        card.refresh_from_db()
+        card.mark_reviewed(is_correct=True)
+        card.refresh_from_db()
+        self.assertEqual(card.front_html, 'cached')
+        self.assertEqual(card.times_reviewed, 1)
+    
+    def test_rerender_command_updates_stale_cards(self):
+        """Test rerender_cards refreshes cards from older renderer versions"""
+        card = Flashcard.objects.create(user=self.user, front='*new*', back='A', topic='T')
+        Flashcard.objects.filter(pk=card.pk).update(front_html='', render_version=0)
+        call_command('rerender_cards', batch_size=1, stdout=io.StringIO())
+        card.refresh_from_db()
+        self.assertEqual(card.front_html, '<p><em>new</em></p>')
+        self.assertEqual(card.render_version, RENDERER_VERSION)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, FLASHCARD_JOBS_EAGER=True)
+class ImageAttachmentTests(TestCase):
+    """Test cases for content-addressed card images"""
+    
+    def setUp(self):
+        """Set up test user and client"""
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+    
+    def _create(self, front, image):
+        return self.client.post(reverse('flashcards:flashcard_create'), {
+            'front': front,
+            'back': 'Answer',
+            'topic': 'Anatomy',
+            'front_image_upload': SimpleUploadedFile('diagram.png', image, 'image/png'),
+        })
+    
+    def test_same_image_is_stored_once(self):
+        """Test cards sharing an image share one asset and thumbnail"""
+        image = make_png()
+        self._create('Heart', image)
+        self._create('Lungs', image)
+        self.assertEqual(ImageAsset.objects.count(), 1)
+        asset = ImageAsset.objects.get()
+        self.assertEqual(Flashcard.objects.filter(front_image=asset).count(), 2)
+        self.assertEqual((asset.width, asset.height), (800, 600))
+        with Image.open(asset.thumbnail.path) as thumbnail:
+            self.assertLessEqual(max(thumbnail.size), 400)
+    
+    def test_invalid_image_is_rejected(self):
+        """Test files that are not images are reported on the form"""
+        response = self._create('Heart', b'not an image')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Flashcard.objects.exists())
+    
+    def test_invalid_form_stores_no_image(self):
+        """Test an upload on a form that fails validation leaves no asset behind"""
+        response = self._create('', make_png())
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(ImageAsset.objects.exists())
+        self._create('Heart', make_png())
+        self.assertEqual(Flashcard.objects.get().front_image, ImageAsset.objects.get())
+    
+    def test_image_served_with_immutable_cache(self):
+        """Test images are served with far-future immutable cache headers"""
+        self._create('Heart', make_png())
+        sha256 = ImageAsset.objects.get().sha256
+        response = self.client.get(reverse('flashcards:image_thumbnail', args=[sha256]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        response.close()
+    
+    def test_jsonl_round_trip_keeps_images(self):
+        """Test image hashes in JSON Lines exports attach on import"""
+        self._create('Heart', make_png())
+        lines = list(iter_jsonl_lines(Flashcard.objects.filter(user=self.user)))
+        import_rows(self.user, (json.loads(line) for line in lines))
+        self.assertEqual(Flashcard.objects.filter(front_image=ImageAsset.objects.get()).count(), 2)
+    
+    def test_import_ignores_images_of_other_users(self):
+        """Test importing a known hash does not attach another user's image"""
+        self._create('Heart', make_png())
+        lines = list(iter_jsonl_lines(Flashcard.objects.filter(user=self.user)))
+        other = User.objects.create_user(username='otheruser', password='otherpass123')
+        import_rows(other, (json.loads(line) for line in lines))
+        self.assertIsNone(Flashcard.objects.get(user=other).front_image_id)
+    
+    def test_image_hidden_from_other_users(self):
+        """Test images are only served to users who can see a card using them"""
+        self._create('Heart', make_png())
+        sha256 = ImageAsset.objects.get().sha256
+        User.objects.create_user(username='otheruser', password='otherpass123')
+        self.client.login(username='otheruser', password='otherpass123')
+        response = self.client.get(reverse('flashcards:image_asset', args=[sha256]))
+        self.assertEqual(response.status_code, 404)
+    
+    def test_backup_cannot_claim_stored_images(self):
+        """Test a backup naming a stored image's hash without its content gets no image"""
+        self._create('Heart', make_png())
+        sha256 = ImageAsset.objects.get().sha256
+        other = User.objects.create_user(username='otheruser', password='otherpass123')
+        Flashcard.objects.create(user=other, front='Lungs', back='Answer', topic='Anatomy', front_image_id=sha256)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as forged:
+            forged.writestr(f'media/{sha256}', make_png(color='blue'))
+            with zipfile.ZipFile(io.BytesIO(b''.join(iter_backup(other)))) as source:
+                for name in source.namelist():
+                    if not name.startswith('media/'):
+                        forged.writestr(name, source.read(name))
+        Flashcard.objects.filter(user=other).delete()
+        archive.seek(0)
+        restore_backup(other, archive)
+        self.assertIsNone(Flashcard.objects.get(user=other).front_image_id)
+    
+    def test_backup_restores_missing_images(self):
+        """Test backups carry image files and restore them"""
+        self._create('Heart', make_png())
+        archive = io.BytesIO(b''.join(iter_backup(self.user)))
+        sha256 = ImageAsset.objects.get().sha256
+        Flashcard.objects.all().delete()
+        ImageAsset.objects.all().delete()
+        restore_backup(self.user, archive)
+        card = Flashcard.objects.get(user=self.user)
+        self.assertEqual(card.front_image_id, sha256)
+        self.assertTrue(os.path.exists(card.front_image.image.path))
+
+
+class AnalyticsTests(TestCase):
+    """Test cases for the incrementally refreshed operator analytics"""
+    
+    def setUp(self):
+        """Set up two users with cards and reviews"""
+        self.client = Client()
+        self.staff = User.objects.create_user(username='staff', password='staffpass123', is_staff=True)
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.cards = [
+            Flashcard.objects.create(user=user, front='Q', back='A', topic=topic)
+            for user, topic in [(self.user, 'Anatomy'), (self.user, 'Anatomy'), (self.staff, 'Geography')]
+        ]
+    
+    def _refresh(self, **kwargs):
+        """Refresh as if the commit lag had passed for every row created so far"""
+        later = timezone.now() + COMMIT_LAG
+        with mock.patch('flashcards.analytics.timezone.now', return_value=later):
+            return refresh_analytics(**kwargs)
+    
+    def test_refresh_is_incremental(self):
+        """Test each refresh folds in only rows past the watermark"""
+        apply_review(self.user, self.cards[0].pk, True)
+        apply_review(self.staff, self.cards[2].pk, False)
+        self._refresh(batch_size=2)
+        apply_review(self.user, self.cards[1].pk, True)
+        processed = self._refresh(batch_size=2)
+        self.assertEqual(processed, {'reviews': 1, 'flashcards': 0})
+        
+        today = DailyStat.objects.get()
+        self.assertEqual((today.reviews, today.correct_reviews), (3, 2))
+        self.assertEqual((today.active_users, today.cards_created), (2, 3))
+        anatomy = TopicStat.objects.get(topic='Anatomy')
+        self.assertEqual((anatomy.reviews, anatomy.cards_created), (2, 2))
+        self.assertEqual(
+            AnalyticsWatermark.objects.get(source='reviews').last_id,
+            Review.objects.latest('pk').pk
+        )
+    
+    def test_refresh_keeps_rows_committed_out_of_order(self):
+        """Test a row committed after a higher id is still counted"""
+        early = Review.objects.create(
+            user=self.user, flashcard=self.cards[0], review_id=uuid.uuid4(), is_correct=True,
+            created_at=timezone.now() - COMMIT_LAG * 2,
+        )
+        Review.objects.create(
+            pk=early.pk + 2, user=self.user, flashcard=self.cards[1], review_id=uuid.uuid4(), is_correct=True
+        )
+        self.assertEqual(refresh_analytics()['reviews'], 1)
+        self.assertEqual(AnalyticsWatermark.objects.get(source='reviews').last_id, early.pk)
+        
+        # The transaction holding the id in between commits only now
+        Review.objects.create(
+            pk=early.pk + 1, user=self.staff, flashcard=self.cards[2], review_id=uuid.uuid4(), is_correct=False
+        )
+        self.assertEqual(self._refresh()['reviews'], 2)
+        self.assertEqual(DailyStat.objects.get().reviews, 3)
+    
+    def test_analytics_page_is_staff_only(self):
+        """Test only staff members can see site analytics"""
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.client.get(reverse('flashcards:analytics')).status_code, 302)
+        self.client.login(username='staff', password='staffpass123')
+        self._refresh()
+        response = self.client.get(reverse('flashcards:analytics'))
+        self.assertContains(response, 'Geography')
+
+
+class ActivityTests(TestCase):
+    """Test cases for the statistics activity heatmap data"""
+    
+    def setUp(self):
+        """Set up test user with finished study sessions"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+        # Midday, so the sessions never straddle midnight
+        now = timezone.now().replace(hour=12, minute=0)
+        for minutes, studied, known in [(10, 8, 6), (20, 12, 6)]:
+            StudySession.objects.create(
+                user=self.user,
+                started_at=now - timedelta(minutes=minutes),
+                ended_at=now,
+                cards_studied=studied,
+                cards_known=known
+            )
+    
+    def test_activity_is_aggregated_per_day(self):
+        """Test sessions are summed into one compact row per day"""
+        data = self.client.get(reverse('flashcards:statistics_activity')).json()
+        self.assertEqual(len(data['days']), 1)
+        self.assertEqual(data['days'][0][1:], [30, 20, 12])
+        self.assertEqual(data['weeks'][0][1:], [30, 20, 60])
+    
+    def test_activity_cache_invalidated_on_session_end(self):
+        """Test ending a session refreshes the cached activity"""
+        url = reverse('flashcards:statistics_activity')
+        self.client.get(url)
+        session = StudySession.objects.create(
+            user=self.user, started_at=timezone.now().replace(hour=11, minute=55), cards_studied=5
+        )
+        self.assertEqual(self.client.get(url).json()['days'][0][2], 20)
+        
+        client_session = self.client.session
+        client_session['study_session_id'] = session.pk
+        client_session.save()
+        self.client.get(reverse('flashcards:end_study_session'))
+        self.assertEqual(self.client.get(url).json()['days'][0][2], 25)
+
+
+class SharedDeckTests(TestCase):
+    """Test cases for published decks studied by subscribers"""
+    
+    def setUp(self):
+        """Set up an author with a published deck and a subscriber"""
+        cache.clear()
+        self.client = Client()
+        self.author = User.objects.create_user(username='author', password='authorpass123')
+        self.student = User.objects.create_user(username='student', password='studentpass123')
+        self.deck = Deck.objects.create(owner=self.author, title='Anatomy 101', is_published=True)
+        self.card = Flashcard.objects.create(
+            user=self.author, front='Largest bone?', back='Femur', topic='Anatomy', deck=self.deck
+        )
+        self.client.login(username='student', password='studentpass123')
+        self.client.post(reverse('flashcards:deck_subscribe', args=[self.deck.pk]))
+    
+    def test_subscribing_copies_no_cards(self):
+        """Test subscribers see the author's card rows, not copies"""
+        self.assertEqual(Flashcard.objects.count(), 1)
+        self.assertEqual(CardProgress.objects.count(), 0)
+        response = self.client.get(reverse('flashcards:flashcard_list'))
+        self.assertContains(response, 'Largest bone?')
+        self.assertContains(response, 'Shared')
+    
+    def test_progress_is_kept_per_user(self):
+        """Test a subscriber's review creates their progress and leaves the author's alone"""
+        self.client.get(reverse('flashcards:flashcard_list'))
+        self.client.post(reverse('flashcards:mark_flashcard', args=[self.card.pk]), {'action': 'known'})
+        
+        progress = CardProgress.objects.get(user=self.student)
+        self.assertEqual((progress.times_reviewed, progress.is_known), (1, True))
+        self.card.refresh_from_db()
+        self.assertEqual((self.card.times_reviewed, self.card.is_known), (0, False))
+        
+        # The cached row for the subscriber must not leak into the author's list
+        self.assertContains(self.client.get(reverse('flashcards:flashcard_list')), 'Reviewed 1 time')
+        self.client.login(username='author', password='authorpass123')
+        self.assertNotContains(self.client.get(reverse('flashcards:flashcard_list')), 'Reviewed 1 time')
+    
+    def test_study_and_export_include_subscribed_cards(self):
+        """Test study mode and export work over subscribed cards"""
+        response = self.client.get(reverse('flashcards:study_mode'), {'only_review': 'true'})
+        self.assertEqual(response.context['total_cards'], 1)
+        with override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, FLASHCARD_JOBS_EAGER=True):
+            self.client.post(reverse('flashcards:export_flashcards'), {'format': 'csv'})
+            job = Job.objects.get(kind='export_flashcards')
+            with job.result_file.open('rb') as result:
+                self.assertIn(b'Largest bone?', result.read())
+    
+    def test_subscriber_cannot_edit_shared_cards(self):
+        """Test only the author can change deck cards"""
+        response = self.client.get(reverse('flashcards:flashcard_edit', args=[self.card.pk]))
+        self.assertEqual(response.status_code, 404)
+    
+    def test_unpublished_deck_is_hidden(self):
+        """Test unpublishing a deck hides its cards from subscribers"""
+        Deck.objects.filter(pk=self.deck.pk).update(is_published=False)
+        response = self.client.get(reverse('flashcards:study_mode'))
+        self.assertEqual(response.context['total_cards'], 0)
+    
+    def test_create_deck_from_topic(self):
+        """Test a new deck can be filled with the cards of one topic"""
+        self.client.login(username='author', password='authorpass123')
+        Flashcard.objects.create(user=self.author, front='Capital of France?', back='Paris', topic='Geography')
+        response = self.client.post(reverse('flashcards:deck_create'), {
+            'title': 'Capitals',
+            'add_topic': 'Geography',
+            'is_published': 'on',
+        })
+        deck = Deck.objects.get(title='Capitals')
+        self.assertRedirects(response, reverse('flashcards:deck_detail', args=[deck.pk]))
+        self.assertEqual(deck.cards.count(), 1)
+        
+        response = self.client.get(reverse('flashcards:deck_list'))
+        self.assertContains(response, 'Capitals')
+        self.assertEqual(response.context['my_decks'].get(pk=self.deck.pk).subscriber_count, 1)
+
+
+class SimilarityTests(TestCase):
+    """Test cases for the similar-card index"""
+    
+    def setUp(self):
+        """Set up test user with a near-duplicate pair among other cards"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+        import_rows(self.user, [
+            {'topic': 'Biology', 'front': 'What is the powerhouse of the cell?', 'back': 'The mitochondria'},
+            {'topic': 'Biology', 'front': 'What is the powerhouse of a cell?', 'back': 'Mitochondria'},
+            {'topic': 'History', 'front': 'When did the Roman Empire fall?', 'back': '476 AD in the west'},
+            {'topic': 'Chemistry', 'front': 'Symbol for gold?', 'back': 'Au'},
+        ])
+        self.first, self.second = Flashcard.objects.filter(topic='Biology').order_by('pk')
+    
+    def test_near_duplicates_are_reported(self):
+        """Test the duplicate report pairs only the near-identical cards"""
+        ids, matrix = get_index('test', Flashcard.objects.filter(user=self.user))
+        pairs = near_duplicates(ids, matrix)
+        self.assertEqual([pair[:2] for pair in pairs], [(self.first.pk, self.second.pk)])
+        response = self.client.get(reverse('flashcards:duplicate_report'))
+        self.assertEqual(len(response.context['pairs']), 1)
+    
+    def test_detail_shows_similar_cards(self):
+        """Test the detail page lists the most similar card first"""
+        response = self.client.get(reverse('flashcards:flashcard_detail', args=[self.first.pk]))
+        similar = response.context['similar_cards']
+        self.assertEqual(similar[0][0].pk, self.second.pk)
+    
+    def test_edit_refreshes_vector(self):
+        """Test editing a card drops its vector and the index rebuilds it"""
+        self.assertEqual(CardVector.objects.count(), 4)
+        self.second.front = 'Which metal has the symbol Au?'
+        self.second.back = 'Gold'
+        self.second.save()
+        self.assertFalse(CardVector.objects.filter(flashcard=self.second).exists())
+        ids, matrix = get_index('test', Flashcard.objects.filter(user=self.user))
+        self.assertEqual(near_duplicates(ids, matrix), [])
+        self.assertEqual(CardVector.objects.count(), 4)
+    
+    def test_review_keeps_index(self):
+        """Test answering a card reuses the index instead of rebuilding it"""
+        cards = Flashcard.objects.filter(user=self.user)
+        _, matrix = get_index('test', cards)
+        apply_review(self.user, self.first.pk, True)
+        self.assertIs(get_index('test', cards)[1], matrix)
+    
+    def test_edit_updates_index_in_place(self):
+        """Test an updated index matches one built from scratch"""
+        cards = Flashcard.objects.filter(user=self.user)
+        get_index('test', cards)
+        self.second.front = 'Which metal has the symbol Au?'
+        self.second.save()
+        Flashcard.objects.create(user=self.user, front='Symbol for silver?', back='Ag', topic='Chemistry')
+        self.first.delete()
+        ids, matrix = get_index('test', cards)
+        fresh_ids, fresh_matrix = get_index('fresh', cards)
+        np.testing.assert_array_equal(ids, fresh_ids)
+        np.testing.assert_allclose(matrix, fresh_matrix)
+
+
+class ForecastTests(TestCase):
+    """Test cases for the retention forecast on the statistics page"""
+    
+    def setUp(self):
+        """Set up test user with a reviewed and a new card"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+        self.reviewed = Flashcard.objects.create(user=self.user, front='Q1', back='A1', topic='Biology')
+        self.new = Flashcard.objects.create(user=self.user, front='Q2', back='A2', topic='History')
+        apply_review(self.user, self.reviewed.pk, True, reviewed_at=timezone.now() - timedelta(days=3))
+    
+    def test_streaks_follow_review_log(self):
+        """Test intervals carry the streak before them and wrong answers reset it"""
+        intervals, outcomes, streaks, (cards, final) = review_intervals(
+            np.array([7, 7, 7, 7, 9]),
+            np.array([0.0, 86400.0, 3 * 86400.0, 7 * 86400.0, 0.0]),
+            np.array([True, True, False, True, True]),
+        )
+        self.assertEqual(list(intervals), [1.0, 2.0, 4.0])
+        self.assertEqual(list(streaks), [1, 2, 0])
+        self.assertEqual(list(outcomes), [True, False, True])
+        self.assertEqual(dict(zip(cards, final)), {7: 1, 9: 1})
+    
+    def test_fit_recovers_forgetting_curve(self):
+        """Test the grid fit finds the curve simulated reviews were drawn from"""
+        rng = np.random.default_rng(0)
+        streaks = rng.integers(0, 4, 5000)
+        intervals = rng.uniform(0.5, 30, 5000)
+        outcomes = rng.random(5000) < np.exp(-intervals / (2.0 * 3.0 ** streaks))
+        base, growth, fitted = fit_curve(intervals, outcomes, streaks)
+        self.assertTrue(fitted)
+        self.assertAlmostEqual(base, 2.0, delta=0.5)
+        self.assertAlmostEqual(growth, 3.0, delta=0.5)
+    
+    def test_forecast_cached_until_next_review(self):
+        """Test the forecast counts due and new cards and refreshes after a review"""
+        url = reverse('flashcards:statistics_forecast')
+        data = self.client.get(url).json()
+        self.assertEqual(len(data['days']), 30)
+        self.assertEqual(data['new'], 1)
+        self.assertEqual([topic[:2] for topic in data['topics']], [['Biology', 1]])
+        self.assertGreater(sum(day[1] for day in data['days']), 0)
+        
+        apply_review(self.user, self.new.pk, False)
+        self.assertEqual(self.client.get(url).json()['new'], 0)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, FLASHCARD_JOBS_EAGER=True)
+class ConditionalGetTests(TestCase):
+    """Test cases for ETag revalidation of per-user pages"""
+    
+    def setUp(self):
+        """Set up test user with two flashcards"""
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+        self.flashcard = Flashcard.objects.create(user=self.user, front='Q1', back='A1', topic='Biology')
+        self.other = Flashcard.objects.create(user=self.user, front='Q2', back='A2', topic='History')
+        self.url = reverse('flashcards:flashcard_list')
+        # The first page sets the CSRF cookie, which is part of the ETag
+        self.client.get(self.url)
+    
+    def test_unchanged_page_not_modified(self):
+        """Test a repeat visit gets 304 until a card is edited or deleted"""
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        
+        self.flashcard.back = 'Changed'
+        self.flashcard.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        
+        etag = response['ETag']
+        self.other.delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+    
+    def test_pending_messages_are_rendered(self):
+        """Test a page with a flash message waiting is never answered with 304"""
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(reverse('flashcards:import_flashcards'), {
+            'import_file': SimpleUploadedFile('cards.txt', b'Q,A'),
+        })
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Error importing flashcards')
+    
+    def test_unchanged_export_is_reused(self):
+        """Test exporting twice without changes hands out the same file"""
+        self.client.post(reverse('flashcards:export_flashcards'), {'format': 'csv'})
+        self.client.post(reverse('flashcards:export_flashcards'), {'format': 'csv'})
+        self.assertEqual(Job.objects.filter(kind='export_flashcards').count(), 1)
+        
+        job = Job.objects.get(kind='export_flashcards')
+        response = self.client.get(reverse('flashcards:job_download', args=[job.pk]))
+        response = self.client.get(
+            reverse('flashcards:job_download', args=[job.pk]), HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class SessionCompactionTests(TestCase):
+    """Test cases for deleting and summarising old study sessions"""
+    
+    def setUp(self):
+        """Set up test user with old, abandoned and current sessions"""
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        now = timezone.now()
+        self.old = now - timedelta(days=500)
+        for minutes, studied in [(10, 8), (20, 12)]:
+            StudySession.objects.create(
+                user=self.user,
+                started_at=self.old - timedelta(minutes=minutes),
+                ended_at=self.old,
+                cards_studied=studied,
+                cards_known=studied // 2
+            )
+        StudySession.objects.create(user=self.user, started_at=now - timedelta(days=2))
+        StudySession.objects.create(user=self.user, started_at=now - timedelta(minutes=5))
+        self.recent = StudySession.objects.create(user=self.user, started_at=now - timedelta(days=2), cards_studied=3)
+    
+    def test_old_sessions_folded_into_monthly_summary(self):
+        """Test old sessions become one summary row and abandoned ones are deleted"""
+        result = compact_sessions(batch_size=1)
+        self.assertEqual(result, {'deleted': 1, 'compacted': 2})
+        summary = StudySessionSummary.objects.get(user=self.user)
+        self.assertEqual(summary.month, timezone.localtime(self.old - timedelta(minutes=20)).date().replace(day=1))
+        self.assertEqual(
+            (summary.sessions, summary.cards_studied, summary.cards_known, summary.minutes), (2, 20, 10, 30)
+        )
+        # The open session without cards and the recent one are kept
+        self.assertEqual(StudySession.objects.count(), 2)
+        self.assertTrue(StudySession.objects.filter(pk=self.recent.pk).exists())
+    
+    def test_job_reports_heartbeat(self):
+        """Test the compaction job heartbeats so it is not requeued while running"""
+        job = Job.objects.create(kind='compact_sessions', status=Job.STATUS_RUNNING)
+        run_job(job)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertEqual(job.progress, 3)
+        self.assertIsNotNone(job.heartbeat_at)
+    
+    def test_command_never_compacts_heatmap_range(self):
+        """Test a short retention still keeps the sessions the activity heatmap shows"""
+        call_command('compact_sessions', days=1, stdout=io.StringIO())
+        self.assertTrue(StudySession.objects.filter(pk=self.recent.pk).exists())
+        self.assertEqual(StudySessionSummary.objects.get(user=self.user).sessions, 2)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, FLASHCARD_JOBS_EAGER=True)
+class AccountPurgeTests(TestCase):
+    """Test cases for deleting accounts in batches"""
+    
+    def setUp(self):
+        """Set up an author whose published deck a student has studied"""
+        self.author = User.objects.create_user(username='author', password='authorpass123')
+        self.student = User.objects.create_user(username='student', password='studentpass123')
+        deck = Deck.objects.create(owner=self.author, title='Anatomy 101', is_published=True)
+        DeckSubscription.objects.create(user=self.student, deck=deck)
+        import_rows(self.author, [
+            {'topic': 'Anatomy', 'front': f'Bone {i}?', 'back': f'Answer {i}'} for i in range(5)
+        ])
+        Flashcard.objects.filter(user=self.author).update(deck=deck)
+        shared = Flashcard.objects.filter(user=self.author).first()
+        apply_review(self.author, shared.pk, True)
+        apply_review(self.student, shared.pk, False)
+        StudySession.objects.create(user=self.author, cards_studied=1)
+        self.own = Flashcard.objects.create(user=self.student, front='Q', back='A', topic='Own')
+        apply_review(self.student, self.own.pk, True)
+    
+    def test_purge_deletes_account_in_batches(self):
+        """Test every row of the account goes, including others' progress on its cards"""
+        calls = []
+        deleted = purge_user(self.author, batch_size=2, progress=lambda done, total: calls.append((done, total)))
+        self.assertFalse(User.objects.filter(username='author').exists())
+        self.assertEqual(calls[-1], (deleted, deleted))
+        self.assertGreater(len(calls), 5)
+        self.assertEqual(list(Flashcard.objects.all()), [self.own])
+        self.assertEqual(Deck.objects.count(), 0)
+        self.assertEqual(CardProgress.objects.count(), 0)
+        self.assertEqual(list(Review.objects.values_list('flashcard_id', flat=True)), [self.own.pk])
+        self.assertEqual(StudySession.objects.filter(user__username='author').count(), 0)
+    
+    def test_purge_deletes_unused_images(self):
+        """Test images only the purged account used are deleted with their files"""
+        own = store_image(io.BytesIO(make_png()))
+        shared = store_image(io.BytesIO(make_png(color='blue')))
+        Flashcard.objects.filter(user=self.author).update(front_image=own, back_image=shared)
+        Flashcard.objects.filter(pk=self.own.pk).update(front_image=shared)
+        path = own.image.path
+        purge_user(self.author)
+        self.assertEqual(list(ImageAsset.objects.all()), [shared])
+        self.assertFalse(os.path.exists(path))
+    
+    def test_admin_offers_no_cascading_delete(self):
+        """Test the user admin hides Django's bulk and single deletes in favour of the purge"""
+        User.objects.create_superuser(username='admin', password='adminpass123')
+        client = Client()
+        client.login(username='admin', password='adminpass123')
+        response = client.get(reverse('admin:auth_user_changelist'))
+        self.assertContains(response, 'purge_accounts')
+        self.assertNotContains(response, 'delete_selected')
+        delete_url = reverse('admin:auth_user_delete', args=[self.author.pk])
+        response = client.get(reverse('admin:auth_user_change', args=[self.author.pk]))
+        self.assertNotContains(response, delete_url)
+        self.assertEqual(client.post(delete_url, {'post': 'yes'}).status_code, 403)
+        self.assertTrue(User.objects.filter(pk=self.author.pk).exists())
+    
+    def test_admin_action_queues_purge(self):
+        """Test staff can purge an account from the user admin"""
+        admin_user = User.objects.create_superuser(username='admin', password='adminpass123')
+        client = Client()
+        client.login(username='admin', password='adminpass123')
+        client.post(reverse('admin:auth_user_changelist'), {
+            'action': 'purge_accounts',
+            '_selected_action': [self.author.pk, admin_user.pk],
+        })
+        job = Job.objects.get(kind='purge_user')
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertEqual(job.user, admin_user)
+        self.assertFalse(User.objects.filter(username='author').exists())
+        self.assertTrue(User.objects.filter(username='admin').exists())
+
+
+class DigestTests(TestCase):
+    """Test cases for the daily due-card digest emails"""
+    
+    def setUp(self):
+        """Set up users with and without cards to review"""
+        self.busy = User.objects.create_user(username='busy', email='busy@example.com', password='testpass123')
+        self.done = User.objects.create_user(username='done', email='done@example.com', password='testpass123')
+        User.objects.create_user(username='noemail', password='testpass123')
+        for i in range(3):
+            Flashcard.objects.create(user=self.busy, front=f'Q{i}', back='A', topic='T')
+        Flashcard.objects.create(user=self.done, front='Q', back='A', topic='T', is_known=True)
+        deck = Deck.objects.create(owner=self.done, title='Shared', is_published=True)
+        Flashcard.objects.create(user=self.done, front='Shared Q', back='A', topic='T', deck=deck, is_known=True)
+        DeckSubscription.objects.create(user=self.busy, deck=deck)
+    
+    def test_due_counts_include_subscribed_cards(self):
+        """Test own cards to review and unknown shared cards are counted per user"""
+        self.assertEqual(due_counts([self.busy.pk, self.done.pk]), {self.busy.pk: 4})
+    
+    def test_digest_sent_once_per_day(self):
+        """Test only users with due cards get an email, and a rerun sends nothing"""
+        run = send_digests(batch_size=1)
+        self.assertEqual(run.sent, 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['busy@example.com'])
+        self.assertEqual(mail.outbox[0].subject, 'You have 4 cards to review')
+        send_digests()
+        self.assertEqual(len(mail.outbox), 1)
+    
+    def test_interrupted_run_resumes(self):
+        """Test a run continues after the last user it had finished"""
+        DigestRun.objects.create(date=timezone.localdate(), last_user_id=self.busy.pk)
+        self.assertEqual(send_digests().sent, 0)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class QuizTests(TestCase):
+    """Test cases for the multiple-choice quiz mode"""
+    
+    def setUp(self):
+        """Set up test user with two topics"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+        for i in range(6):
+            Flashcard.objects.create(user=self.user, front=f'Capital {i}?', back=f'City {i}', topic='Geography')
+        Flashcard.objects.create(user=self.user, front='2 + 2?', back='4', topic='Math')
+    
+    def test_choices_come_from_same_topic(self):
+        """Test every question offers its answer and distinct distractors from its topic"""
+        quiz = build_quiz(self.user, 'Geography', count=50)
+        self.assertEqual(len(quiz), 6)
+        geography = set(Flashcard.objects.filter(topic='Geography').values_list('pk', flat=True))
+        for card, choices in quiz:
+            ids = [pk for pk, _ in choices]
+            self.assertEqual(len(set(ids)), QUIZ_CHOICES)
+            self.assertIn(card.pk, ids)
+            self.assertTrue(set(ids) <= geography)
+        
+        # With the id pools cached, a quiz costs two queries whatever the deck size
+        with self.assertNumQueries(2):
+            build_quiz(self.user, 'Geography', count=50)
+    
+    def _choices(self, response, card):
+        """Return the choice tokens of ``card``'s question and the right one"""
+        for question, choices in response.context['quiz']:
+            if question.pk == card.pk:
+                tokens = [token for token, _ in choices]
+                right = [token for token, back_html in choices if back_html == card.back_html]
+                return tokens, right[0]
+    
+    def test_answer_updates_review_counters(self):
+        """Test quiz answers are graded on the server and counted as reviews"""
+        card = Flashcard.objects.get(topic='Math')
+        url = reverse('flashcards:quiz_answer', args=[card.pk])
+        self.client.get(reverse('flashcards:quiz_mode'), {'topic': 'Math'})
+        self.assertFalse(self.client.post(url, {'choice': str(card.pk)}).json()['is_correct'])
+        response = self.client.get(reverse('flashcards:quiz_mode'), {'topic': 'Math'})
+        _, right = self._choices(response, card)
+        self.assertTrue(self.client.post(url, {'choice': right}).json()['is_correct'])
+        card.refresh_from_db()
+        self.assertEqual((card.times_reviewed, card.times_correct, card.is_known), (2, 1, True))
+        self.assertEqual(Review.objects.filter(flashcard=card).count(), 2)
+    
+    def test_question_is_graded_once(self):
+        """Test answering the same question again is rejected and not recorded"""
+        card = Flashcard.objects.get(topic='Math')
+        response = self.client.get(reverse('flashcards:quiz_mode'), {'topic': 'Math'})
+        _, right = self._choices(response, card)
+        url = reverse('flashcards:quiz_answer', args=[card.pk])
+        self.assertTrue(self.client.post(url, {'choice': right}).json()['is_correct'])
+        self.assertEqual(self.client.post(url, {'choice': right}).status_code, 400)
+        card.refresh_from_db()
+        self.assertEqual((card.times_reviewed, card.times_correct), (1, 1))
+        self.assertEqual(Review.objects.filter(flashcard=card).count(), 1)
+    
+    def test_choices_do_not_reveal_card_ids(self):
+        """Test choices carry opaque tokens and only answer the current quiz"""
+        card = Flashcard.objects.filter(topic='Geography').first()
+        response = self.client.get(reverse('flashcards:quiz_mode'), {'topic': 'Geography'})
+        tokens, right = self._choices(response, card)
+        ids = {str(pk) for pk in Flashcard.objects.values_list('pk', flat=True)}
+        self.assertEqual(len(set(tokens)), QUIZ_CHOICES)
+        self.assertFalse(ids & set(tokens))
+        self.assertNotContains(response, f'data-choice="{card.pk}"')
+        
+        math = Flashcard.objects.get(topic='Math')
+        response = self.client.post(reverse('flashcards:quiz_answer', args=[math.pk]), {'choice': right})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Review.objects.exists())
+    
+    def test_new_cards_join_cached_pool(self):
+        """Test creating a card refreshes the cached pools"""
+        self.client.get(reverse('flashcards:quiz_mode'), {'topic': 'Math'})
+        self.client.post(reverse('flashcards:flashcard_create'), {
+            'front': '3 + 3?', 'back': '6', 'topic': 'Math'
+        })
+        response = self.client.get(reverse('flashcards:quiz_mode'), {'topic': 'Math'})
+        self.assertEqual(len(response.context['quiz']), 2)
+        self.assertContains(response, '3 + 3?')
+
+
+class QueryPlanTests(TestCase):
+    """Test the hot pages never fall back to a full scan of a large table"""
+    
+    # Tables that grow with the number of users, cards or reviews
+    LARGE_TABLES = {
+        'flashcards_flashcard', 'flashcards_review', 'flashcards_cardprogress', 'flashcards_studysession',
+        'flashcards_deck', 'flashcards_decksubscription', 'flashcards_cardvector',
+    }
+    
+    def setUp(self):
+        """Set up a user with own cards, a subscribed deck, progress and history"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+        author = User.objects.create_user(username='author', password='testpass123')
+        deck = Deck.objects.create(owner=author, title='Shared', is_published=True)
+        DeckSubscription.objects.create(user=self.user, deck=deck)
+        shared = Flashcard.objects.create(user=author, deck=deck, front='Shared?', back='Yes', topic='Shared')
+        CardProgress.objects.create(user=self.user, flashcard=shared, times_reviewed=1, is_known=True)
+        self.card = Flashcard.objects.create(user=self.user, front='Q1', back='A1', topic='Math')
+        Flashcard.objects.create(user=self.user, front='Q2', back='A2', topic='Biology', is_known=True)
+        session = StudySession.objects.create(user=self.user, topic='Math', cards_studied=1)
+        Review.objects.create(user=self.user, flashcard=self.card, session=session, review_id=uuid.uuid4(), is_correct=False)
+    
+    def capture_selects(self, url):
+        """Return ``(sql, params)`` of every SELECT run while serving ``url``"""
+        queries = []
+        
+        def capture(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+        
+        with connection.execute_wrapper(capture):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return queries
+    
+    def full_scans(self, sql, params):
+        """Plan steps of ``sql`` that read a large table from end to end"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Make the planner pick any usable index over a sequential
+                # scan, so the handful of test rows does not hide a missing one
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                nodes, scans = [plan[0]['Plan']], []
+                while nodes:
+                    node = nodes.pop()
+                    nodes.extend(node.get('Plans', []))
+                    if node['Node Type'] == 'Seq Scan' and node['Relation Name'] in self.LARGE_TABLES:
+                        scans.append(f"Seq Scan on {node['Relation Name']}")
+                return scans
+            
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            steps = [row[-1] for row in cursor.fetchall()]
+        # SQLite names a table by its alias in the query, if it has one
+        aliases = {alias: table for table, alias in re.findall(r'"(\w+)" (\w+)', sql)}
+        scans = []
+        for step in steps:
+            match = re.match(r'SCAN (\w+)', step)
+            if match and aliases.get(match.group(1), match.group(1)) in self.LARGE_TABLES:
+                scans.append(step)
+        return scans
+    
+    def test_hot_pages_use_indexes(self):
+        """Test no query behind the hot pages scans a large table"""
+        urls = [
+            reverse('flashcards:dashboard'),
+            reverse('flashcards:flashcard_list') + '?sort=topic',
+            reverse('flashcards:flashcard_list') + '?search=Q&topic=Math',
+            reverse('flashcards:flashcard_detail', args=[self.card.pk]),
+            reverse('flashcards:study_mode') + '?only_review=1',
+            reverse('flashcards:study_mode') + '?topic=Math',
+            reverse('flashcards:quiz_mode'),
+            reverse('flashcards:statistics'),
+            reverse('flashcards:statistics_forecast'),
+        ]
+        for url in urls:
+            for sql, params in self.capture_selects(url):
+                with self.subTest(url=url, sql=sql):
+                    self.assertEqual(self.full_scans(sql, params), [])
+    
+    def test_topic_filter_lists_each_topic_once(self):
+        """Test the topic dropdown is not split by the default created_at ordering"""
+        Flashcard.objects.create(user=self.user, front='Q3', back='A3', topic='Math')
+        response = self.client.get(reverse('flashcards:flashcard_list'))
+        self.assertEqual(list(response.context['topics']), ['Biology', 'Math', 'Shared'])
+
+
+@override_settings(FLASHCARD_REVIEW_WRITE_BEHIND=True, FLASHCARD_REVIEW_FLUSH_SECONDS=0)
+class WriteBehindTests(TestCase):
+    """Test buffering reviews and writing them out in batches"""
+    
+    def setUp(self):
+        """Set up test user with an own card, a shared card and a session"""
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.client.login(username='testuser', password='testpass123')
+        self.card = Flashcard.objects.create(user=self.user, front='Q', back='A', topic='Math')
+        author = User.objects.create_user(username='author', password='testpass123')
+        deck = Deck.objects.create(owner=author, title='Shared', is_published=True)
+        DeckSubscription.objects.create(user=self.user, deck=deck)
+        self.shared = Flashcard.objects.create(user=author, deck=deck, front='S', back='B', topic='Math')
+        self.session = StudySession.objects.create(user=self.user, topic='Math')
+        self.addCleanup(flush)
+    
+    def mark(self, card, action, review_id=None):
+        session = self.client.session
+        session['study_session_id'] = self.session.pk
+        session.save()
+        return self.client.post(
+            reverse('flashcards:mark_flashcard', args=[card.pk]),
+            {'action': action, 'review_id': review_id or str(uuid.uuid4())},
+        )
+    
+    def test_reviews_are_buffered_until_flush(self):
+        """Test answers are shown at once but written to the database in one flush"""
+        review_id = str(uuid.uuid4())
+        self.mark(self.card, 'known', review_id)
+        self.mark(self.card, 'known', review_id)
+        self.mark(self.card, 'review')
+        self.mark(self.card, 'known')
+        self.mark(self.shared, 'known')
+        self.assertFalse(Review.objects.exists())
+        self.assertEqual(len(pending_reviews(self.user.pk)), 4)
+        
+        response = self.client.get(reverse('flashcards:flashcard_detail', args=[self.card.pk]))
+        self.assertEqual(response.context['flashcard'].progress_reviews, 3)
+        response = self.client.get(reverse('flashcards:statistics'))
+        self.assertEqual((response.context['known_cards'], response.context['total_reviews']), (2, 4))
+        
+        self.assertEqual(flush(), 4)
+        self.assertEqual(pending_reviews(self.user.pk), [])
+        self.card.refresh_from_db()
+        self.assertEqual((self.card.times_reviewed, self.card.times_correct, self.card.is_known), (3, 2, True))
+        progress = CardProgress.objects.get(user=self.user, flashcard=self.shared)
+        self.assertEqual((progress.times_reviewed, progress.is_known), (1, True))
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.cards_studied, self.session.cards_known), (4, 3))
+        self.assertEqual(Review.objects.filter(user=self.user).count(), 4)
+    
+    def test_flush_statement_count_does_not_grow_with_reviews(self):
+        """Test a flush coalesces any number of answers into the same statements"""
+        CardProgress.objects.create(user=self.user, flashcard=self.shared, times_reviewed=1)
+        self.mark(self.card, 'known')
+        self.mark(self.shared, 'known')
+        with CaptureQueriesContext(connection) as few:
+            flush()
+        for i in range(20):
+            self.mark(self.card, 'known' if i % 2 else 'review')
+            self.mark(self.shared, 'review')
+        with CaptureQueriesContext(connection) as many:
+            flush()
+        self.assertEqual(len(many), len(few))
+        progress = CardProgress.objects.get(user=self.user, flashcard=self.shared)
+        self.assertEqual((progress.times_reviewed, progress.times_correct, progress.is_known), (22, 1, False))
+    
+    def test_flush_drops_stale_reviews(self):
+        """Test reviews of deleted cards and reviews already written are skipped"""
+        review_id = uuid.uuid4()
+        apply_review(self.user, self.card.pk, True, review_id=review_id)
+        other = Flashcard.objects.create(user=self.user, front='Gone', back='X', topic='Math')
+        apply_review(self.user, other.pk, True)
+        other.delete()
+        self.assertEqual(flush(), 1)
+        
+        # The same review synced again after it was written is not counted twice
+        apply_review(self.user, self.card.pk, True, review_id=review_id)
+        self.assertEqual(flush(), 0)
+        self.card.refresh_from_db()
+        self.assertEqual(self.card.times_reviewed, 1)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class LoadTestCommandTests(TransactionTestCase):
+    """Test the concurrent workload harness against an in-process server"""
+    
+    def test_reports_every_endpoint_and_cleans_up(self):
+        """Test a short run exercises each action without errors and removes its users"""
+        # One user: the in-memory test database locks tables instead of waiting
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'results.json')
+            call_command(
+                'loadtest', users=1, duration=2, cards=5, seed=1, json_path=path,
+                mix='study=1,review=1,list=1,search=1,statistics=1,enqueue=1', stdout=io.StringIO(),
+            )
+            with open(path) as results:
+                endpoints = json.load(results)['endpoints']
+        
+        self.assertTrue({'login', 'review', 'list', 'enqueue', 'all'} <= set(endpoints))
+        self.assertEqual(endpoints['all']['errors'], 0)
+        self.assertGreater(endpoints['all']['p99_ms'], 0)
+        self.assertFalse(User.objects.filter(username__startswith='loadtest-').exists())
+    
+    def test_rejects_unknown_actions(self):
+        """Test a typo in the mix fails before any user is created"""
+        with self.assertRaises(CommandError):
+            call_command('loadtest', mix='reviews=1', stdout=io.StringIO())
+        self.assertFalse(User.objects.exists())
+
+
+class StaticAssetTests(TestCase):
+    """Test front-end assets are served from the app, fingerprinted and compressed"""
+    
+    def setUp(self):
+        """Set up test user with a card"""
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+        Flashcard.objects.create(user=self.user, front='Q </script>', back='A', topic='Test')
+    
+    def test_pages_load_assets_from_static(self):
+        """Test pages reference no CDN and study data stays out of the script file"""
+        response = self.client.get(reverse('flashcards:study_mode'))
+        content = response.content.decode()
+        self.assertNotIn('cdn.jsdelivr.net', content)
+        self.assertIn(f"{settings.STATIC_URL}js/study.js", content)
+        # Card text is embedded as JSON, escaped so it cannot close the element
+        self.assertEqual(json.loads(re.search(
+            r'<script id="study-cards" type="application/json">(.*?)</script>', content
+        ).group(1))[0]['front'], response.context['flashcards'][0].front_html)
+        worker = self.client.get(reverse('flashcards:service_worker'))
+        self.assertContains(worker, f"'{settings.STATIC_URL}vendor/bootstrap/bootstrap.min.css'")
+        self.assertNotContains(worker, 'https://')
+    
+    def test_trim_keeps_rules_for_used_classes(self):
+        """Test the Bootstrap trim drops only rules that need a class nobody uses"""
+        css = (
+            '@charset "UTF-8";/*! License */.btn{color:red}.btn,.carousel{margin:0}'
+            '.btn:not(.carousel){padding:0}.carousel-item{display:none}'
+            '@media (min-width:576px){.carousel{gap:0}}@media print{body{color:#000}}'
+            '[data-bs-theme=dark]{--bs-body-color:"{}"}/*# sourceMappingURL=bootstrap.min.css.map */'
+        )
+        self.assertEqual(trim_css(css, {'btn'}), (
+            '@charset "UTF-8";/*! License */.btn{color:red}.btn{margin:0}.btn:not(.carousel){padding:0}'
+            '@media print{body{color:#000}}[data-bs-theme=dark]{--bs-body-color:"{}"}'
+        ))
+    
+    def test_vendored_bootstrap_keeps_used_components(self):
+        """Test the shipped Bootstrap CSS is trimmed but keeps the components the templates use"""
+        css = (settings.BASE_DIR / 'static' / 'vendor' / 'bootstrap' / 'bootstrap.min.css').read_text()
+        self.assertNotIn('.carousel', css)
+        for name in ('navbar-expand-lg', 'dropdown-menu', 'modal-dialog', 'alert-dismissible', 'btn-close', 'show'):
+            self.assertIn(name, used_classes())
+            self.assertIn(f'.{name}', css)
+    
+    def test_vendored_icons_cover_templates(self):
+        """Test every Bootstrap icon used by a template or script is in the trimmed font"""
+        used = set()
+        for directory in (settings.BASE_DIR / 'templates', settings.BASE_DIR / 'static' / 'js'):
+            for path in directory.rglob('*'):
+                if path.suffix in ('.html', '.js'):
+                    used.update(re.findall(r'\bbi-[a-z0-9-]+', path.read_text()))
+        icons_css = (settings.BASE_DIR / 'static' / 'vendor' / 'bootstrap-icons' / 'bootstrap-icons.css').read_text()
+        vendored = set(re.findall(r'\.(bi-[a-z0-9-]+)::before', icons_css))
+        self.assertTrue(used)
+        self.assertEqual(used - vendored, set())
+    
+    def test_collectstatic_fingerprints_and_compresses(self):
+        """Test collectstatic writes hashed, precompressed copies that WhiteNoise serves as immutable"""
+        with tempfile.TemporaryDirectory() as static_root, override_settings(
+            STATIC_ROOT=static_root,
+            STATICFILES_STORAGE='whitenoise.storage.CompressedManifestStaticFilesStorage',
+        ):
+            call_command('collectstatic', interactive=False, verbosity=0, ignore_patterns=['admin'])
+            with open(os.path.join(static_root, 'staticfiles.json')) as manifest:
+                paths = json.load(manifest)['paths']
+            hashed = paths['vendor/bootstrap-icons/bootstrap-icons.css']
+            self.assertRegex(hashed, r'bootstrap-icons\.[0-9a-f]{12}\.css$')
+            for suffix in ('.gz', '.br'):
+                self.assertTrue(os.path.exists(os.path.join(static_root, hashed + suffix)))
+            # Fonts referenced from the stylesheets are fingerprinted too
+            with open(os.path.join(static_root, hashed)) as icons_css:
+                self.assertIn(paths['vendor/bootstrap-icons/fonts/bootstrap-icons.woff2'].split('/')[-1], icons_css.read())
+            
+            self.assertContains(self.client.get(reverse('flashcards:dashboard')), paths['vendor/bootstrap/bootstrap.min.css'])
+            # Every asset these pages reference must be in the manifest
+            for name in ('study_mode', 'quiz_mode', 'statistics', 'service_worker'):
+                self.assertEqual(self.client.get(reverse(f'flashcards:{name}')).status_code, 200)
+            response = self.client.get(
+                settings.STATIC_URL + paths['vendor/bootstrap/bootstrap.min.css'],
+                HTTP_ACCEPT_ENCODING='br, gzip', secure=True,
+            )
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertIn('immutable', response['Cache-Control'])
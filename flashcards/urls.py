@@ -10,10 +10,33 @@ urlpatterns = [
     path('<int:pk>/', views.flashcard_detail, name='flashcard_detail'),
     path('<int:pk>/edit/', views.flashcard_edit, name='flashcard_edit'),
     path('<int:pk>/delete/', views.flashcard_delete, name='flashcard_delete'),
+    path('duplicates/', views.duplicate_report, name='duplicate_report'),
+    path('images/<str:sha256>/', views.image_asset, name='image_asset'),
+    path('images/<str:sha256>/thumb/', views.image_asset, {'variant': 'thumb'}, name='image_thumbnail'),
+    path('decks/', views.deck_list, name='deck_list'),
+    path('decks/create/', views.deck_create, name='deck_create'),
+    path('decks/<int:pk>/', views.deck_detail, name='deck_detail'),
+    path('decks/<int:pk>/edit/', views.deck_edit, name='deck_edit'),
+    path('decks/<int:pk>/delete/', views.deck_delete, name='deck_delete'),
+    path('decks/<int:pk>/subscribe/', views.deck_subscribe, name='deck_subscribe'),
+    path('decks/<int:pk>/unsubscribe/', views.deck_unsubscribe, name='deck_unsubscribe'),
     path('study/', views.study_mode, name='study_mode'),
     path('<int:pk>/mark/', views.mark_flashcard, name='mark_flashcard'),
     path('study/end/', views.end_study_session, name='end_study_session'),
+    path('study/sync/', views.sync_reviews, name='sync_reviews'),
+    path('quiz/', views.quiz_mode, name='quiz_mode'),
+    path('<int:pk>/answer/', views.quiz_answer, name='quiz_answer'),
+    path('sw.js', views.service_worker, name='service_worker'),
+    path('manifest.webmanifest', views.web_manifest, name='web_manifest'),
+    path('icon.svg', views.app_icon, name='app_icon'),
     path('export/', views.export_flashcards, name='export_flashcards'),
     path('import/', views.import_flashcards, name='import_flashcards'),
     path('statistics/', views.statistics, name='statistics'),
+    path('statistics/activity/', views.statistics_activity, name='statistics_activity'),
+    path('statistics/forecast/', views.statistics_forecast, name='statistics_forecast'),
+    path('analytics/', views.analytics, name='analytics'),
+    path('backup/', views.backup_account, name='backup_account'),
+    path('restore/', views.restore_account, name='restore_account'),
+    path('jobs/<int:pk>/', views.job_detail, name='job_detail'),
+    path('jobs/<int:pk>/download/', views.job_download, name='job_download'),
 ]
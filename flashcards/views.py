@@ -1,30 +1,68 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.templatetags.static import static
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Sum
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, FileResponse, Http404, StreamingHttpResponse
+from django.views.decorators.http import condition
+import hashlib
 import json
-import csv
+import os
 import random
+import uuid
 
-from .models import Flashcard, StudySession
-from .forms import FlashcardForm, FlashcardSearchForm
+from .models import Flashcard, StudySession, Job, ImageAsset, Deck, DeckSubscription
+from .forms import FlashcardForm, FlashcardSearchForm, DeckForm
+from .images import visible_images_filter
+from .activity import get_activity, invalidate_activity
+from .analytics import get_summary
+from .backup import iter_backup
+from .conditional import conditional_page, content_version, job_finished_at
+from .decks import cards_for, visible_cards, with_deck_counts
+from .forecast import get_forecast
+from .formats import EXPORTERS, get_importer
+from .jobs import enqueue
+from .quiz import DEFAULT_QUIZ_QUESTIONS, MAX_QUIZ_QUESTIONS, build_quiz, deal_choices, invalidate_quiz_pools
+from .reviews import apply_review, apply_reviews
+from .similarity import get_index, near_duplicates, similar_cards
+from .writebehind import merge_pending, merge_pending_sessions, pending_reviews, pending_totals
+
+IMAGE_CACHE_SECONDS = 60 * 60 * 24 * 365
+
+# Bump to make installed study apps drop their cached pages and assets
+STUDY_CACHE_VERSION = 1
+# Static files the service worker caches on install, so study mode renders offline
+STUDY_SHELL_ASSETS = [
+    'vendor/bootstrap/bootstrap.min.css',
+    'vendor/bootstrap-icons/bootstrap-icons.css',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff2',
+    'css/base.css',
+    'css/study.css',
+    'vendor/bootstrap/popper.min.js',
+    'vendor/bootstrap/bootstrap.min.js',
+    'js/base.js',
+    'js/study.js',
+]
 
 
 @login_required
 def dashboard(request):
     """Main dashboard view"""
-    user_cards = Flashcard.objects.filter(user=request.user)
+    user_cards = cards_for(request.user)
     
     # Statistics
     total_cards = user_cards.count()
     topics = user_cards.values('topic').annotate(count=Count('topic')).order_by('-count')
-    known_cards = user_cards.filter(is_known=True).count()
+    known_cards = user_cards.filter(progress_known=True).count()
+    known_cards += pending_totals(request.user, user_cards)['known']
     review_cards = total_cards - known_cards
     
     # Recent sessions
     recent_sessions = StudySession.objects.filter(user=request.user)[:5]
+    merge_pending_sessions(request.user, recent_sessions)
     
     context = {
         'total_cards': total_cards,
@@ -37,9 +75,10 @@ def dashboard(request):
 
 
 @login_required
+@conditional_page
 def flashcard_list(request):
     """List all flashcards with search and filter"""
-    flashcards = Flashcard.objects.filter(user=request.user)
+    flashcards = cards_for(request.user)
     form = FlashcardSearchForm(request.GET)
     
     if form.is_valid():
@@ -61,10 +100,10 @@ def flashcard_list(request):
             flashcards = flashcards.order_by(sort)
     
     # Get unique topics for filter
-    topics = Flashcard.objects.filter(user=request.user).values_list('topic', flat=True).distinct()
+    topics = visible_cards(request.user).order_by('topic').values_list('topic', flat=True).distinct()
     
     context = {
-        'flashcards': flashcards,
+        'flashcards': merge_pending(request.user, flashcards),
         'form': form,
         'topics': topics,
     }
@@ -75,15 +114,16 @@ def flashcard_list(request):
 def flashcard_create(request):
     """Create a new flashcard"""
     if request.method == 'POST':
-        form = FlashcardForm(request.POST)
+        form = FlashcardForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             flashcard = form.save(commit=False)
             flashcard.user = request.user
             flashcard.save()
+            invalidate_quiz_pools(request.user.pk)
             messages.success(request, 'Flashcard created successfully!')
             return redirect('flashcards:flashcard_list')
     else:
-        form = FlashcardForm()
+        form = FlashcardForm(user=request.user)
     
     return render(request, 'flashcards/flashcard_form.html', {'form': form, 'action': 'Create'})
 
@@ -94,13 +134,14 @@ def flashcard_edit(request, pk):
     flashcard = get_object_or_404(Flashcard, pk=pk, user=request.user)
     
     if request.method == 'POST':
-        form = FlashcardForm(request.POST, instance=flashcard)
+        form = FlashcardForm(request.POST, request.FILES, instance=flashcard, user=request.user)
         if form.is_valid():
             form.save()
+            invalidate_quiz_pools(request.user.pk)
             messages.success(request, 'Flashcard updated successfully!')
             return redirect('flashcards:flashcard_list')
     else:
-        form = FlashcardForm(instance=flashcard)
+        form = FlashcardForm(instance=flashcard, user=request.user)
     
     return render(request, 'flashcards/flashcard_form.html', {
         'form': form, 
@@ -116,6 +157,7 @@ def flashcard_delete(request, pk):
     
     if request.method == 'POST':
         flashcard.delete()
+        invalidate_quiz_pools(request.user.pk)
         messages.success(request, 'Flashcard deleted successfully!')
         return redirect('flashcards:flashcard_list')
     
@@ -123,10 +165,159 @@ def flashcard_delete(request, pk):
 
 
 @login_required
+@conditional_page
 def flashcard_detail(request, pk):
     """View a single flashcard"""
-    flashcard = get_object_or_404(Flashcard, pk=pk, user=request.user)
-    return render(request, 'flashcards/flashcard_detail.html', {'flashcard': flashcard})
+    flashcard = get_object_or_404(cards_for(request.user), pk=pk)
+    merge_pending(request.user, [flashcard])
+    return render(request, 'flashcards/flashcard_detail.html', {
+        'flashcard': flashcard,
+        'similar_cards': similar_cards(request.user, flashcard),
+    })
+
+
+@login_required
+def duplicate_report(request):
+    """Pairs of near-duplicate cards among the user's cards or one of their decks"""
+    cards = Flashcard.objects.filter(user=request.user)
+    scope = f'own:{request.user.pk}'
+    deck = None
+    if request.GET.get('deck'):
+        deck = get_object_or_404(Deck, pk=request.GET['deck'], owner=request.user)
+        cards = cards.filter(deck=deck)
+        scope = f'deck:{deck.pk}'
+    
+    ids, matrix = get_index(scope, cards)
+    pairs = near_duplicates(ids, matrix)
+    by_id = cards.in_bulk({card_id for pair in pairs for card_id in pair[:2]})
+    context = {
+        'deck': deck,
+        'decks': Deck.objects.filter(owner=request.user),
+        'card_count': len(ids),
+        'pairs': [(by_id[a], by_id[b], score) for a, b, score in pairs if a in by_id and b in by_id],
+    }
+    return render(request, 'flashcards/duplicate_report.html', context)
+
+
+@login_required
+def deck_list(request):
+    """The user's decks and subscriptions, plus published decks to browse"""
+    search = request.GET.get('q', '').strip()
+    subscribed = DeckSubscription.objects.filter(user=request.user).values('deck_id')
+    
+    published = with_deck_counts(
+        Deck.objects.filter(is_published=True).exclude(owner=request.user).exclude(pk__in=subscribed)
+    ).select_related('owner')
+    if search:
+        published = published.filter(Q(title__icontains=search) | Q(description__icontains=search))
+    
+    context = {
+        'my_decks': with_deck_counts(Deck.objects.filter(owner=request.user)),
+        'subscribed_decks': with_deck_counts(
+            Deck.objects.filter(pk__in=subscribed, is_published=True)
+        ).select_related('owner'),
+        'published_decks': published.order_by('-subscriber_count', 'title')[:50],
+        'search': search,
+    }
+    return render(request, 'flashcards/deck_list.html', context)
+
+
+@login_required
+def deck_create(request):
+    """Create a deck, optionally filled with the cards of one topic"""
+    return _deck_form(request, Deck(owner=request.user), 'Create')
+
+
+@login_required
+def deck_edit(request, pk):
+    """Edit a deck the user owns"""
+    return _deck_form(request, get_object_or_404(Deck, pk=pk, owner=request.user), 'Edit')
+
+
+def _deck_form(request, deck, action):
+    topics = Flashcard.objects.filter(user=request.user).order_by('topic').values_list('topic', flat=True).distinct()
+    form = DeckForm(request.POST or None, instance=deck, topics=topics)
+    if request.method == 'POST' and form.is_valid():
+        deck = form.save()
+        topic = form.cleaned_data.get('add_topic')
+        if topic:
+            # Changing updated_at also refreshes the cached card fragments
+            added = Flashcard.objects.filter(user=request.user, topic=topic).update(
+                deck=deck, updated_at=timezone.now()
+            )
+            messages.info(request, f'Added {added} cards from "{topic}" to the deck.')
+        messages.success(request, f'Deck {action.lower()}d successfully!')
+        return redirect('flashcards:deck_detail', pk=deck.pk)
+    
+    return render(request, 'flashcards/deck_form.html', {'form': form, 'action': action, 'deck': deck})
+
+
+@login_required
+def deck_detail(request, pk):
+    """Preview a deck and subscribe to it"""
+    deck = get_object_or_404(
+        with_deck_counts(Deck.objects.filter(Q(owner=request.user) | Q(is_published=True))).select_related('owner'),
+        pk=pk
+    )
+    context = {
+        'deck': deck,
+        'cards': deck.cards.all()[:20],
+        'is_owner': deck.owner_id == request.user.pk,
+        'is_subscribed': DeckSubscription.objects.filter(user=request.user, deck=deck).exists(),
+    }
+    return render(request, 'flashcards/deck_detail.html', context)
+
+
+@login_required
+def deck_subscribe(request, pk):
+    """Subscribe to a published deck; no cards are copied"""
+    deck = get_object_or_404(Deck, pk=pk, is_published=True)
+    if request.method == 'POST':
+        if deck.owner_id == request.user.pk:
+            messages.error(request, 'You cannot subscribe to your own deck.')
+        else:
+            DeckSubscription.objects.get_or_create(user=request.user, deck=deck)
+            invalidate_quiz_pools(request.user.pk)
+            messages.success(request, f'Subscribed to "{deck.title}". Its cards are now in your study list.')
+    return redirect('flashcards:deck_detail', pk=deck.pk)
+
+
+@login_required
+def deck_unsubscribe(request, pk):
+    """Stop studying a deck; progress is kept in case of a later re-subscribe"""
+    deck = get_object_or_404(Deck, pk=pk)
+    if request.method == 'POST':
+        DeckSubscription.objects.filter(user=request.user, deck=deck).delete()
+        invalidate_quiz_pools(request.user.pk)
+        messages.success(request, f'Unsubscribed from "{deck.title}".')
+        return redirect('flashcards:deck_list')
+    return redirect('flashcards:deck_detail', pk=deck.pk)
+
+
+@login_required
+def deck_delete(request, pk):
+    """Delete a deck; its cards stay with the owner as personal cards"""
+    deck = get_object_or_404(Deck, pk=pk, owner=request.user)
+    if request.method == 'POST':
+        deck.delete()
+        messages.success(request, 'Deck deleted. Its cards are still in your collection.')
+        return redirect('flashcards:deck_list')
+    return redirect('flashcards:deck_detail', pk=deck.pk)
+
+
+@login_required
+def image_asset(request, sha256, variant='full'):
+    """Serve a stored image; the URL contains the content hash, so it never changes"""
+    # Only images on cards the user can see, so a leaked hash is not enough
+    asset = get_object_or_404(ImageAsset.objects.filter(visible_images_filter(request.user)), sha256=sha256)
+    if variant == 'thumb' and asset.thumbnail:
+        stored, content_type = asset.thumbnail, 'image/webp'
+    else:
+        stored, content_type = asset.image, asset.content_type
+    
+    response = FileResponse(stored.open('rb'), content_type=content_type)
+    response['Cache-Control'] = f'private, max-age={IMAGE_CACHE_SECONDS}, immutable'
+    return response
 
 
 @login_required
@@ -137,16 +328,20 @@ def study_mode(request):
     only_review = request.GET.get('only_review', '')
     
     # Filter flashcards
-    flashcards = Flashcard.objects.filter(user=request.user)
+    flashcards = cards_for(request.user)
     
     if topic:
         flashcards = flashcards.filter(topic=topic)
     
     if only_review:
-        flashcards = flashcards.filter(is_known=False)
+        # Cards with buffered reviews may have changed state since they were stored
+        pending = {review.flashcard_id for review in pending_reviews(request.user.pk)}
+        flashcards = flashcards.filter(Q(progress_known=False) | Q(pk__in=pending))
     
     # Convert to list and shuffle
-    flashcard_list = list(flashcards)
+    flashcard_list = merge_pending(request.user, list(flashcards))
+    if only_review:
+        flashcard_list = [card for card in flashcard_list if not card.progress_known]
     random.shuffle(flashcard_list)
     
     # Create or get current study session
@@ -159,10 +354,24 @@ def study_mode(request):
         request.session['study_session_id'] = session.id
     
     # Get unique topics
-    topics = Flashcard.objects.filter(user=request.user).values_list('topic', flat=True).distinct()
+    topics = visible_cards(request.user).order_by('topic').values_list('topic', flat=True).distinct()
+    
+    # Read by static/js/study.js from a json_script element
+    study_cards = [
+        {
+            'id': card.pk,
+            'topic': card.topic,
+            'front': card.front_html,
+            'back': card.back_html,
+            'frontImage': reverse('flashcards:image_asset', args=[card.front_image_id]) if card.front_image_id else '',
+            'backImage': reverse('flashcards:image_asset', args=[card.back_image_id]) if card.back_image_id else '',
+        }
+        for card in flashcard_list
+    ]
     
     context = {
         'flashcards': flashcard_list,
+        'study_cards': study_cards,
         'total_cards': len(flashcard_list),
         'topics': topics,
         'selected_topic': topic,
@@ -176,64 +385,146 @@ def study_mode(request):
 def mark_flashcard(request, pk):
     """Mark flashcard as known or review"""
     if request.method == 'POST':
-        try:
-            flashcard = get_object_or_404(Flashcard, pk=pk, user=request.user)
-            action = request.POST.get('action')
-            
-            if action == 'known':
-                flashcard.is_known = True
-                flashcard.mark_reviewed(is_correct=True)
-                
-                # Update session
-                session_id = request.session.get('study_session_id')
-                if session_id:
-                    try:
-                        session = StudySession.objects.get(id=session_id)
-                        session.cards_studied += 1
-                        session.cards_known += 1
-                        session.save()
-                    except StudySession.DoesNotExist:
-                        pass
-                
-                return JsonResponse({
-                    'status': 'success',
-                    'message': 'Card marked as known!',
-                    'is_known': True
-                })
-            
-            elif action == 'review':
-                flashcard.is_known = False
-                flashcard.mark_reviewed(is_correct=False)
-                
-                # Update session
-                session_id = request.session.get('study_session_id')
-                if session_id:
-                    try:
-                        session = StudySession.objects.get(id=session_id)
-                        session.cards_studied += 1
-                        session.save()
-                    except StudySession.DoesNotExist:
-                        pass
-                
-                return JsonResponse({
-                    'status': 'success',
-                    'message': 'Card marked for review!',
-                    'is_known': False
-                })
-            else:
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Invalid action'
-                })
-        except Exception as e:
+        flashcard = get_object_or_404(visible_cards(request.user), pk=pk)
+        action = request.POST.get('action')
+        if action not in ('known', 'review'):
             return JsonResponse({
                 'status': 'error',
-                'message': str(e)
+                'message': 'Invalid action'
             })
+        
+        try:
+            review_id = uuid.UUID(request.POST['review_id']) if request.POST.get('review_id') else None
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Invalid review id'})
+        
+        is_known = action == 'known'
+        apply_review(
+            request.user, flashcard.pk, is_known,
+            review_id=review_id,
+            session_id=request.session.get('study_session_id'),
+        )
+        return JsonResponse({
+            'status': 'success',
+            'message': 'Card marked as known!' if is_known else 'Card marked for review!',
+            'is_known': is_known
+        })
     
     return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
 
 
+@login_required
+def quiz_mode(request):
+    """Multiple-choice quiz: pick each card's answer among answers from its topic"""
+    topic = request.GET.get('topic', '')
+    try:
+        count = int(request.GET.get('count', DEFAULT_QUIZ_QUESTIONS))
+    except ValueError:
+        count = DEFAULT_QUIZ_QUESTIONS
+    
+    quiz, request.session['quiz_answers'] = deal_choices(build_quiz(request.user, topic, count))
+    session = None
+    if quiz:
+        session = StudySession.objects.create(
+            user=request.user,
+            topic=f"Quiz: {topic if topic else 'All Topics'}"
+        )
+        request.session['study_session_id'] = session.id
+    
+    context = {
+        'quiz': quiz,
+        'topics': visible_cards(request.user).order_by('topic').values_list('topic', flat=True).distinct(),
+        'selected_topic': topic,
+        'count': count,
+        'max_questions': MAX_QUIZ_QUESTIONS,
+        'session': session,
+    }
+    return render(request, 'flashcards/quiz_mode.html', context)
+
+
+@login_required
+def quiz_answer(request, pk):
+    """Grade a quiz answer and record it like a study mode review"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    flashcard = get_object_or_404(visible_cards(request.user), pk=pk)
+    try:
+        choice = request.POST['choice']
+        review_id = uuid.UUID(request.POST['review_id']) if request.POST.get('review_id') else None
+    except (KeyError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid answer'}, status=400)
+    
+    # Choices carry tokens from deal_choices; the session knows the right one.
+    # Each token is used up by its answer, so a question is only graded once
+    answer = request.session.get('quiz_answers', {}).pop(str(flashcard.pk), None)
+    if answer is None:
+        return JsonResponse({'status': 'error', 'message': 'This question is not in your current quiz'}, status=400)
+    request.session.modified = True
+    is_correct = choice == answer
+    apply_review(
+        request.user, flashcard.pk, is_correct,
+        review_id=review_id,
+        session_id=request.session.get('study_session_id'),
+    )
+    return JsonResponse({'status': 'success', 'is_correct': is_correct, 'answer': answer})
+
+
+@login_required
+def sync_reviews(request):
+    """Apply reviews queued by study mode while it was offline"""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    try:
+        reviews = json.loads(request.body)['reviews']
+        if not isinstance(reviews, list):
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'Expected {"reviews": [...]}'}, status=400)
+    
+    result = apply_reviews(request.user, reviews)
+    return JsonResponse({'status': 'success', **result})
+
+
+def service_worker(request):
+    """Service worker that keeps study mode working offline"""
+    shell_assets = [static(path) for path in STUDY_SHELL_ASSETS]
+    # Fingerprinted URLs change with the files, so a deploy that changes an
+    # asset also renames the cache and the old copies are dropped
+    assets_digest = hashlib.md5(' '.join(shell_assets).encode()).hexdigest()[:12]
+    # The cache holds the study page with the user's cards; naming it per user
+    # makes the worker installed for the next user drop the previous one's
+    response = render(request, 'flashcards/sw.js', {
+        'cache_version': f'{STUDY_CACHE_VERSION}-{request.user.pk or 0}-{assets_digest}',
+        'shell_assets': shell_assets,
+    }, content_type='application/javascript')
+    # Browsers check for a new worker on navigation; never let a stale one stick
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def web_manifest(request):
+    """Web app manifest so study mode can be installed"""
+    return JsonResponse({
+        'name': 'FlashMaster Study',
+        'short_name': 'FlashMaster',
+        'start_url': reverse('flashcards:study_mode'),
+        'scope': reverse('flashcards:dashboard'),
+        'display': 'standalone',
+        'background_color': '#ffffff',
+        'theme_color': '#6366f1',
+        'icons': [{
+            'src': reverse('flashcards:app_icon'),
+            'sizes': 'any',
+            'type': 'image/svg+xml',
+        }],
+    }, content_type='application/manifest+json')
+
+
+def app_icon(request):
+    """Icon for the installed study app"""
+    return render(request, 'flashcards/icon.svg', content_type='image/svg+xml')
+
+
 @login_required
 def end_study_session(request):
     """End the current study session"""
@@ -242,8 +533,10 @@ def end_study_session(request):
         try:
             session = StudySession.objects.get(id=session_id)
             session.ended_at = timezone.now()
-            session.save()
+            # Only ended_at: the counters may have been raised since the row was read
+            session.save(update_fields=['ended_at'])
             del request.session['study_session_id']
+            invalidate_activity(request.user.pk)
         except StudySession.DoesNotExist:
             pass
     
@@ -252,75 +545,126 @@ def end_study_session(request):
 
 @login_required
 def export_flashcards(request):
-    """Export flashcards to CSV"""
-    flashcards = Flashcard.objects.filter(user=request.user)
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="flashcards.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Topic', 'Question (Front)', 'Answer (Back)', 'Created Date', 'Times Reviewed', 'Success Rate'])
-    
-    for card in flashcards:
-        writer.writerow([
-            card.topic,
-            card.front,
-            card.back,
-            card.created_at.strftime('%Y-%m-%d'),
-            card.times_reviewed,
-            f"{card.get_success_rate()}%"
-        ])
+    """Start a background export of the user's flashcards"""
+    if request.method == 'POST':
+        export_format = request.POST.get('format', 'csv')
+        if export_format not in EXPORTERS:
+            export_format = 'csv'
+        # Hand out the previous export again if no card changed since
+        version = content_version(request.user)
+        job = Job.objects.filter(
+            user=request.user, kind='export_flashcards', status=Job.STATUS_DONE,
+            payload__format=export_format, payload__version=version,
+        ).exclude(result_file='').order_by('-finished_at').first()
+        if job is None:
+            job = enqueue('export_flashcards', user=request.user,
+                          payload={'format': export_format, 'version': version})
+        return redirect('flashcards:job_detail', pk=job.pk)
     
-    return response
+    return redirect('flashcards:flashcard_list')
 
 
 @login_required
 def import_flashcards(request):
-    """Import flashcards from CSV"""
-    if request.method == 'POST' and request.FILES.get('csv_file'):
-        csv_file = request.FILES['csv_file']
+    """Start a background import from CSV, JSON Lines or an Anki package"""
+    if request.method == 'POST' and request.FILES.get('import_file'):
+        import_file = request.FILES['import_file']
         
         try:
-            decoded_file = csv_file.read().decode('utf-8').splitlines()
-            reader = csv.DictReader(decoded_file)
-            
-            count = 0
-            for row in reader:
-                Flashcard.objects.create(
-                    user=request.user,
-                    topic=row.get('Topic', 'Imported'),
-                    front=row.get('Question (Front)', row.get('Front', '')),
-                    back=row.get('Answer (Back)', row.get('Back', ''))
-                )
-                count += 1
-            
-            messages.success(request, f'Successfully imported {count} flashcards!')
-        except Exception as e:
+            get_importer(import_file.name)
+        except ValueError as e:
             messages.error(request, f'Error importing flashcards: {str(e)}')
+            return redirect('flashcards:import_flashcards')
         
-        return redirect('flashcards:flashcard_list')
+        job = enqueue(
+            'import_flashcards',
+            user=request.user,
+            payload={'filename': import_file.name},
+            input_file=import_file,
+        )
+        return redirect('flashcards:job_detail', pk=job.pk)
     
     return render(request, 'flashcards/import_flashcards.html')
 
 
 @login_required
+def backup_account(request):
+    """Stream a full backup of the user's cards and study sessions"""
+    response = StreamingHttpResponse(iter_backup(request.user), content_type='application/zip')
+    filename = f"flashmaster-backup-{timezone.now():%Y-%m-%d}.zip"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+def restore_account(request):
+    """Start a background restore of a backup archive"""
+    if request.method == 'POST' and request.FILES.get('backup_file'):
+        job = enqueue('restore_backup', user=request.user, input_file=request.FILES['backup_file'])
+        return redirect('flashcards:job_detail', pk=job.pk)
+    
+    return render(request, 'flashcards/restore_account.html')
+
+
+@login_required
+def job_detail(request, pk):
+    """Show the progress of a background job, as HTML or JSON for polling"""
+    job = get_object_or_404(Job, pk=pk, user=request.user)
+    
+    if request.GET.get('format') == 'json':
+        download_url = None
+        if job.status == Job.STATUS_DONE and job.result_file:
+            download_url = reverse('flashcards:job_download', args=[job.pk])
+        return JsonResponse({
+            'status': job.status,
+            'progress': job.progress,
+            'total': job.total,
+            'percent': job.get_percent(),
+            'message': job.message,
+            'download_url': download_url,
+        })
+    
+    return render(request, 'flashcards/job_detail.html', {'job': job})
+
+
+@login_required
+@condition(last_modified_func=job_finished_at)
+def job_download(request, pk):
+    """Download the file produced by a finished job"""
+    job = get_object_or_404(Job, pk=pk, user=request.user, status=Job.STATUS_DONE)
+    if not job.result_file:
+        raise Http404('This job has no file to download')
+    
+    return FileResponse(
+        job.result_file.open('rb'),
+        as_attachment=True,
+        filename=os.path.basename(job.result_file.name),
+    )
+
+
+@login_required
+@conditional_page
 def statistics(request):
     """View detailed statistics"""
-    flashcards = Flashcard.objects.filter(user=request.user)
+    flashcards = cards_for(request.user)
     
     # Overall stats
     total_cards = flashcards.count()
-    known_cards = flashcards.filter(is_known=True).count()
-    total_reviews = sum(card.times_reviewed for card in flashcards)
+    known_cards = flashcards.filter(progress_known=True).count()
+    total_reviews = flashcards.aggregate(total=Sum('progress_reviews'))['total'] or 0
+    pending = pending_totals(request.user, flashcards)
+    known_cards += pending['known']
+    total_reviews += pending['reviews']
     
     # Topic breakdown
     topics = flashcards.values('topic').annotate(
         total=Count('id'),
-        known=Count('id', filter=Q(is_known=True))
+        known=Count('id', filter=Q(progress_known=True))
     ).order_by('-total')
     
     # Recent activity
     recent_sessions = StudySession.objects.filter(user=request.user).order_by('-started_at')[:10]
+    merge_pending_sessions(request.user, recent_sessions)
     
     context = {
         'total_cards': total_cards,
@@ -331,3 +675,21 @@ def statistics(request):
         'recent_sessions': recent_sessions,
     }
     return render(request, 'flashcards/statistics.html', context)
+
+
+@login_required
+def statistics_activity(request):
+    """Daily and weekly study activity as compact JSON for the statistics charts"""
+    return JsonResponse(get_activity(request.user))
+
+
+@login_required
+def statistics_forecast(request):
+    """Projected due cards and predicted recall per topic as JSON for the statistics page"""
+    return JsonResponse(get_forecast(request.user))
+
+
+@staff_member_required
+def analytics(request):
+    """Site-wide analytics for operators, read from the summary tables"""
+    return render(request, 'flashcards/analytics.html', get_summary())
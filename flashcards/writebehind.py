@@ -0,0 +1,328 @@
+"""
+Write-behind buffering of reviews.
+
+Normally every answer in study or quiz mode is a transaction of its own: a
+Review insert plus an UPDATE of the card or progress row and one of the
+study session. With ``FLASHCARD_REVIEW_WRITE_BEHIND`` on, ``apply_review``
+only appends the review to an in-process buffer. A background thread writes
+the buffer out every ``FLASHCARD_REVIEW_FLUSH_SECONDS``, or sooner once it
+holds ``FLASHCARD_REVIEW_BUFFER_SIZE`` reviews. A flush inserts the Review
+rows in bulk and applies all counter changes with one UPDATE per table, each
+a CASE over the rows involved, however often a card was answered in between.
+The number of statements per interval is then fixed by the buffer size, not
+by how fast students tap.
+
+Each process merges its own pending reviews into the pages it renders, so a
+student served by the same worker sees their answers at once. Pages served by
+another worker catch up at that worker's next flush.
+
+Durability: pending reviews live only in memory. They are flushed when the
+interpreter exits normally, e.g. on a graceful worker restart. A worker that
+crashes or is killed with SIGKILL loses at most one flush interval of
+answers.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .forecast import invalidate_forecast
+from .models import CardProgress, Flashcard, Review, StudySession
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_SECONDS = 2
+DEFAULT_BUFFER_SIZE = 5000
+# Reviews written per transaction; keeps each CASE well below parameter limits
+FLUSH_BATCH_SIZE = 500
+
+PendingReview = namedtuple(
+    'PendingReview', 'user_id flashcard_id is_correct review_id session_id reviewed_at created_at'
+)
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_pending = []
+# Taken from _pending by a running flush but not committed yet
+_flushing = []
+_pending_ids = set()
+_wakeup = threading.Event()
+_flusher_pid = None
+
+
+def write_behind_enabled():
+    return getattr(settings, 'FLASHCARD_REVIEW_WRITE_BEHIND', False)
+
+
+def buffer_review(user_id, flashcard_id, is_correct, review_id, session_id, reviewed_at, created_at):
+    """Queue a review for the next flush; False if the same review is already queued"""
+    with _lock:
+        if (user_id, review_id) in _pending_ids:
+            return False
+        _pending_ids.add((user_id, review_id))
+        _pending.append(PendingReview(
+            user_id, flashcard_id, is_correct, review_id, session_id, reviewed_at, created_at
+        ))
+        full = len(_pending) >= getattr(settings, 'FLASHCARD_REVIEW_BUFFER_SIZE', DEFAULT_BUFFER_SIZE)
+    _start_flusher()
+    if full:
+        _wakeup.set()
+    return True
+
+
+def pending_reviews(user_id):
+    """The user's reviews still waiting in this process, oldest first"""
+    with _lock:
+        return [review for review in _flushing + _pending if review.user_id == user_id]
+
+
+def merge_pending(user, cards):
+    """Add the user's pending reviews to the progress of cards from ``cards_for``
+
+    Cards that changed get ``has_pending_reviews`` so their cached fragments
+    are not reused.
+    """
+    pending = defaultdict(list)
+    for review in pending_reviews(user.pk):
+        pending[review.flashcard_id].append(review)
+    if not pending:
+        return cards
+    for card in cards:
+        reviews = pending.get(card.pk)
+        if not reviews:
+            continue
+        card.progress_reviews += len(reviews)
+        card.progress_correct += sum(review.is_correct for review in reviews)
+        card.progress_known = reviews[-1].is_correct
+        card.progress_last_reviewed = reviews[-1].reviewed_at
+        card.has_pending_reviews = True
+    return cards
+
+
+def merge_pending_sessions(user, sessions):
+    """Add the user's pending reviews to the counters of their study sessions"""
+    pending = defaultdict(list)
+    for review in pending_reviews(user.pk):
+        pending[review.session_id].append(review)
+    for session in sessions:
+        reviews = pending.get(session.pk, [])
+        session.cards_studied += len(reviews)
+        session.cards_known += sum(review.is_correct for review in reviews)
+    return sessions
+
+
+def pending_totals(user, cards):
+    """Reviews and change in known cards that the user's pending reviews add
+
+    ``cards`` is the user's ``cards_for`` queryset; only the pending cards are
+    read from it.
+    """
+    pending = pending_reviews(user.pk)
+    if not pending:
+        return {'reviews': 0, 'known': 0}
+    latest = {review.flashcard_id: review.is_correct for review in pending}
+    stored = dict(cards.filter(pk__in=latest).values_list('pk', 'progress_known'))
+    return {
+        'reviews': len(pending),
+        'known': sum(int(latest[pk]) - int(known) for pk, known in stored.items()),
+    }
+
+
+def flush():
+    """Write every pending review to the database; returns how many were new"""
+    global _flushing
+    with _flush_lock:
+        with _lock:
+            batch = _flushing = _pending[:]
+            del _pending[:]
+        written = 0
+        for start in range(0, len(batch), FLUSH_BATCH_SIZE):
+            chunk = batch[start:start + FLUSH_BATCH_SIZE]
+            try:
+                written += _write_chunk(chunk)
+            except Exception:
+                # Keep what was not written for the next flush
+                with _lock:
+                    _pending[:0] = batch[start:]
+                    _flushing = []
+                raise
+            with _lock:
+                _flushing = batch[start + FLUSH_BATCH_SIZE:]
+                _pending_ids.difference_update((review.user_id, review.review_id) for review in chunk)
+        return written
+
+
+def _write_chunk(reviews):
+    try:
+        return _write(reviews)
+    except IntegrityError:
+        # Another process wrote one of these reviews, or a card was deleted
+        # in the meantime; write the others one by one
+        written = 0
+        for review in reviews:
+            try:
+                written += _write([review])
+            except IntegrityError:
+                pass
+        return written
+
+
+def _write(reviews):
+    """Insert ``reviews`` and apply their counter changes in one transaction"""
+    existing = set(Review.objects.filter(
+        review_id__in={review.review_id for review in reviews}
+    ).values_list('user_id', 'review_id'))
+    owners = dict(Flashcard.objects.filter(
+        pk__in={review.flashcard_id for review in reviews}
+    ).values_list('pk', 'user_id'))
+    session_owners = dict(StudySession.objects.filter(
+        pk__in={review.session_id for review in reviews if review.session_id}
+    ).values_list('pk', 'user_id'))
+
+    new = []
+    for review in reviews:
+        if (review.user_id, review.review_id) in existing or review.flashcard_id not in owners:
+            continue
+        existing.add((review.user_id, review.review_id))
+        if review.session_id and session_owners.get(review.session_id) != review.user_id:
+            review = review._replace(session_id=None)
+        new.append(review)
+    if not new:
+        return 0
+
+    own = [review for review in new if owners[review.flashcard_id] == review.user_id]
+    shared = [review for review in new if owners[review.flashcard_id] != review.user_id]
+    with transaction.atomic():
+        Review.objects.bulk_create([
+            Review(
+                user_id=review.user_id,
+                flashcard_id=review.flashcard_id,
+                session_id=review.session_id,
+                review_id=review.review_id,
+                is_correct=review.is_correct,
+                reviewed_at=review.reviewed_at,
+                created_at=review.created_at,
+            )
+            for review in new
+        ])
+        if own:
+            counts = _counts(own, lambda review: review.flashcard_id)
+            Flashcard.objects.filter(pk__in=counts['reviewed']).update(
+                times_reviewed=F('times_reviewed') + _by_pk(counts['reviewed']),
+                times_correct=F('times_correct') + _by_pk(counts['correct']),
+                last_reviewed=_by_pk(counts['last_reviewed']),
+                is_known=_by_pk(counts['is_known']),
+                updated_at=timezone.now(),
+            )
+        if shared:
+            _update_progress(shared)
+        sessions = [review for review in new if review.session_id]
+        if sessions:
+            counts = _counts(sessions, lambda review: review.session_id)
+            StudySession.objects.filter(pk__in=counts['reviewed']).update(
+                cards_studied=F('cards_studied') + _by_pk(counts['reviewed']),
+                cards_known=F('cards_known') + _by_pk(counts['correct']),
+            )
+    for user_id in {review.user_id for review in new}:
+        invalidate_forecast(user_id)
+    return len(new)
+
+
+def _update_progress(reviews):
+    """Apply reviews of shared cards to the reviewers' CardProgress rows"""
+    counts = _counts(reviews, lambda review: (review.user_id, review.flashcard_id))
+    # Filtering on both id lists can match extra pairs; keep the reviewed ones
+    candidates = CardProgress.objects.filter(
+        user_id__in={review.user_id for review in reviews},
+        flashcard_id__in={review.flashcard_id for review in reviews},
+    ).values_list('pk', 'user_id', 'flashcard_id')
+    rows = {
+        (user_id, flashcard_id): pk for pk, user_id, flashcard_id in candidates
+        if (user_id, flashcard_id) in counts['reviewed']
+    }
+    if rows:
+        by_row = {
+            name: {pk: values[key] for key, pk in rows.items()} for name, values in counts.items()
+        }
+        CardProgress.objects.filter(pk__in=rows.values()).update(
+            times_reviewed=F('times_reviewed') + _by_pk(by_row['reviewed']),
+            times_correct=F('times_correct') + _by_pk(by_row['correct']),
+            last_reviewed=_by_pk(by_row['last_reviewed']),
+            is_known=_by_pk(by_row['is_known']),
+        )
+    CardProgress.objects.bulk_create([
+        CardProgress(
+            user_id=key[0],
+            flashcard_id=key[1],
+            times_reviewed=reviewed,
+            times_correct=counts['correct'][key],
+            last_reviewed=counts['last_reviewed'][key],
+            is_known=counts['is_known'][key],
+        )
+        for key, reviewed in counts['reviewed'].items() if key not in rows
+    ])
+
+
+def _counts(reviews, key):
+    """Coalesce reviews per row: how many, how many correct, and the last answer"""
+    counts = {name: {} for name in ('reviewed', 'correct', 'last_reviewed', 'is_known')}
+    for review in reviews:
+        row = key(review)
+        counts['reviewed'][row] = counts['reviewed'].get(row, 0) + 1
+        counts['correct'][row] = counts['correct'].get(row, 0) + int(review.is_correct)
+        # Like apply_review, the answer applied last wins
+        counts['last_reviewed'][row] = review.reviewed_at
+        counts['is_known'][row] = review.is_correct
+    return counts
+
+
+def _by_pk(values):
+    """CASE giving each primary key in ``values`` its own value
+
+    Rows that share a value share one WHEN, which keeps counts and flags to a
+    few branches; building thousands of WHENs costs more than running them.
+    """
+    groups = defaultdict(list)
+    for pk, value in values.items():
+        groups[value].append(pk)
+    return Case(*[When(pk__in=pks, then=Value(value)) for value, pks in groups.items()])
+
+
+def _start_flusher():
+    """Start this process's flush thread, once per process (also after a fork)"""
+    global _flusher_pid
+    interval = getattr(settings, 'FLASHCARD_REVIEW_FLUSH_SECONDS', DEFAULT_FLUSH_SECONDS)
+    if _flusher_pid == os.getpid() or not interval:
+        return
+    with _lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_forever, args=(interval,), name='review-flusher', daemon=True).start()
+
+
+def _flush_forever(interval):
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception('Flushing buffered reviews failed; retrying in %s seconds', interval)
+        finally:
+            connection.close()
+
+
+@atexit.register
+def _flush_at_exit():
+    if _pending:
+        try:
+            flush()
+        except Exception:
+            logger.exception('Could not flush %d buffered reviews at exit', len(_pending))
@@ -0,0 +1,56 @@
+// Quiz mode: answer each question, then move on to the next.
+
+const questions = Array.from(document.querySelectorAll('.quiz-question'));
+let current = 0;
+let correct = 0;
+
+function getCookie(name) {
+    const match = document.cookie.split(';').map(c => c.trim()).find(c => c.startsWith(name + '='));
+    return match ? decodeURIComponent(match.substring(name.length + 1)) : null;
+}
+
+function answer(question, button) {
+    const buttons = question.querySelectorAll('.quiz-choice');
+    buttons.forEach(b => b.disabled = true);
+    const body = new URLSearchParams({choice: button.dataset.choice, review_id: newReviewId()});
+    fetch(question.dataset.answerUrl, {
+        method: 'POST',
+        headers: {'X-CSRFToken': getCookie('csrftoken')},
+        body: body
+    })
+    .then(response => response.json())
+    .then(data => {
+        buttons.forEach(b => {
+            if (b.dataset.choice === data.answer) {
+                b.classList.replace('btn-outline-secondary', 'btn-success');
+            }
+        });
+        if (data.is_correct) {
+            correct++;
+            document.getElementById('score').textContent = `Correct: ${correct}`;
+        } else {
+            button.classList.replace('btn-outline-secondary', 'btn-danger');
+        }
+        question.querySelector('.quiz-next').disabled = false;
+    })
+    .catch(() => buttons.forEach(b => b.disabled = false));
+}
+
+function next() {
+    questions[current].classList.add('d-none');
+    current++;
+    if (current < questions.length) {
+        questions[current].classList.remove('d-none');
+        document.getElementById('question-number').textContent = current + 1;
+    } else {
+        document.getElementById('final-score').textContent = correct;
+        document.getElementById('quiz-complete').classList.remove('d-none');
+    }
+}
+
+questions.forEach(question => {
+    question.querySelectorAll('.quiz-choice').forEach(button => {
+        button.addEventListener('click', () => answer(question, button));
+    });
+    question.querySelector('.quiz-next').addEventListener('click', next);
+});
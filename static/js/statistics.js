@@ -0,0 +1,76 @@
+// Statistics page: activity heatmap, weekly trends and the review forecast.
+
+function drawTrend(elementId, weeks, column, maximum) {
+    const svg = document.getElementById(elementId);
+    const values = weeks.map(week => week[column] || 0);
+    const top = maximum || Math.max(1, ...values);
+    const width = 260 / Math.max(values.length, 1);
+    svg.innerHTML = values.map((value, i) => {
+        const height = Math.max(value ? 1 : 0, value / top * 80);
+        return `<rect x="${i * width}" y="${80 - height}" width="${Math.max(width - 1, 1)}" height="${height}">` +
+            `<title>Week of ${weeks[i][0]}: ${value}${column === 3 ? '%' : ''}</title></rect>`;
+    }).join('');
+}
+
+function drawHeatmap(activity) {
+    const heatmap = document.getElementById('activity-heatmap');
+    const byDay = new Map(activity.days.map(day => [day[0], day]));
+    const busiest = Math.max(1, ...activity.days.map(day => day[2]));
+    const cells = [];
+
+    // Pad the first column so rows line up with weekdays (Monday first)
+    const first = new Date(activity.start + 'T00:00:00');
+    for (let i = 0; i < (first.getDay() + 6) % 7; i++) {
+        cells.push('<div></div>');
+    }
+    for (const day = first; day <= new Date(activity.end + 'T00:00:00'); day.setDate(day.getDate() + 1)) {
+        const iso = `${day.getFullYear()}-${String(day.getMonth() + 1).padStart(2, '0')}-${String(day.getDate()).padStart(2, '0')}`;
+        const row = byDay.get(iso);
+        const level = row && row[2] ? Math.min(4, Math.ceil(row[2] / busiest * 4)) : 0;
+        const title = row ? `${iso}: ${row[2]} cards, ${row[1]} min` : `${iso}: no study`;
+        cells.push(`<div class="day level-${level}" title="${title}"></div>`);
+    }
+    heatmap.innerHTML = cells.join('');
+
+    const cards = activity.days.reduce((total, day) => total + day[2], 0);
+    document.getElementById('activity-summary').textContent =
+        `${cards} cards on ${activity.days.length} days in the last year`;
+}
+
+function drawForecast(forecast) {
+    const svg = document.getElementById('forecast-due');
+    const top = Math.max(1, ...forecast.days.map(day => day[1]));
+    const width = 260 / forecast.days.length;
+    svg.innerHTML = forecast.days.map((day, i) => {
+        const height = Math.max(day[1] ? 1 : 0, day[1] / top * 80);
+        return `<rect x="${i * width}" y="${80 - height}" width="${Math.max(width - 1, 1)}" height="${height}">` +
+            `<title>${day[0]}: ${day[1]} cards</title></rect>`;
+    }).join('');
+
+    const rows = forecast.topics.map(topic => {
+        const cell = document.createElement('td');
+        cell.textContent = topic[0];
+        return `<tr>${cell.outerHTML}<td>${topic[2]}%</td><td>${topic[3]}%</td></tr>`;
+    });
+    document.getElementById('forecast-topics').innerHTML =
+        rows.join('') || '<tr><td colspan="3" class="text-muted">Review some cards to see predictions</td></tr>';
+
+    const parts = [`${forecast.overdue} overdue`, `${forecast.new} never reviewed`];
+    if (forecast.recall !== null) {
+        parts.unshift(`${forecast.recall}% predicted recall`);
+    }
+    document.getElementById('forecast-summary').textContent = parts.join(' · ');
+}
+
+fetch(document.getElementById('forecast-due').dataset.url)
+    .then(response => response.json())
+    .then(drawForecast);
+
+fetch(document.getElementById('activity-heatmap').dataset.url)
+    .then(response => response.json())
+    .then(activity => {
+        drawHeatmap(activity);
+        drawTrend('trend-minutes', activity.weeks, 1);
+        drawTrend('trend-cards', activity.weeks, 2);
+        drawTrend('trend-accuracy', activity.weeks, 3, 100);
+    });
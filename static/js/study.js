@@ -0,0 +1,228 @@
+// Study mode: flip cards, queue answers in IndexedDB and sync them in the background.
+
+let currentIndex = 0;
+let knownCount = 0;
+let isFlipped = false;
+
+// Card data and URLs come from the page, which renders them with json_script
+// and data attributes so this file can be cached like any other static asset
+const cards = JSON.parse(document.getElementById('study-cards').textContent);
+const studyData = document.getElementById('flashcard').dataset;
+
+function loadCard() {
+    if (currentIndex >= cards.length) {
+        showCompleteModal();
+        return;
+    }
+
+    const card = cards[currentIndex];
+    document.getElementById('card-topic').textContent = card.topic;
+    // front/back hold HTML sanitized on the server when the card was saved
+    document.getElementById('card-front').innerHTML = card.front;
+    document.getElementById('card-back').innerHTML = card.back;
+    showImage('card-front-image', card.frontImage);
+    showImage('card-back-image', card.backImage);
+    prefetchImages(cards[currentIndex + 1]);
+    document.getElementById('current-card').textContent = currentIndex + 1;
+
+    // Update progress
+    const progress = ((currentIndex) / cards.length) * 100;
+    document.getElementById('progress-fill').style.width = progress + '%';
+
+    // Reset flip
+    document.getElementById('flashcard').classList.remove('flipped');
+    isFlipped = false;
+}
+
+function showImage(elementId, url) {
+    const image = document.getElementById(elementId);
+    if (url) {
+        image.src = url;
+        image.classList.remove('d-none');
+    } else {
+        image.removeAttribute('src');
+        image.classList.add('d-none');
+    }
+}
+
+// Start downloading the next card's images so flipping never waits on the network
+const prefetched = new Set();
+function prefetchImages(card) {
+    if (!card) return;
+    [card.frontImage, card.backImage].forEach(url => {
+        if (url && !prefetched.has(url)) {
+            prefetched.add(url);
+            new Image().src = url;
+        }
+    });
+}
+
+function flipCard() {
+    const flashcard = document.getElementById('flashcard');
+    flashcard.classList.toggle('flipped');
+    isFlipped = !isFlipped;
+}
+
+// Reviews are answered locally and queued in IndexedDB, then synced in
+// the background. Each review carries its own id, so the server applies
+// it once no matter how often a flaky connection makes us retry.
+const SYNC_URL = studyData.syncUrl;
+const SESSION_ID = studyData.sessionId ? Number(studyData.sessionId) : null;
+const SYNC_BATCH_SIZE = 100;
+let syncing = false;
+
+// One queue per account, so reviews answered by one user on a shared
+// browser are never synced as another user's
+function openQueue() {
+    return new Promise((resolve, reject) => {
+        const request = indexedDB.open('flashmaster-' + studyData.userId, 1);
+        request.onupgradeneeded = () => request.result.createObjectStore('reviews', {keyPath: 'id'});
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function withStore(mode, callback) {
+    return openQueue().then(db => new Promise((resolve, reject) => {
+        const transaction = db.transaction('reviews', mode);
+        const result = callback(transaction.objectStore('reviews'));
+        transaction.oncomplete = () => resolve(result && result.result);
+        transaction.onerror = () => reject(transaction.error);
+    }));
+}
+
+function updateSyncStatus() {
+    withStore('readonly', store => store.count()).then(pending => {
+        document.getElementById('sync-status').textContent =
+            pending ? `${pending} review${pending === 1 ? '' : 's'} waiting to sync` : '';
+    }).catch(() => {});
+}
+
+function syncReviews() {
+    if (syncing || !navigator.onLine) {
+        return Promise.resolve();
+    }
+    syncing = true;
+    return withStore('readonly', store => store.getAll())
+        .then(reviews => {
+            if (!reviews.length) {
+                return null;
+            }
+            return fetch(SYNC_URL, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCookie('csrftoken')
+                },
+                body: JSON.stringify({reviews: reviews.slice(0, SYNC_BATCH_SIZE)})
+            })
+            .then(response => response.ok ? response.json() : null)
+            .then(data => {
+                if (!data || data.status !== 'success') {
+                    return null;
+                }
+                // Applied, already applied or rejected: none of them should be retried
+                const done = data.applied.concat(data.duplicates, data.rejected);
+                return withStore('readwrite', store => done.forEach(id => store.delete(id)))
+                    .then(() => reviews.length > SYNC_BATCH_SIZE);
+            });
+        })
+        .catch(error => console.warn('Review sync failed, will retry:', error))
+        .then(more => {
+            syncing = false;
+            updateSyncStatus();
+            if (more) {
+                return syncReviews();
+            }
+        });
+}
+
+function markCard(action) {
+    const card = cards[currentIndex];
+    if (!card) {
+        return;
+    }
+
+    const review = {
+        id: newReviewId(),
+        card: card.id,
+        action: action,
+        session: SESSION_ID,
+        reviewed_at: new Date().toISOString()
+    };
+    withStore('readwrite', store => store.put(review))
+        .then(syncReviews)
+        .catch(error => {
+            // No IndexedDB (private browsing in some browsers): send directly
+            console.warn('Review queue unavailable:', error);
+            fetch(SYNC_URL, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': getCookie('csrftoken')
+                },
+                body: JSON.stringify({reviews: [review]})
+            });
+        });
+
+    if (action === 'known') {
+        knownCount++;
+        document.getElementById('known-count').textContent = `Known: ${knownCount}`;
+    }
+
+    // Move to next card without waiting for the server
+    currentIndex++;
+    loadCard();
+}
+
+function showCompleteModal() {
+    document.getElementById('total-reviewed').textContent = cards.length;
+    document.getElementById('known-final').textContent = knownCount;
+    const modal = new bootstrap.Modal(document.getElementById('completeModal'));
+    modal.show();
+
+    // End study session once the queued reviews have reached the server
+    syncReviews().then(() => fetch(studyData.endSessionUrl, {
+        method: 'GET',
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken')
+        }
+    })).catch(() => {});
+}
+
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+// Keyboard shortcuts
+document.addEventListener('keydown', function(e) {
+    if (e.key === ' ' || e.key === 'Enter') {
+        e.preventDefault();
+        flipCard();
+    } else if (e.key === 'ArrowRight' || e.key === 'k') {
+        markCard('known');
+    } else if (e.key === 'ArrowLeft' || e.key === 'r') {
+        markCard('review');
+    }
+});
+
+window.addEventListener('online', syncReviews);
+if ('serviceWorker' in navigator) {
+    navigator.serviceWorker.register(studyData.serviceWorkerUrl)
+        .catch(error => console.warn('Service worker registration failed:', error));
+}
+
+// Load first card and send anything left over from an offline session
+loadCard();
+syncReviews();
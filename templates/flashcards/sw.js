@@ -0,0 +1,68 @@
+{% load static %}// FlashMaster study mode service worker.
+// Study pages are network-first with a cached fallback, so the last deck
+// opened keeps working offline; images and static assets are cache-first.
+// Static URLs carry a content hash, so a cached copy is never out of date.
+const CACHE_NAME = 'flashmaster-study-{{ cache_version }}';
+const STUDY_URL = '{% url "flashcards:study_mode" %}';
+const IMAGE_PREFIX = '{% url "flashcards:dashboard" %}images/';
+const STATIC_PREFIX = '{% get_static_prefix %}';
+const SHELL_ASSETS = [
+{% for url in shell_assets %}    '{{ url|escapejs }}',
+{% endfor %}];
+
+self.addEventListener('install', event => {
+    event.waitUntil(
+        caches.open(CACHE_NAME)
+            .then(cache => Promise.all(SHELL_ASSETS.map(url => cache.add(url).catch(() => null))))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil(
+        caches.keys()
+            .then(keys => Promise.all(keys
+                .filter(key => key.startsWith('flashmaster-study-') && key !== CACHE_NAME)
+                .map(key => caches.delete(key))))
+            .then(() => self.clients.claim())
+    );
+});
+
+function networkFirst(request) {
+    return fetch(request).then(response => {
+        // Redirects (to the login page, for instance) are not the study page
+        if (response.ok && !response.redirected) {
+            const copy = response.clone();
+            caches.open(CACHE_NAME).then(cache => cache.put(request, copy));
+        }
+        return response;
+    }).catch(() => caches.match(request).then(cached =>
+        cached || caches.match(STUDY_URL).then(fallback => fallback || Response.error())
+    ));
+}
+
+function cacheFirst(request) {
+    return caches.match(request).then(cached => cached || fetch(request).then(response => {
+        if (response.ok) {
+            const copy = response.clone();
+            caches.open(CACHE_NAME).then(cache => cache.put(request, copy));
+        }
+        return response;
+    }));
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+    if (request.mode === 'navigate' && url.pathname === STUDY_URL) {
+        event.respondWith(networkFirst(request));
+    } else if (url.pathname.startsWith(IMAGE_PREFIX) || url.pathname.startsWith(STATIC_PREFIX)) {
+        event.respondWith(cacheFirst(request));
+    }
+});